@@ -0,0 +1,356 @@
+import hashlib
+import os
+import sqlite3
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime
+
+from FileOrganizer import VIDEO_FILES_TABLE, DEVICE_METADATA_TABLE, FILE_HASHES_TABLE
+from VolumeInfo import is_rotational
+
+# Size of each of the first, middle and last chunks read for the sample hash
+SAMPLE_CHUNK_SIZE = 64 * 1024
+
+# Size of the reads used for full content hashes
+HASH_READ_SIZE = 1024 * 1024
+
+# Number of computed hashes written to the cache per transaction
+HASH_WRITE_BATCH = 500
+
+# Number of files read at the same time from one device, unless overridden per device.
+# One reader keeps a hard disk streaming instead of seeking between files; SSDs can take several.
+HDD_DEVICE_READERS = 1
+SSD_DEVICE_READERS = 4
+
+# Read buffer of a hashing worker process, allocated once and reused for every file it hashes
+_read_buffer = None
+
+def _new_hash():
+    return hashlib.blake2b(digest_size=20)
+
+def sample_hash(file_path, filesize, chunk_size=SAMPLE_CHUNK_SIZE, buffer=None):
+    """
+    Hashes the first, middle and last chunk of a file together with its size. Files that differ only
+    somewhere else get the same sample hash, so equal sample hashes must be confirmed with a full hash.
+    Files no larger than three chunks are read whole, and their sample hash is also their full hash.
+
+    Args:
+        file_path (str): The file to hash.
+        filesize (int): The size of the file in bytes.
+        chunk_size (int): Size of each sampled chunk. Defaults to SAMPLE_CHUNK_SIZE.
+        buffer (bytearray, optional): Read buffer of at least chunk_size bytes to reuse across calls.
+
+    Returns:
+        str: The hexadecimal digest.
+    """
+    if buffer is None or len(buffer) < chunk_size:
+        buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    digest = _new_hash()
+    digest.update(filesize.to_bytes(8, "little"))
+    with open(file_path, "rb", buffering=0) as file:
+        if filesize <= 3 * chunk_size:
+            _update_from_file(digest, file, view)
+        else:
+            for offset in (0, (filesize - chunk_size) // 2, filesize - chunk_size):
+                file.seek(offset)
+                digest.update(view[:file.readinto(view[:chunk_size])])
+    return digest.hexdigest()
+
+def full_hash(file_path, buffer=None):
+    """
+    Hashes the whole content of a file, reading it in blocks into a reusable buffer.
+
+    Args:
+        file_path (str): The file to hash.
+        buffer (bytearray, optional): Read buffer to reuse across calls. A buffer of HASH_READ_SIZE bytes is allocated if not given.
+
+    Returns:
+        str: The hexadecimal digest.
+    """
+    if buffer is None:
+        buffer = bytearray(HASH_READ_SIZE)
+    digest = _new_hash()
+    with open(file_path, "rb", buffering=0) as file:
+        _update_from_file(digest, file, memoryview(buffer))
+    return digest.hexdigest()
+
+def _update_from_file(digest, file, view):
+    """
+    Feeds the rest of an unbuffered file into a digest, one buffer at a time and without copying.
+    """
+    while True:
+        size = file.readinto(view)
+        if not size:
+            break
+        digest.update(view[:size])
+
+def _hash_task(stage, file_path, filesize):
+    """
+    Computes one hash of a stage. Runs in a hashing worker process and reuses that process' read buffer.
+    Raises OSError if the file cannot be read or its size no longer matches the catalog.
+    """
+    global _read_buffer
+    if _read_buffer is None:
+        _read_buffer = bytearray(HASH_READ_SIZE)
+    if os.stat(file_path).st_size != filesize:
+        raise OSError(f"The size of '{file_path}' differs from the catalog.")
+    if stage == "sample_hash":
+        return sample_hash(file_path, filesize, buffer=_read_buffer)
+    return full_hash(file_path, _read_buffer)
+
+def _load_candidates(db_connection, device_id=None, min_size=1):
+    """
+    Stage 1: returns the catalogued files whose size is shared with at least one other file,
+    together with any hashes cached for their current size and modification date.
+    """
+    if device_id is not None:
+        size_filter, video_filter, params = "AND device_DUID = ?", "WHERE v.device_DUID = ?", [min_size, device_id, device_id]
+    else:
+        size_filter, video_filter, params = "", "", [min_size]
+    cursor = db_connection.cursor()
+    cursor.execute(f"""
+        SELECT v.id, v.device_DUID, v.full_pathname, v.filesize, COALESCE(v.modified_time, 0), v.file_inode, h.sample_hash, h.full_hash
+        FROM {VIDEO_FILES_TABLE} v
+        JOIN (SELECT filesize FROM {VIDEO_FILES_TABLE}
+              WHERE filesize >= ? {size_filter}
+              GROUP BY filesize HAVING COUNT(*) > 1) sizes ON sizes.filesize = v.filesize
+        LEFT JOIN {FILE_HASHES_TABLE} h ON h.device_DUID = v.device_DUID AND h.full_pathname = v.full_pathname
+             AND h.filesize = v.filesize AND h.modified_time = COALESCE(v.modified_time, 0)
+        {video_filter}
+        ORDER BY v.filesize, v.id
+    """, params)
+    return [{
+        "id": row[0],
+        "device_DUID": row[1],
+        "full_pathname": row[2],
+        "filesize": row[3],
+        "modified_time": row[4],
+        "file_inode": row[5],
+        "sample_hash": row[6],
+        "full_hash": row[7]
+    } for row in cursor.fetchall()]
+
+def _link_key(file):
+    """
+    Returns what identifies the data of a catalogued file: hard links to one file, and symlinks followed to it,
+    share the device and inode, and with them the size and modification date. None if the inode is unknown.
+    """
+    if file["file_inode"] is None:
+        return None
+    return (file["device_DUID"], file["file_inode"], file["filesize"], file["modified_time"])
+
+def store_file_hashes(db_connection, files):
+    """
+    Writes the hashes of the given files to the hash cache in one transaction, replacing hashes
+    cached for an earlier size or modification date of the same file.
+
+    Args:
+        db_connection (sqlite3.Connection): SQLite database connection.
+        files (list): Dictionaries with device_DUID, full_pathname, filesize, modified_time, sample_hash and full_hash.
+    """
+    if not files:
+        return
+    hashed_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    try:
+        with db_connection:
+            db_connection.executemany(f"""
+                DELETE FROM {FILE_HASHES_TABLE}
+                WHERE device_DUID = ? AND full_pathname = ? AND (filesize <> ? OR modified_time <> ?)
+            """, [(f["device_DUID"], f["full_pathname"], f["filesize"], f["modified_time"]) for f in files])
+            db_connection.executemany(f"""
+                INSERT INTO {FILE_HASHES_TABLE} (device_DUID, full_pathname, filesize, modified_time, sample_hash, full_hash, hashed_date)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(device_DUID, full_pathname, filesize, modified_time) DO UPDATE SET
+                sample_hash=COALESCE(excluded.sample_hash, sample_hash),
+                full_hash=COALESCE(excluded.full_hash, full_hash),
+                hashed_date=excluded.hashed_date
+            """, [(f["device_DUID"], f["full_pathname"], f["filesize"], f["modified_time"],
+                   f["sample_hash"], f["full_hash"], hashed_date) for f in files])
+    except sqlite3.Error as e:
+        print(f"Failed to store {len(files)} file hash(es): {e}")
+        raise
+
+def _colliding_groups(files, key):
+    """
+    Groups files by key and returns only the groups with more than one file. Files whose key is None are dropped.
+    """
+    groups = {}
+    for file in files:
+        value = key(file)
+        if value is not None:
+            groups.setdefault(value, []).append(file)
+    return [group for group in groups.values() if len(group) > 1]
+
+def device_reader_limit(path):
+    """
+    Returns how many files are read at the same time from the device a file is on: HDD_DEVICE_READERS
+    for a spinning disk, SSD_DEVICE_READERS otherwise.
+    """
+    return HDD_DEVICE_READERS if is_rotational(path) else SSD_DEVICE_READERS
+
+def _iter_hash_results(files, stage, workers=1, device_readers=None):
+    """
+    Hashes files and yields (file, hash) pairs as they finish, with None as the hash of unreadable files.
+    With more than one worker the hashing runs in a process pool. Each device has its own queue, and no
+    more than its reader limit of files from one device are hashed at a time, so every connected drive
+    is kept busy without making any single drive seek between concurrent readers.
+    """
+    if workers <= 1:
+        for file in files:
+            try:
+                yield file, _hash_task(stage, file["full_pathname"], file["filesize"])
+            except OSError:
+                yield file, None
+        return
+
+    queues = {}
+    for file in files:
+        queues.setdefault(file["device_DUID"], deque()).append(file)
+    # Devices without a given limit get the one of their kind of disk, looked up through one of their files
+    device_readers = {device: (device_readers or {}).get(device) or device_reader_limit(queue[0]["full_pathname"])
+                      for device, queue in queues.items()}
+    reading = dict.fromkeys(queues, 0)
+    reader_slots = sum(min(len(queue), device_readers[device]) for device, queue in queues.items())
+    with ProcessPoolExecutor(max_workers=max(1, min(workers, reader_slots))) as pool:
+        running = {}
+
+        def submit_ready():
+            for device, queue in queues.items():
+                while queue and reading[device] < device_readers[device]:
+                    file = queue.popleft()
+                    reading[device] += 1
+                    running[pool.submit(_hash_task, stage, file["full_pathname"], file["filesize"])] = file
+
+        submit_ready()
+        while running:
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                file = running.pop(future)
+                reading[file["device_DUID"]] -= 1
+                try:
+                    yield file, future.result()
+                except OSError:
+                    yield file, None
+            submit_ready()
+
+def _hash_files(db_connection, files, stage, stats, workers=1, device_readers=None, progress_callback=None):
+    """
+    Computes the missing hashes of one stage and streams them back to the cache in batches.
+    Files that cannot be read, or whose size no longer matches the catalog, are left without a hash.
+    """
+    pending = []
+    for done, (file, digest) in enumerate(_iter_hash_results(files, stage, workers, device_readers), start=1):
+        if digest is None:
+            stats["unreadable"] += 1
+        else:
+            file[stage] = digest
+            stats[stage.replace("_hash", "_hashed")] += 1
+            pending.append(file)
+        if len(pending) >= HASH_WRITE_BATCH:
+            store_file_hashes(db_connection, pending)
+            pending = []
+        if progress_callback:
+            progress_callback(stage, done, len(files))
+    store_file_hashes(db_connection, pending)
+
+def find_duplicate_files(db_connection, device_id=None, min_size=1, workers=1, device_readers=None, progress_callback=None):
+    """
+    Finds catalogued video files with identical content, within a device or across devices.
+    Stage 1 groups the catalog by filesize in SQL and drops unique sizes. Stage 2 hashes the first,
+    middle and last chunks of the remaining files. Stage 3 hashes in full only the files whose sample
+    hashes still collide. Hashes are cached in the app_file_hashes table keyed by
+    (device, path, size, modification date), so unchanged files are never read twice.
+    Only files on drives that are currently connected can be hashed; the others are counted as unreadable.
+    Hard links to the same data are one copy: only one of them is hashed, they are listed together in a
+    group, and they do not count towards the reclaimable space.
+    With several workers, files are hashed in a process pool that reads from all devices at once
+    but from each device with at most its reader limit.
+
+    Args:
+        db_connection (sqlite3.Connection): SQLite database connection.
+        device_id (int, optional): Only look for duplicates among the files of this device.
+        min_size (int): Smallest file size in bytes to consider. Defaults to 1, which skips empty files.
+        workers (int): Number of hashing processes. Defaults to 1, which hashes in this process.
+        device_readers (dict, optional): Maps a device_DUID to the number of files read from it at the same
+                                         time. Other devices get HDD_DEVICE_READERS if they are spinning disks
+                                         and SSD_DEVICE_READERS otherwise.
+        progress_callback (callable, optional): Called as progress_callback(stage, done, total) while hashing.
+
+    Returns:
+        tuple: (groups, stats). groups is a list of dictionaries with "filesize", "full_hash", "files"
+               (the duplicate file records, where hard links carry the path of the copy they link to as
+               "hard_link_of"), "copies" (the number of distinct copies) and "reclaimable_bytes" (the space
+               freed by keeping one copy), largest first. stats counts the "candidates", the hashes computed
+               in each stage ("sample_hashed", "full_hashed"), the hashes taken from the cache ("cached"),
+               the "unreadable" files and the "hard_linked" files that share the data of another candidate.
+    """
+    candidates = _load_candidates(db_connection, device_id, min_size)
+    stats = {"candidates": len(candidates), "sample_hashed": 0, "full_hashed": 0, "cached": 0, "unreadable": 0, "hard_linked": 0}
+
+    # Hard links share their data: one file stands for each group of them, and sizes left with a single copy are dropped
+    links = {}
+    for group in _colliding_groups(candidates, _link_key):
+        for file in group[1:]:
+            file["hard_link_of"] = group[0]["full_pathname"]
+        links[group[0]["id"]] = group[1:]
+        stats["hard_linked"] += len(group) - 1
+    candidates = [file for file in candidates if "hard_link_of" not in file]
+    size_counts = Counter(file["filesize"] for file in candidates)
+    candidates = [file for file in candidates if size_counts[file["filesize"]] > 1]
+    stats["cached"] = sum(1 for file in candidates if file["full_hash"] or file["sample_hash"])
+
+    # Stage 2: sample hashes for every file that shares its size
+    to_sample = [file for file in candidates if file["sample_hash"] is None and file["full_hash"] is None]
+    _hash_files(db_connection, to_sample, "sample_hash", stats, workers, device_readers, progress_callback)
+    for file in candidates:
+        # A sample of a small file covers all of it
+        if file["full_hash"] is None and file["sample_hash"] is not None and file["filesize"] <= 3 * SAMPLE_CHUNK_SIZE:
+            file["full_hash"] = file["sample_hash"]
+
+    # Stage 3: full hashes only where size and sample hash still collide
+    to_hash = []
+    for group in _colliding_groups(candidates, lambda file: (file["filesize"], file["sample_hash"]) if file["sample_hash"] else None):
+        to_hash.extend(file for file in group if file["full_hash"] is None)
+    _hash_files(db_connection, to_hash, "full_hash", stats, workers, device_readers, progress_callback)
+
+    groups = []
+    for group in _colliding_groups(candidates, lambda file: (file["filesize"], file["full_hash"]) if file["full_hash"] else None):
+        groups.append({
+            "filesize": group[0]["filesize"],
+            "full_hash": group[0]["full_hash"],
+            "files": [linked for file in group for linked in [file] + links.get(file["id"], [])],
+            "copies": len(group),
+            "reclaimable_bytes": group[0]["filesize"] * (len(group) - 1)
+        })
+    groups.sort(key=lambda group: group["reclaimable_bytes"], reverse=True)
+    return groups, stats
+
+def print_duplicate_report(db_connection, groups, stats, limit=50):
+    """
+    Prints the duplicate groups found by find_duplicate_files, largest reclaimable space first.
+
+    Args:
+        db_connection (sqlite3.Connection): SQLite database connection, used to look up volume names.
+        groups (list): Duplicate groups returned by find_duplicate_files.
+        stats (dict): Statistics returned by find_duplicate_files.
+        limit (int): Maximum number of groups to print. Defaults to 50.
+    """
+    cursor = db_connection.cursor()
+    cursor.execute(f"SELECT deviceid, volumename FROM {DEVICE_METADATA_TABLE}")
+    volumes = dict(cursor.fetchall())
+
+    for number, group in enumerate(groups[:limit], start=1):
+        print(f"\nGroup {number}: {group['copies']} copies of {group['filesize']} bytes, "
+              f"{group['reclaimable_bytes']} bytes reclaimable")
+        for file in group["files"]:
+            link_note = " (hard link, same data as the copy above)" if "hard_link_of" in file else ""
+            print(f"  [{volumes.get(file['device_DUID'], 'Unknown')}] {file['full_pathname']}{link_note}")
+    if len(groups) > limit:
+        print(f"\n... and {len(groups) - limit} more group(s).")
+
+    total = sum(group["reclaimable_bytes"] for group in groups)
+    print(f"\n{len(groups)} duplicate group(s), {total} bytes ({total / 1024 ** 3:.2f} GiB) reclaimable.")
+    print(f"{stats['candidates']} file(s) shared a size: {stats['cached']} hash(es) from the cache, "
+          f"{stats['sample_hashed']} sample hash(es) and {stats['full_hashed']} full hash(es) computed, "
+          f"{stats['unreadable']} file(s) could not be read, {stats['hard_linked']} hard link(s) counted once.")
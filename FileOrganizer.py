@@ -1,14 +1,116 @@
 import os
 from datetime import datetime
 import sqlite3
-import win32api
+import queue
+import threading
 import csv
+import gzip
+import lzma
+import ntpath
 import re
-from tkinter import filedialog, messagebox
+
+from VolumeInfo import get_volume_info, clear_volume_cache, stable_device_id, device_id_from_serial, is_rotational, has_reliable_folder_mtimes
 
 # Global variables for database table names
 VIDEO_FILES_TABLE = "app_video_files_metadata"
 DEVICE_METADATA_TABLE = "app_device_metadata"
+DIRECTORY_MANIFEST_TABLE = "app_directory_manifest"
+SCHEMA_VERSION_TABLE = "schema_version"
+VIDEO_FILES_SEARCH_TABLE = "app_video_files_search"
+SEARCH_CONTROL_TABLE = "app_video_files_search_control"
+FILE_HASHES_TABLE = "app_file_hashes"
+MEDIA_PROPERTIES_TABLE = "app_media_properties"
+VIDEO_FILES_VIEW = "app_video_files"
+
+# Keys the video file listing can be sorted on, mapped to the column they sort on; each column is
+# indexed together with the id
+VIDEO_SORT_KEYS = {"id": "id", "filesize": "filesize", "normalized_filename": "normalized_filename", "modified_date": "modified_time"}
+
+# Text format of the dates shown and exported for video files; they are stored as epoch seconds
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Number of video file records fetched per query when paging through the catalog
+PAGE_SIZE = 1000
+
+# Column layouts for catalog exports, as (header, SQL expression) pairs over the video files view (v)
+# joined with the device metadata table (d). The first one keeps the raw column names, the second
+# one matches the columns shown in the GUI.
+CATALOG_EXPORT_COLUMNS = [
+    ("id", "v.id"),
+    ("partitionID", "v.partitionID"),
+    ("full_pathname", "v.full_pathname"),
+    ("filename", "v.filename"),
+    ("normalized_filename", "v.normalized_filename"),
+    ("filesize", "v.filesize"),
+    ("created_date", "v.created_date"),
+    ("modified_date", "v.modified_date"),
+    ("device_DUID", "v.device_DUID"),
+    ("volumename", "d.volumename"),
+]
+DISPLAY_EXPORT_COLUMNS = [
+    ("Device Volume", "COALESCE(d.volumename, 'Unknown')"),
+    ("Filename", "v.filename"),
+    ("Full Path", "v.full_pathname"),
+    ("Normalized Filename", "v.normalized_filename"),
+    ("Size", "v.filesize"),
+    ("Created Date", "v.created_date"),
+    ("Modified Date", "v.modified_date"),
+]
+
+# Number of rows per Parquet row group / Arrow record batch in columnar exports
+ARROW_BATCH_SIZE = 100000
+
+# Maximum number of rows on one Excel worksheet
+EXCEL_MAX_ROWS = 1048576
+
+# Number of rows inserted per transaction when importing a catalog export
+IMPORT_BATCH_SIZE = 50000
+
+# Number of path keys looked up per query when matching imported rows without a device id to the catalog
+IMPORT_MATCH_CHUNK = 500
+
+# Volume name of the device that imported rows without a device id or volume name are filed under
+UNRESOLVED_VOLUME_NAME = "Unresolved"
+
+# Column headers understood by the catalog import, normalized to lowercase letters and digits,
+# mapped to the field they hold. Covers the raw CSV dump, the GUI export layout and the
+# hand-maintained spreadsheets (including their 'Dodified Date' column).
+IMPORT_HEADER_ALIASES = {
+    "partitionid": "partitionID",
+    "fullpathname": "full_pathname",
+    "fullpath": "full_pathname",
+    "filename": "filename",
+    "normalizedfilename": "normalized_filename",
+    "filesize": "filesize",
+    "size": "filesize",
+    "createddate": "created_date",
+    "modifieddate": "modified_date",
+    "dodifieddate": "modified_date",
+    "deviceduid": "device_DUID",
+    "volumename": "volumename",
+    "devicevolume": "volumename",
+    "deviceid": "deviceid",
+    "pathname": "pathname",
+    "lastscanned": "last_scanned",
+}
+
+# Common video file extensions recognised by the scanner
+VIDEO_EXTENSIONS = {'.mp4', '.mkv', '.avi', '.mov', '.wmv', '.flv', '.webm'}
+
+# Number of video file records written to the database per transaction while scanning
+SCAN_BATCH_SIZE = 1000
+
+# Seconds a walker thread waits for room in the full result queue before checking whether the walk was stopped
+WALK_RESULT_TIMEOUT = 0.1
+
+# How the scanner treats symbolic links: "never" skips them, "files" records symlinked video files but
+# does not descend into symlinked folders (like os.walk), "always" also descends into symlinked folders.
+# Folders reached twice, through links, bind mounts or loops, are only walked once in every mode.
+SYMLINK_POLICIES = ("never", "files", "always")
+DEFAULT_SYMLINK_POLICY = "files"
+
+# Paths with a drive letter or UNC prefix, which live on case-insensitive Windows volumes
+WINDOWS_PATH_PATTERN = re.compile(r'^(?:[A-Za-z]:|\\\\|//)')
 
 def normalize_filename(filename):
     """
@@ -29,203 +131,2065 @@ def normalize_filename(filename):
     # Add back the extension
     return normalized + ext
 
-def get_video_files(folder_name):
-    """
-    Takes a folder name as input and returns a list of dictionaries containing details of all video files in the folder.
-    Each dictionary includes: partitionID, full pathname, filename, normalized_filename, filesize, created date, and modified date.
-    """
-    # Define common video file extensions
-    video_extensions = {'.mp4', '.mkv', '.avi', '.mov', '.wmv', '.flv', '.webm'}
-    video_files = []
+def canonical_path_key(full_path):
+    """
+    Returns the key a file path is deduplicated on. Windows paths accept both separators and live on
+    case-insensitive volumes, so their separators become '/' and they are case-folded: 'G:/General Videos\\a.wmv'
+    and 'g:\\general videos\\A.wmv' get the same key. Other paths only have repeated separators collapsed.
+    
+    Args:
+        full_path (str): The full path of a file or folder.
+    
+    Returns:
+        str: The canonical path key.
+    """
+    if os.name == "nt" or WINDOWS_PATH_PATTERN.match(full_path):
+        key = full_path.replace("\\", "/")
+        # Keep the double slash of a UNC path
+        unc_prefix = "/" if key.startswith("//") else ""
+        return (unc_prefix + re.sub(r'/+', '/', key)).rstrip("/").casefold()
+    return re.sub(r'/+', '/', full_path)
+
+def _epoch_seconds(value, strict=False):
+    """
+    Converts a date given as epoch seconds, a datetime or 'YYYY-MM-DD HH:MM:SS' text (in local time)
+    to epoch seconds, the form dates are stored in. Returns None for empty or unreadable dates, or
+    raises ValueError for them if strict is True.
+    """
+    if isinstance(value, (int, float)):
+        return int(value)
+    if not isinstance(value, datetime):
+        try:
+            value = datetime.fromisoformat(str(value).strip())
+        except ValueError:
+            if strict:
+                raise ValueError(f"'{value}' is not a date. Use 'YYYY-MM-DD HH:MM:SS', a datetime or epoch seconds.") from None
+            return None
+    return int(value.timestamp())
+
+def _video_file_record(full_path, filename, stats, device_id, inode=None):
+    """
+    Builds the dictionary stored for a single video file.
+    
+    Args:
+        full_path (str): Full path of the file.
+        filename (str): Name of the file.
+        stats (os.stat_result): Stat data for the file.
+        device_id (int): Device the file lives on.
+        inode (int, optional): Inode (file index on Windows) of the file, if stats does not carry it.
+    
+    Returns:
+        dict: The video file record.
+    """
+    return {
+        "partitionID": os.path.splitdrive(full_path)[0],
+        "full_pathname": full_path,
+        "path_key": canonical_path_key(full_path),
+        "filename": filename,
+        "normalized_filename": normalize_filename(filename),
+        "filesize": stats.st_size,
+        "created_time": int(stats.st_ctime),
+        "modified_time": int(stats.st_mtime),
+        "device_DUID": int(device_id),
+        "file_inode": inode or stats.st_ino or None
+    }
+
+def subtree_bounds(dir_path):
+    """
+    Returns the range of full_pathname values below a folder, for an indexed range condition.
+    """
+    prefix = dir_path.rstrip(os.sep) + os.sep
+    return prefix, prefix[:-1] + chr(ord(os.sep) + 1)
+
+def is_within(path, folder):
+    """
+    Returns True if a path is the folder itself or lies anywhere below it.
+    """
+    return path == folder or path.startswith(folder.rstrip(os.sep) + os.sep)
+
+def path_key_subtree_bounds(dir_path):
+    """
+    Returns the range of path_key values below a folder, for an indexed range condition.
+    """
+    prefix = canonical_path_key(dir_path).rstrip("/") + "/"
+    return prefix, prefix[:-1] + "0"
+
+def scan_directory(dir_path, strict=False, symlinks=DEFAULT_SYMLINK_POLICY, hdd_mode=False):
+    """
+    Lists a single directory with os.scandir and builds records for the video files directly inside it.
+    The file type and stat data cached on each DirEntry are reused, and names without a video
+    extension are skipped before any stat call is made.
+    The whole directory is listed before any file is stat'ed. In HDD mode the files are then stat'ed
+    in inode order rather than listing order, so the disk reads their inodes in one sweep.
+    
+    Args:
+        dir_path (str): The directory to list.
+        strict (bool): If True, raise an error when the directory itself cannot be listed instead of
+                       reporting it and returning what was listed. Defaults to False.
+        symlinks (str): One of SYMLINK_POLICIES. Defaults to DEFAULT_SYMLINK_POLICY.
+        hdd_mode (bool): Stat the files in inode order. Defaults to False.
+    
+    Returns:
+        tuple: (list of video file dictionaries, list of subdirectory paths to descend into)
+    """
+    video_files = []
+    video_entries = []
+    subdirs = []
+    dir_device = None
+
+    try:
+        with os.scandir(dir_path) as entries:
+            for entry in entries:
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+
+                if is_dir:
+                    # Unless links are followed, list symlinked folders but do not descend into them, like os.walk
+                    try:
+                        if symlinks == "always" or not entry.is_symlink():
+                            subdirs.append(entry.path)
+                    except OSError:
+                        pass
+                    continue
+
+                # Check the extension before touching the file's metadata
+                if os.path.splitext(entry.name)[1].lower() not in VIDEO_EXTENSIONS:
+                    continue
+                if symlinks == "never" and entry.is_symlink():
+                    continue
+                video_entries.append(entry)
+    except OSError as e:
+        if strict:
+            raise
+        print(f"Error accessing folder '{dir_path}': {e}")
+
+    if hdd_mode and os.name != "nt":
+        # The inode number comes with the listing on POSIX systems; on Windows DirEntry.inode()
+        # costs a call per file, so the listing order is kept there
+        video_entries.sort(key=lambda entry: entry.inode())
+
+    for entry in video_entries:
+        try:
+            stats = entry.stat()
+            st_dev = stats.st_dev
+            if not st_dev:
+                # DirEntry.stat() on Windows leaves st_dev at 0, so stat the folder once instead
+                if dir_device is None:
+                    dir_device = os.stat(dir_path).st_dev
+                st_dev = dir_device
+            device_id = stable_device_id(dir_path, st_dev)
+            # DirEntry.stat() on Windows has no inode either; DirEntry.inode() gets the file index
+            video_files.append(_video_file_record(entry.path, entry.name, stats, device_id,
+                                                  None if stats.st_ino else entry.inode()))
+        except (PermissionError, OSError) as e:
+            print(f"Error accessing file '{entry.path}': {e}")
+            continue
+
+    # In name order, so a folder reachable under several paths is walked under the same one every time
+    subdirs.sort()
+    return video_files, subdirs
+
+def _visit_directory(dir_path, manifest=None, symlinks=DEFAULT_SYMLINK_POLICY, visited=None, hdd_mode=False):
+    """
+    Visits one folder during a walk.
+    Without a manifest the folder is always listed. With a manifest the folder is stat'ed first, and it is
+    only listed again when its modification time differs from the one recorded by the previous scan, or
+    when the manifest does not hold all of its subfolders (for example after an interrupted scan).
+    For an unchanged folder the subfolders known from the manifest are returned instead.
+    Folders on FAT-family volumes (FAT12/16/32, exFAT) are always listed: their modification times,
+    and the missing one of a FAT root folder, do not show whether entries changed.
+    With a visited map, a folder whose (st_dev, st_ino) was already visited under another path, through a
+    symlink, a bind mount or a loop, is treated as empty, so its files are catalogued once.
+    
+    Args:
+        dir_path (str): The folder to visit.
+        manifest (dict, optional): Directory manifest as returned by load_directory_manifest.
+        symlinks (str): One of SYMLINK_POLICIES. Defaults to DEFAULT_SYMLINK_POLICY.
+        visited (dict, optional): Maps the (st_dev, st_ino) of the folders visited so far to their path.
+        hdd_mode (bool): Stat the files in inode order. Defaults to False.
+    
+    Returns:
+        tuple: (list of video file dictionaries, or None if the folder was unchanged,
+                list of subfolder paths to descend into,
+                (dir_mtime, child_count) for the manifest, or None when not tracked or the folder could not be listed)
+    """
+    dir_stats = None
+    if manifest is not None or visited is not None:
+        try:
+            dir_stats = os.stat(dir_path)
+        except OSError as e:
+            print(f"Error accessing folder '{dir_path}': {e}")
+            return [], [], None
+
+    if visited is not None:
+        # setdefault is atomic, so concurrent workers agree on which path visits a folder
+        first_path = visited.setdefault((dir_stats.st_dev, dir_stats.st_ino), dir_path)
+        if first_path != dir_path:
+            print(f"Skipping folder '{dir_path}': already visited as '{first_path}'.")
+            # A child count of -1 never matches, so the folder is listed if it is the first path reached next time
+            return [], [], None if manifest is None else (dir_stats.st_mtime_ns, -1)
+
+    if manifest is None:
+        dir_files, subdirs = scan_directory(dir_path, symlinks=symlinks, hdd_mode=hdd_mode)
+        return dir_files, subdirs, None
+
+    dir_mtime = dir_stats.st_mtime_ns
+
+    known_state = manifest["dirs"].get(dir_path)
+    known_subdirs = manifest["children"].get(dir_path, [])
+    if (known_state is not None and known_state[1] == dir_mtime and known_state[2] == len(known_subdirs)
+            and has_reliable_folder_mtimes(dir_path, dir_stats.st_dev)):
+        return None, known_subdirs, (dir_mtime, known_state[2])
+
+    try:
+        dir_files, subdirs = scan_directory(dir_path, strict=True, symlinks=symlinks, hdd_mode=hdd_mode)
+    except OSError as e:
+        print(f"Error accessing folder '{dir_path}': {e}")
+        return [], [], None
+    return dir_files, subdirs, (dir_mtime, len(subdirs))
+
+def walk_tree(folder_name, workers=1, manifest=None, symlinks=DEFAULT_SYMLINK_POLICY, hdd_mode=False):
+    """
+    Walks a folder tree and yields one result per visited folder.
+    With a single worker the folders are visited depth-first in name order. With more workers a pool of
+    threads shares one work queue of folders, and results are yielded as they complete.
+    Every folder is walked once, however many paths lead to it. When symlinked folders are followed, links
+    to folders inside the tree are left to the walk of their real path, which also keeps loops out.
+    
+    Args:
+        folder_name (str): The root folder to walk.
+        workers (int): Number of threads listing folders concurrently. Defaults to 1.
+        manifest (dict, optional): Directory manifest used to skip unchanged folders.
+        symlinks (str): One of SYMLINK_POLICIES. Defaults to DEFAULT_SYMLINK_POLICY.
+        hdd_mode (bool): Stat the files of each folder in inode order. Defaults to False.
+    
+    Yields:
+        tuple: (order_key, dir_path, parent_path, dir_files, dir_state) where order_key holds the child
+               index of every folder on the way down from the root, so sorting on it gives the serial order,
+               and dir_files and dir_state are as returned by _visit_directory.
+    """
+    if symlinks not in SYMLINK_POLICIES:
+        raise ValueError(f"Unknown symlink policy '{symlinks}', expected one of {', '.join(SYMLINK_POLICIES)}.")
+    visited = {}
+    tree_root = os.path.realpath(folder_name)
+
+    def visit(dir_path):
+        dir_files, subdirs, dir_state = _visit_directory(dir_path, manifest, symlinks, visited, hdd_mode)
+        if symlinks == "always" and dir_files is not None:
+            subdirs = [subdir for subdir in subdirs
+                       if not (os.path.islink(subdir) and is_within(os.path.realpath(subdir), tree_root))]
+            if dir_state is not None and dir_state[1] >= 0:
+                # The manifest counts the subfolders that are walked
+                dir_state = (dir_state[0], len(subdirs))
+        return dir_files, subdirs, dir_state
+
+    root_parent = None
+    if manifest is not None and folder_name in manifest["dirs"]:
+        # Keep the link to the parent folder when rescanning part of a previously scanned tree
+        root_parent = manifest["dirs"][folder_name][0]
+
+    if workers <= 1:
+        pending_dirs = [((), folder_name, root_parent)]
+        while pending_dirs:
+            order_key, dir_path, parent_path = pending_dirs.pop()
+            dir_files, subdirs, dir_state = visit(dir_path)
+            yield order_key, dir_path, parent_path, dir_files, dir_state
+            pending_dirs.extend((order_key + (index,), subdir, dir_path) for index, subdir in reversed(list(enumerate(subdirs))))
+        return
+
+    work_queue = queue.Queue()
+    # Bounded, so the workers cannot run far ahead of a slow consumer
+    result_queue = queue.Queue(maxsize=workers * 4)
+    # Set when the walk ends, including when the caller abandons it early
+    stop = threading.Event()
+
+    def put_result(result):
+        # Wait for room in the result queue, but give up once the walk has been stopped
+        while not stop.is_set():
+            try:
+                result_queue.put(result, timeout=WALK_RESULT_TIMEOUT)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def worker():
+        while not stop.is_set():
+            item = work_queue.get()
+            if item is None:
+                return
+            order_key, dir_path, parent_path = item
+            dir_files, subdirs, dir_state = [], [], None
+            try:
+                dir_files, subdirs, dir_state = visit(dir_path)
+            except Exception as e:
+                print(f"Error scanning folder '{dir_path}': {e}")
+            # Always report back before queuing the subfolders, so the walk counts them as
+            # outstanding before any of their own results can arrive
+            if not put_result(((order_key, dir_path, parent_path, dir_files, dir_state), len(subdirs))):
+                return
+            for index, subdir in enumerate(subdirs):
+                work_queue.put((order_key + (index,), subdir, dir_path))
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+
+    try:
+        work_queue.put(((), folder_name, root_parent))
+        outstanding = 1
+        while outstanding:
+            result, queued_subdirs = result_queue.get()
+            outstanding += queued_subdirs - 1
+            yield result
+    finally:
+        # Tell the workers to stop and wake the idle ones. Workers still listing a folder finish it,
+        # so empty the result queue to let their last result through, then wait for all of them.
+        stop.set()
+        for _ in threads:
+            work_queue.put(None)
+        while True:
+            try:
+                result_queue.get_nowait()
+            except queue.Empty:
+                break
+        for thread in threads:
+            thread.join()
+
+def get_video_files(folder_name, workers=1, preserve_order=False, symlinks=DEFAULT_SYMLINK_POLICY, hdd_mode=False):
+    """
+    Takes a folder name as input and returns a list of dictionaries containing details of all video files in the folder.
+    Each dictionary includes: partitionID, full pathname, filename, normalized_filename, filesize, the created and
+    modified times as epoch seconds, and the file's inode, which together with the device identifies hard links.
+    Folders reached more than once, through links, bind mounts or loops, are only listed the first time.
+    
+    Args:
+        folder_name (str): The folder to scan.
+        workers (int): Number of threads listing folders concurrently. Defaults to 1 (serial walk).
+        preserve_order (bool): With more than one worker, return the records in serial walk order. Defaults to False.
+        symlinks (str): One of SYMLINK_POLICIES. Defaults to DEFAULT_SYMLINK_POLICY.
+        hdd_mode (bool): Stat the files of each folder in inode order, for spinning disks, where a single
+                         worker also avoids seeking between folders. Defaults to False.
+    
+    Returns:
+        list: List of dictionaries containing the video file details.
+    """
+    # Check if the folder exists
+    if not os.path.isdir(folder_name):
+        raise ValueError(f"The folder '{folder_name}' does not exist.")
+
+    results = [(order_key, dir_files) for order_key, _, _, dir_files, _ in walk_tree(folder_name, workers, symlinks=symlinks, hdd_mode=hdd_mode) if dir_files]
+    if workers > 1 and preserve_order:
+        results.sort(key=lambda result: result[0])
+    return [video for _, dir_files in results for video in dir_files]
+
+def iter_video_files(folder_name, batch_size=SCAN_BATCH_SIZE, workers=1, symlinks=DEFAULT_SYMLINK_POLICY, hdd_mode=False):
+    """
+    Walks a folder and yields the details of its video files in batches, as the walk progresses.
+    Only one batch is held in memory at a time, so memory use does not grow with the size of the tree.
+    
+    Args:
+        folder_name (str): The folder to scan.
+        batch_size (int): Number of video file dictionaries per batch. Defaults to SCAN_BATCH_SIZE.
+        workers (int): Number of threads listing folders concurrently. Defaults to 1 (serial walk).
+        symlinks (str): One of SYMLINK_POLICIES. Defaults to DEFAULT_SYMLINK_POLICY.
+        hdd_mode (bool): Stat the files of each folder in inode order. Defaults to False.
+    
+    Yields:
+        list: Up to batch_size video file dictionaries, in the same shape as returned by get_video_files.
+    """
+    # Check if the folder exists
+    if not os.path.isdir(folder_name):
+        raise ValueError(f"The folder '{folder_name}' does not exist.")
+
+    batch = []
+    for _, _, _, dir_files, _ in walk_tree(folder_name, workers, symlinks=symlinks, hdd_mode=hdd_mode):
+        for video in dir_files:
+            batch.append(video)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+def load_directory_manifest(db_connection, device_id):
+    """
+    Loads the directory manifest recorded for a device by previous scans.
+    
+    Args:
+        db_connection (sqlite3.Connection): SQLite database connection.
+        device_id (int): The device whose folders should be loaded.
+    
+    Returns:
+        dict: {"dirs": {dir_path: (parent_path, dir_mtime, child_count)}, "children": {parent_path: [dir_path, ...]}}
+    """
+    manifest = {"dirs": {}, "children": {}}
+    cursor = db_connection.cursor()
+    cursor.execute(f"SELECT dir_path, parent_path, dir_mtime, child_count FROM {DIRECTORY_MANIFEST_TABLE} WHERE device_DUID = ?", (device_id,))
+    for dir_path, parent_path, dir_mtime, child_count in cursor:
+        manifest["dirs"][dir_path] = (parent_path, dir_mtime, child_count)
+        if parent_path is not None:
+            manifest["children"].setdefault(parent_path, []).append(dir_path)
+    for subdirs in manifest["children"].values():
+        subdirs.sort()
+    return manifest
+
+def manifest_subtree(manifest, folder_name):
+    """
+    Returns the set of folders the manifest records at or below a folder.
+    """
+    subtree = set()
+    pending_dirs = [folder_name] if folder_name in manifest["dirs"] else []
+    while pending_dirs:
+        dir_path = pending_dirs.pop()
+        subtree.add(dir_path)
+        pending_dirs.extend(manifest["children"].get(dir_path, []))
+    return subtree
+
+def update_directory_manifest(db_connection, device_id, dir_states, removed_dirs=()):
+    """
+    Records the state of the folders listed by a scan and forgets folders that no longer exist.
+    
+    Args:
+        db_connection (sqlite3.Connection): SQLite database connection.
+        device_id (int): The device the folders belong to.
+        dir_states (list): List of (dir_path, parent_path, dir_mtime, child_count) tuples.
+        removed_dirs (iterable): Folders to remove from the manifest.
+    """
+    cursor = db_connection.cursor()
+    cursor.executemany(f"""
+        INSERT INTO {DIRECTORY_MANIFEST_TABLE} (device_DUID, dir_path, parent_path, dir_mtime, child_count)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(device_DUID, dir_path) DO UPDATE SET
+        parent_path=excluded.parent_path,
+        dir_mtime=excluded.dir_mtime,
+        child_count=excluded.child_count
+    """, [(device_id,) + dir_state for dir_state in dir_states])
+    cursor.executemany(f"DELETE FROM {DIRECTORY_MANIFEST_TABLE} WHERE device_DUID = ? AND dir_path = ?",
+                       [(device_id, dir_path) for dir_path in removed_dirs])
+    db_connection.commit()
+
+def _count_video_file_updates(cursor):
+    """
+    Resets the count of video file records whose data an update changes, kept in temp.video_file_updates
+    by a temporary trigger of this connection. Rows updated only to record a scan generation or inode
+    are not counted.
+    """
+    cursor.execute("CREATE TEMP TABLE IF NOT EXISTS video_file_updates (count INTEGER NOT NULL)")
+    cursor.execute(f"""
+        CREATE TEMP TRIGGER IF NOT EXISTS count_video_file_updates AFTER UPDATE ON main.{VIDEO_FILES_TABLE}
+        WHEN old.filesize IS NOT new.filesize
+        OR old.created_time IS NOT new.created_time
+        OR old.modified_time IS NOT new.modified_time
+        OR old.normalized_filename IS NOT new.normalized_filename
+        OR old.full_pathname IS NOT new.full_pathname BEGIN
+            UPDATE video_file_updates SET count = count + 1;
+        END
+    """)
+    cursor.execute("DELETE FROM temp.video_file_updates")
+    cursor.execute("INSERT INTO temp.video_file_updates (count) VALUES (0)")
+
+def store_video_files_in_db(video_files, db_connection, update_existing=True, scan_generation=None):
+    """
+    Stores the list of video files into an SQLite database.
+    Dates are given and stored as epoch seconds (created_time, modified_time).
+    All records are written with one batched upsert inside a single transaction. Files that are already
+    in the database under the same canonical path key are updated in place when their size, dates,
+    normalized name or path spelling have changed, and stamped with the scan generation in the same statement.
+    
+    Args:
+        video_files (list): List of dictionaries containing video file details.
+        db_connection (sqlite3.Connection): SQLite database connection.
+        update_existing (bool): If False, files already in the database are left as they are. Defaults to True.
+        scan_generation (int, optional): Generation number of the scan the files were seen in. Every stored
+                                         file is tagged with it, including unchanged ones.
+    
+    Returns:
+        dict: Number of records that were "inserted", "updated" and "unchanged". Of several records with the
+              same path key, the last one is stored and the others count as unchanged.
+    """
+    cursor = db_connection.cursor()
+    search_indexed = _table_exists(cursor, SEARCH_CONTROL_TABLE)
+
+    # Keep one record per path key: a second spelling of a path in the same batch would update the row the
+    # first one inserted, which the paused full-text index has not seen yet, and corrupt the index
+    unique_files = {}
+    for video in video_files:
+        path_key = video.get("path_key") or canonical_path_key(video["full_pathname"])
+        unique_files[(video["device_DUID"], path_key)] = (video, path_key)
+
+    try:
+        with db_connection:
+            # New rows always get ids above the current maximum, which lets us tell inserts from updates.
+            # It is read inside the write transaction, so rows other connections commit are not taken for ours.
+            _begin_write(db_connection)
+            cursor.execute(f"SELECT COALESCE(MAX(id), 0) FROM {VIDEO_FILES_TABLE}")
+            last_id = cursor.fetchone()[0]
+            if search_indexed:
+                # Indexing row by row from the insert trigger is several times slower than one
+                # bulk insert, so pause the trigger for this transaction and index the new rows below
+                cursor.execute(f"UPDATE {SEARCH_CONTROL_TABLE} SET paused = 1")
+            # The upsert also rewrites rows that only need the scan generation or inode, so its row count
+            # cannot tell updated files from unchanged ones; a temporary trigger counts the updated files
+            _count_video_file_updates(cursor)
+            data_assignments = """
+                partitionID=excluded.partitionID,
+                full_pathname=excluded.full_pathname,
+                filename=excluded.filename,
+                normalized_filename=excluded.normalized_filename,
+                filesize=excluded.filesize,
+                created_time=excluded.created_time,
+                modified_time=excluded.modified_time,
+            """ if update_existing else ""
+            cursor.executemany(f"""
+                INSERT INTO {VIDEO_FILES_TABLE} (partitionID, full_pathname, path_key, filename, normalized_filename, filesize, created_time, modified_time, device_DUID, scan_generation, file_inode)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(device_DUID, path_key) DO UPDATE SET {data_assignments}
+                scan_generation=COALESCE(excluded.scan_generation, scan_generation),
+                file_inode=COALESCE(excluded.file_inode, file_inode)
+                WHERE (? AND (filesize IS NOT excluded.filesize
+                OR created_time IS NOT excluded.created_time
+                OR modified_time IS NOT excluded.modified_time
+                OR normalized_filename IS NOT excluded.normalized_filename
+                OR full_pathname IS NOT excluded.full_pathname))
+                OR scan_generation IS NOT COALESCE(excluded.scan_generation, scan_generation)
+                OR file_inode IS NOT COALESCE(excluded.file_inode, file_inode)
+            """, [(
+                video["partitionID"],
+                video["full_pathname"],
+                path_key,
+                video["filename"],
+                video["normalized_filename"],
+                video["filesize"],
+                video["created_time"],
+                video["modified_time"],
+                video["device_DUID"],
+                scan_generation,
+                video.get("file_inode"),
+                update_existing
+            ) for video, path_key in unique_files.values()])
+            cursor.execute("SELECT count FROM temp.video_file_updates")
+            updated = cursor.fetchone()[0]
+            if search_indexed:
+                cursor.execute(f"""
+                    INSERT INTO {VIDEO_FILES_SEARCH_TABLE} (rowid, filename, normalized_filename)
+                    SELECT id, filename, normalized_filename FROM {VIDEO_FILES_TABLE} WHERE id > ?
+                """, (last_id,))
+                cursor.execute(f"UPDATE {SEARCH_CONTROL_TABLE} SET paused = 0")
+            cursor.execute(f"SELECT COUNT(*) FROM {VIDEO_FILES_TABLE} WHERE id > ?", (last_id,))
+            inserted = cursor.fetchone()[0]
+    except sqlite3.Error as e:
+        print(f"Failed to store {len(video_files)} video file record(s): {e}")
+        raise
+    return {
+        "inserted": inserted,
+        "updated": updated,
+        "unchanged": len(video_files) - inserted - updated
+    }
+
+def initialize_db(db_path="video_files.db"):
+    """
+    Creates the video_files table in the SQLite database if it doesn't already exist and returns the connection.
+    
+    Args:
+        db_path (str): Path to the SQLite database file. Defaults to 'video_files.db'.
+    
+    Returns:
+        sqlite3.Connection: The SQLite connection object.
+    """
+    # Connect to the SQLite database (or create it if it doesn't exist)
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    # Tune the connection for bulk writes: write-ahead logging lets readers continue during a scan,
+    # NORMAL sync is safe with WAL, and a larger page cache keeps the indexes in memory
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA cache_size=-65536")  # 64 MB
+    cursor.execute("PRAGMA temp_store=MEMORY")
+
+    # A new catalog gets the current schema right away instead of being upgraded from the first one
+    if not _table_exists(cursor, VIDEO_FILES_TABLE):
+        _create_current_schema(conn)
+    # Create the device_metadata table if it doesn't exist
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {DEVICE_METADATA_TABLE} (
+            deviceid INTEGER PRIMARY KEY UNIQUE,
+            partitionid TEXT NOT NULL,
+            pathname TEXT NOT NULL,
+            volumename TEXT NOT NULL,
+            last_scanned DATETIME NOT NULL,
+            total_volume_size INTEGER,
+            remaining_free_space INTEGER
+        )
+    """)
+    # Create the directory manifest table used by incremental rescans if it doesn't exist
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {DIRECTORY_MANIFEST_TABLE} (
+            device_DUID INTEGER NOT NULL,
+            dir_path TEXT NOT NULL,
+            parent_path TEXT,
+            dir_mtime INTEGER NOT NULL,
+            child_count INTEGER NOT NULL,
+            PRIMARY KEY (device_DUID, dir_path)
+        )
+    """)
+
+    # Bring older catalogs up to the current schema
+    migrate_db(conn)
+
+    # Return the connection
+    return conn
+
+def _table_exists(cursor, table_name):
+    """
+    Returns True if a table with the given name exists in the database.
+    """
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (table_name,))
+    return cursor.fetchone() is not None
+
+def _begin_write(db_connection):
+    """
+    Opens a write transaction right away unless one is already open, so that ids and counts read next
+    cannot be changed by another connection before this one writes.
+    """
+    if not db_connection.in_transaction:
+        db_connection.execute("BEGIN IMMEDIATE")
+
+def _table_columns(cursor, table_name):
+    """
+    Returns the set of column names of a table.
+    """
+    cursor.execute(f"PRAGMA table_info({table_name})")
+    return {row[1] for row in cursor.fetchall()}
+
+def _migration_add_missing_columns(cursor):
+    """
+    Adds the columns that catalogs created by earlier versions of this program do not have yet.
+    """
+    if "normalized_filename" not in _table_columns(cursor, VIDEO_FILES_TABLE):
+        cursor.execute(f"ALTER TABLE {VIDEO_FILES_TABLE} ADD COLUMN normalized_filename TEXT NOT NULL DEFAULT ''")
+        cursor.execute(f"SELECT id, filename FROM {VIDEO_FILES_TABLE}")
+        cursor.executemany(f"UPDATE {VIDEO_FILES_TABLE} SET normalized_filename = ? WHERE id = ?",
+                           [(normalize_filename(filename), video_id) for video_id, filename in cursor.fetchall()])
+
+    device_columns = _table_columns(cursor, DEVICE_METADATA_TABLE)
+    for column in ("total_volume_size", "remaining_free_space"):
+        if column not in device_columns:
+            cursor.execute(f"ALTER TABLE {DEVICE_METADATA_TABLE} ADD COLUMN {column} INTEGER")
+
+def _migration_add_video_indexes(cursor):
+    """
+    Adds indexes for the columns the catalog is sorted and filtered on.
+    Every index also carries the row id, so sorting on an indexed column and the id needs no extra sort step.
+    """
+    cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_video_files_filesize ON {VIDEO_FILES_TABLE} (filesize)")
+    cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_video_files_normalized_filename ON {VIDEO_FILES_TABLE} (normalized_filename)")
+    cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_video_files_modified_date ON {VIDEO_FILES_TABLE} (modified_date)")
+    cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_video_files_device_filesize ON {VIDEO_FILES_TABLE} (device_DUID, filesize)")
+    cursor.execute("ANALYZE")
+
+def _migration_add_filename_search_index(cursor):
+    """
+    Adds an FTS5 index with the trigram tokenizer over filename and normalized_filename, kept in
+    sync with the video files table by triggers. SQLite builds without trigram support (before 3.34)
+    skip the index, and search_video_files falls back to a LIKE scan.
+    The insert trigger can be paused through the control table by writers that index their new rows in bulk.
+    """
+    try:
+        cursor.execute(f"""
+            CREATE VIRTUAL TABLE IF NOT EXISTS {VIDEO_FILES_SEARCH_TABLE} USING fts5(
+                filename,
+                normalized_filename,
+                content='{VIDEO_FILES_TABLE}',
+                content_rowid='id',
+                tokenize='trigram'
+            )
+        """)
+    except sqlite3.OperationalError as e:
+        print(f"Full-text filename search is not available in this SQLite build ({sqlite3.sqlite_version}): {e}")
+        return
+
+    cursor.execute(f"CREATE TABLE IF NOT EXISTS {SEARCH_CONTROL_TABLE} (paused INTEGER NOT NULL)")
+    cursor.execute(f"INSERT INTO {SEARCH_CONTROL_TABLE} (paused) VALUES (0)")
+    _create_search_triggers(cursor)
+    # Index the rows that are already in the catalog
+    cursor.execute(f"INSERT INTO {VIDEO_FILES_SEARCH_TABLE} ({VIDEO_FILES_SEARCH_TABLE}) VALUES ('rebuild')")
+
+def _create_search_triggers(cursor):
+    """
+    Creates the triggers that keep the full-text index in sync with the video files table.
+    """
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {VIDEO_FILES_SEARCH_TABLE}_insert AFTER INSERT ON {VIDEO_FILES_TABLE}
+        WHEN (SELECT paused FROM {SEARCH_CONTROL_TABLE}) = 0 BEGIN
+            INSERT INTO {VIDEO_FILES_SEARCH_TABLE} (rowid, filename, normalized_filename)
+            VALUES (new.id, new.filename, new.normalized_filename);
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {VIDEO_FILES_SEARCH_TABLE}_delete AFTER DELETE ON {VIDEO_FILES_TABLE} BEGIN
+            INSERT INTO {VIDEO_FILES_SEARCH_TABLE} ({VIDEO_FILES_SEARCH_TABLE}, rowid, filename, normalized_filename)
+            VALUES ('delete', old.id, old.filename, old.normalized_filename);
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {VIDEO_FILES_SEARCH_TABLE}_update AFTER UPDATE OF filename, normalized_filename ON {VIDEO_FILES_TABLE}
+        WHEN old.filename IS NOT new.filename OR old.normalized_filename IS NOT new.normalized_filename BEGIN
+            INSERT INTO {VIDEO_FILES_SEARCH_TABLE} ({VIDEO_FILES_SEARCH_TABLE}, rowid, filename, normalized_filename)
+            VALUES ('delete', old.id, old.filename, old.normalized_filename);
+            INSERT INTO {VIDEO_FILES_SEARCH_TABLE} (rowid, filename, normalized_filename)
+            VALUES (new.id, new.filename, new.normalized_filename);
+        END
+    """)
+
+def _migration_add_file_hashes_table(cursor):
+    """
+    Adds the cache of content hashes used by the duplicate finder. A hash is valid only while the file
+    keeps the size and modification date it had when it was hashed, so both are part of its key.
+    """
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {FILE_HASHES_TABLE} (
+            device_DUID INTEGER NOT NULL,
+            full_pathname TEXT NOT NULL,
+            filesize INTEGER NOT NULL,
+            modified_date TEXT NOT NULL,
+            sample_hash TEXT,
+            full_hash TEXT,
+            hashed_date DATETIME NOT NULL,
+            PRIMARY KEY (device_DUID, full_pathname, filesize, modified_date)
+        )
+    """)
+
+def _migration_add_media_properties_table(cursor):
+    """
+    Adds the table of container, duration, resolution and codecs read from the headers of video files.
+    Like hashes, the properties belong to one size and modification date of a file.
+    """
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {MEDIA_PROPERTIES_TABLE} (
+            device_DUID INTEGER NOT NULL,
+            full_pathname TEXT NOT NULL,
+            filesize INTEGER NOT NULL,
+            modified_date TEXT NOT NULL,
+            container TEXT,
+            duration REAL,
+            width INTEGER,
+            height INTEGER,
+            video_codec TEXT,
+            audio_codec TEXT,
+            probed_date DATETIME NOT NULL,
+            PRIMARY KEY (device_DUID, full_pathname, filesize, modified_date)
+        )
+    """)
+
+def _migration_add_scan_generation(cursor):
+    """
+    Adds the scan generation column. Every scan tags the files it sees with a new generation number,
+    so the files it did not see can be swept in one statement afterwards.
+    """
+    if "scan_generation" not in _table_columns(cursor, VIDEO_FILES_TABLE):
+        cursor.execute(f"ALTER TABLE {VIDEO_FILES_TABLE} ADD COLUMN scan_generation INTEGER")
+    cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_video_files_device_generation ON {VIDEO_FILES_TABLE} (device_DUID, scan_generation)")
+
+def _migration_add_file_inode(cursor):
+    """
+    Adds the inode column used to recognise files that were moved or renamed on their drive.
+    """
+    if "file_inode" not in _table_columns(cursor, VIDEO_FILES_TABLE):
+        cursor.execute(f"ALTER TABLE {VIDEO_FILES_TABLE} ADD COLUMN file_inode INTEGER")
+    cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_video_files_device_inode ON {VIDEO_FILES_TABLE} (device_DUID, file_inode)")
+
+def _epoch_from_text(column):
+    """
+    Returns the SQL expression converting a 'YYYY-MM-DD HH:MM:SS' local time column to epoch seconds,
+    or NULL when the column is empty or unreadable.
+    """
+    return f"CAST(strftime('%s', NULLIF({column}, ''), 'utc') AS INTEGER)"
+
+# Value columns of the hash and media property caches, as (name, type) pairs
+FILE_HASH_COLUMNS = [("sample_hash", "TEXT"), ("full_hash", "TEXT"), ("hashed_date", "DATETIME NOT NULL")]
+MEDIA_PROPERTY_COLUMNS = [("container", "TEXT"), ("duration", "REAL"), ("width", "INTEGER"), ("height", "INTEGER"),
+                          ("video_codec", "TEXT"), ("audio_codec", "TEXT"), ("probed_date", "DATETIME NOT NULL")]
+
+def _create_cache_table(cursor, table_name, value_columns):
+    """
+    Creates a cache table keyed on (device_DUID, full_pathname, filesize, modified_time), with the
+    modification date as epoch seconds, holding the given (name, type) value columns.
+    """
+    cursor.execute(f"""
+        CREATE TABLE {table_name} (
+            device_DUID INTEGER NOT NULL,
+            full_pathname TEXT NOT NULL,
+            filesize INTEGER NOT NULL,
+            modified_time INTEGER NOT NULL,
+            {', '.join(f'{name} {column_type}' for name, column_type in value_columns)},
+            PRIMARY KEY (device_DUID, full_pathname, filesize, modified_time)
+        )
+    """)
+
+def _rebuild_cache_table(cursor, table_name, value_columns):
+    """
+    Rebuilds a cache table keyed on (device_DUID, full_pathname, filesize, modified_date) with the
+    modification date as epoch seconds in a modified_time column.
+    """
+    _create_cache_table(cursor, f"{table_name}_rebuilt", value_columns)
+    value_names = ", ".join(name for name, _ in value_columns)
+    cursor.execute(f"""
+        INSERT OR IGNORE INTO {table_name}_rebuilt (device_DUID, full_pathname, filesize, modified_time, {value_names})
+        SELECT device_DUID, full_pathname, filesize, COALESCE({_epoch_from_text('modified_date')}, 0), {value_names}
+        FROM {table_name}
+    """)
+    cursor.execute(f"DROP TABLE {table_name}")
+    cursor.execute(f"ALTER TABLE {table_name}_rebuilt RENAME TO {table_name}")
+
+def _create_video_files_table(cursor, table_name):
+    """
+    Creates a video files table of the current layout: dates as epoch seconds and one record per device and path key.
+    """
+    cursor.execute(f"""
+        CREATE TABLE {table_name} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            partitionID TEXT NOT NULL,
+            full_pathname TEXT NOT NULL,
+            path_key TEXT NOT NULL,
+            filename TEXT NOT NULL,
+            normalized_filename TEXT NOT NULL,
+            filesize INTEGER NOT NULL,
+            created_time INTEGER,
+            modified_time INTEGER,
+            device_DUID INTEGER NOT NULL,
+            scan_generation INTEGER,
+            file_inode INTEGER,
+            UNIQUE(device_DUID, path_key)
+        )
+    """)
+
+def _replace_video_files_table(cursor):
+    """
+    Replaces the video files table with its filled '_rebuilt' copy, keeping the row ids.
+    Dropping the old table drops its indexes and full-text triggers too, and the view over it is dropped
+    first, as SQLite does not let a table its view reads from be dropped and renamed under it. Both are
+    created again by _create_video_files_indexes_and_view. The full-text index itself stays valid.
+    """
+    cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = ?", (VIDEO_FILES_TABLE,))
+    row = cursor.fetchone()
+    last_id = row[0] if row else 0
+    cursor.execute(f"DROP VIEW IF EXISTS {VIDEO_FILES_VIEW}")
+    cursor.execute(f"DROP TABLE {VIDEO_FILES_TABLE}")
+    cursor.execute(f"ALTER TABLE {VIDEO_FILES_TABLE}_rebuilt RENAME TO {VIDEO_FILES_TABLE}")
+    # Keep ids of deleted records from being handed out again
+    cursor.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = ?", (last_id, VIDEO_FILES_TABLE))
+
+def _create_video_files_indexes_and_view(cursor):
+    """
+    Creates the indexes, full-text triggers and VIDEO_FILES_VIEW view of the video files table with epoch
+    second dates, if they do not exist. The view shows the dates as local time text under their old names,
+    created_date and modified_date.
+    """
+    cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_video_files_filesize ON {VIDEO_FILES_TABLE} (filesize)")
+    cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_video_files_normalized_filename ON {VIDEO_FILES_TABLE} (normalized_filename)")
+    cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_video_files_modified_time ON {VIDEO_FILES_TABLE} (modified_time)")
+    cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_video_files_device_filesize ON {VIDEO_FILES_TABLE} (device_DUID, filesize)")
+    cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_video_files_device_generation ON {VIDEO_FILES_TABLE} (device_DUID, scan_generation)")
+    cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_video_files_device_inode ON {VIDEO_FILES_TABLE} (device_DUID, file_inode)")
+    if _table_exists(cursor, SEARCH_CONTROL_TABLE):
+        _create_search_triggers(cursor)
+    cursor.execute(f"""
+        CREATE VIEW IF NOT EXISTS {VIDEO_FILES_VIEW} AS
+        SELECT id, partitionID, full_pathname, filename, normalized_filename, filesize,
+               COALESCE(datetime(created_time, 'unixepoch', 'localtime'), '') AS created_date,
+               COALESCE(datetime(modified_time, 'unixepoch', 'localtime'), '') AS modified_date,
+               device_DUID, scan_generation, file_inode, created_time, modified_time
+        FROM {VIDEO_FILES_TABLE}
+    """)
+
+def _migration_store_dates_as_epoch_seconds(cursor):
+    """
+    Stores the created and modified dates as integer epoch seconds (created_time, modified_time) instead
+    of 'YYYY-MM-DD HH:MM:SS' text: 4 to 6 bytes per date instead of 20, and nothing to format while
+    scanning. SQLite cannot change the type of a column, so the video files table and the hash and media
+    caches keyed on the modified date are rebuilt, keeping the row ids.
+    The VIDEO_FILES_VIEW view shows the dates as local time text under their old names, created_date
+    and modified_date, for display and export.
+    """
+    if "created_time" not in _table_columns(cursor, VIDEO_FILES_TABLE):
+        cursor.execute(f"""
+            CREATE TABLE {VIDEO_FILES_TABLE}_rebuilt (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                partitionID TEXT NOT NULL,
+                full_pathname TEXT NOT NULL,
+                filename TEXT NOT NULL,
+                normalized_filename TEXT NOT NULL,
+                filesize INTEGER NOT NULL,
+                created_time INTEGER,
+                modified_time INTEGER,
+                device_DUID INTEGER NOT NULL,
+                scan_generation INTEGER,
+                file_inode INTEGER,
+                UNIQUE(device_DUID, full_pathname)
+            )
+        """)
+        cursor.execute(f"""
+            INSERT INTO {VIDEO_FILES_TABLE}_rebuilt (id, partitionID, full_pathname, filename, normalized_filename, filesize,
+                                                     created_time, modified_time, device_DUID, scan_generation, file_inode)
+            SELECT id, partitionID, full_pathname, filename, normalized_filename, filesize,
+                   {_epoch_from_text('created_date')}, {_epoch_from_text('modified_date')}, device_DUID, scan_generation, file_inode
+            FROM {VIDEO_FILES_TABLE}
+        """)
+        _replace_video_files_table(cursor)
+
+    if "modified_date" in _table_columns(cursor, FILE_HASHES_TABLE):
+        _rebuild_cache_table(cursor, FILE_HASHES_TABLE, FILE_HASH_COLUMNS)
+    if "modified_date" in _table_columns(cursor, MEDIA_PROPERTIES_TABLE):
+        _rebuild_cache_table(cursor, MEDIA_PROPERTIES_TABLE, MEDIA_PROPERTY_COLUMNS)
+
+    _create_video_files_indexes_and_view(cursor)
+    cursor.execute("ANALYZE")
+
+def _recorded_serial(partition_id):
+    """
+    Returns the volume serial number or UUID recorded in a device's partitionid text,
+    'E: (Volume name, serial)', or None if there is none.
+    """
+    match = re.search(r', ([^,()]*)\)$', partition_id or "")
+    return match.group(1).strip() if match else None
+
+def _merge_device_rows(cursor, device_ids, target_id):
+    """
+    Merges the records of several device ids that belong to the same volume into target_id.
+    device_ids is ordered from the most recently scanned device to the least; where more than one of them
+    holds a file, the copy of the most recently scanned one is kept. The device row of the most recently
+    scanned device is kept under target_id. The folders of the merged devices are dropped from the
+    directory manifest, so the next scan lists them again.
+    """
+    device_ids = list(dict.fromkeys(device_ids))
+    # Catalogs are merged on the path key once they have one
+    path_column = "path_key" if "path_key" in _table_columns(cursor, VIDEO_FILES_TABLE) else "full_pathname"
+    for index, device_id in enumerate(device_ids[1:], start=1):
+        newer_ids = device_ids[:index]
+        cursor.execute(f"""
+            DELETE FROM {VIDEO_FILES_TABLE} WHERE device_DUID = ? AND {path_column} IN (
+                SELECT {path_column} FROM {VIDEO_FILES_TABLE} WHERE device_DUID IN ({', '.join('?' * len(newer_ids))}))
+        """, [device_id] + newer_ids)
+    if target_id not in device_ids:
+        # Files already filed under the target id without a device row of their own are kept as the oldest copy
+        cursor.execute(f"""
+            DELETE FROM {VIDEO_FILES_TABLE} WHERE device_DUID = ? AND {path_column} IN (
+                SELECT {path_column} FROM {VIDEO_FILES_TABLE} WHERE device_DUID IN ({', '.join('?' * len(device_ids))}))
+        """, [target_id] + device_ids)
+
+    placeholders = ", ".join("?" * len(device_ids))
+    cursor.execute(f"UPDATE {VIDEO_FILES_TABLE} SET device_DUID = ? WHERE device_DUID IN ({placeholders})", [target_id] + device_ids)
+    for table in (FILE_HASHES_TABLE, MEDIA_PROPERTIES_TABLE):
+        if _table_exists(cursor, table):
+            cursor.execute(f"UPDATE OR REPLACE {table} SET device_DUID = ? WHERE device_DUID IN ({placeholders})", [target_id] + device_ids)
+    cursor.execute(f"DELETE FROM {DIRECTORY_MANIFEST_TABLE} WHERE device_DUID IN ({placeholders}) OR device_DUID = ?", device_ids + [target_id])
+
+    cursor.execute(f"DELETE FROM {DEVICE_METADATA_TABLE} WHERE deviceid <> ? AND deviceid IN ({placeholders})", [device_ids[0]] + device_ids)
+    if device_ids[0] != target_id:
+        cursor.execute(f"DELETE FROM {DEVICE_METADATA_TABLE} WHERE deviceid = ?", (target_id,))
+        cursor.execute(f"UPDATE {DEVICE_METADATA_TABLE} SET deviceid = ? WHERE deviceid = ?", (target_id, device_ids[0]))
+
+def _migration_merge_duplicate_devices(cursor):
+    """
+    Re-keys devices on a stable identity and merges the duplicate device rows left by earlier versions,
+    which keyed devices on st_dev: a drive that was remounted or plugged into another port got a new id
+    and a second copy of all its files.
+    Devices whose volume serial number or UUID was recorded are keyed on the id derived from it, and
+    devices with the same serial are merged. Devices without one are merged when they have the same
+    volume name and scan root and share catalogued files, which only happens for the same drive.
+    """
+    cursor.execute(f"SELECT deviceid, partitionid, pathname, volumename FROM {DEVICE_METADATA_TABLE} ORDER BY last_scanned DESC, deviceid")
+    groups = {}
+    for device_id, partition_id, pathname, volume_name in cursor.fetchall():
+        stable_id = device_id_from_serial(_recorded_serial(partition_id))
+        if stable_id is not None:
+            groups.setdefault(("serial", stable_id), []).append(device_id)
+        else:
+            groups.setdefault(("path", volume_name, pathname), []).append(device_id)
+
+    for key, device_ids in groups.items():
+        if key[0] == "serial":
+            if device_ids != [key[1]]:
+                _merge_device_rows(cursor, device_ids, key[1])
+            continue
+        # Without a serial, only merge devices that share files with the most recently scanned one
+        shared_ids = [device_ids[0]]
+        for device_id in device_ids[1:]:
+            cursor.execute(f"""
+                SELECT 1 FROM {VIDEO_FILES_TABLE} a
+                JOIN {VIDEO_FILES_TABLE} b ON b.device_DUID = ? AND b.full_pathname = a.full_pathname AND b.filesize = a.filesize
+                WHERE a.device_DUID = ? LIMIT 1
+            """, (device_ids[0], device_id))
+            if cursor.fetchone():
+                shared_ids.append(device_id)
+        if len(shared_ids) > 1:
+            _merge_device_rows(cursor, shared_ids, shared_ids[0])
+
+def _migration_add_path_key(cursor):
+    """
+    Keys video files on a canonical path key instead of the path as it was typed or listed, so the same file
+    reached as 'G:/Videos\\a.wmv' and 'g:\\videos\\A.wmv' is catalogued once. The video files table is
+    rebuilt with a path_key column and a unique (device_DUID, path_key) index replacing the one on
+    (device_DUID, full_pathname), keeping the row ids. Records that collapse onto the same key are merged in
+    the same pass: the copy seen by the most recent scan, and after that the newest record, is kept.
+    """
+    if "path_key" in _table_columns(cursor, VIDEO_FILES_TABLE):
+        return
+    cursor.connection.create_function("canonical_path_key", 1, canonical_path_key, deterministic=True)
+    cursor.execute(f"SELECT COUNT(*) FROM {VIDEO_FILES_TABLE}")
+    files_before = cursor.fetchone()[0]
+    _create_video_files_table(cursor, f"{VIDEO_FILES_TABLE}_rebuilt")
+    # Sorting on the new key makes the unique index grow in order; the window picks one record per key
+    cursor.execute(f"""
+        INSERT INTO {VIDEO_FILES_TABLE}_rebuilt (id, partitionID, full_pathname, path_key, filename, normalized_filename, filesize,
+                                                 created_time, modified_time, device_DUID, scan_generation, file_inode)
+        SELECT id, partitionID, full_pathname, path_key, filename, normalized_filename, filesize,
+               created_time, modified_time, device_DUID, scan_generation, file_inode
+        FROM (
+            SELECT *, ROW_NUMBER() OVER (PARTITION BY device_DUID, path_key
+                                         ORDER BY COALESCE(scan_generation, 0) DESC, id DESC) AS copy_number
+            FROM (SELECT *, canonical_path_key(full_pathname) AS path_key FROM {VIDEO_FILES_TABLE})
+        )
+        WHERE copy_number = 1
+        ORDER BY device_DUID, path_key
+    """)
+    merged = files_before - cursor.rowcount
+    if merged and _table_exists(cursor, SEARCH_CONTROL_TABLE):
+        # The merged copies are dropped from the full-text index while their rows can still be read
+        cursor.execute(f"""
+            INSERT INTO {VIDEO_FILES_SEARCH_TABLE} ({VIDEO_FILES_SEARCH_TABLE}, rowid, filename, normalized_filename)
+            SELECT 'delete', id, filename, normalized_filename FROM {VIDEO_FILES_TABLE}
+            WHERE id NOT IN (SELECT id FROM {VIDEO_FILES_TABLE}_rebuilt)
+        """)
+    _replace_video_files_table(cursor)
+    _create_video_files_indexes_and_view(cursor)
+    cursor.execute("ANALYZE")
+    if merged:
+        print(f"Merged {merged} video file record(s) that were catalogued more than once under different spellings of their path.")
+
+def _migration_reindex_renamed_files_only(cursor):
+    """
+    Recreates the trigger that updates the full-text index, so it only reindexes files whose name changed.
+    Scans rewrite the rows of the files they see to record the scan generation, names included.
+    """
+    if _table_exists(cursor, SEARCH_CONTROL_TABLE):
+        cursor.execute(f"DROP TRIGGER IF EXISTS {VIDEO_FILES_SEARCH_TABLE}_update")
+        _create_search_triggers(cursor)
+
+# Ordered list of (version, description, migration function) applied by migrate_db.
+# Append new migrations at the end; never renumber or change one that has been released.
+MIGRATIONS = [
+    (1, "Add columns missing from older catalogs", _migration_add_missing_columns),
+    (2, "Add indexes on filesize, normalized_filename, modified_date and device_DUID", _migration_add_video_indexes),
+    (3, "Add trigram full-text index over filenames", _migration_add_filename_search_index),
+    (4, "Add content hash cache for duplicate detection", _migration_add_file_hashes_table),
+    (5, "Add media properties read from video file headers", _migration_add_media_properties_table),
+    (6, "Add scan generation for removing deleted files", _migration_add_scan_generation),
+    (7, "Add file inode for detecting moved and renamed files", _migration_add_file_inode),
+    (8, "Store video file dates as epoch seconds", _migration_store_dates_as_epoch_seconds),
+    (9, "Key devices on their volume serial number or UUID and merge duplicates", _migration_merge_duplicate_devices),
+    (10, "Key video files on a canonical path and merge duplicate spellings", _migration_add_path_key),
+    (11, "Only reindex the names of renamed video files", _migration_reindex_renamed_files_only),
+]
+
+# Migrations that rewrite whole tables; the database is vacuumed after them to give the freed pages back
+COMPACTING_MIGRATIONS = {8, 10}
+
+def get_schema_version(db_connection):
+    """
+    Returns the schema version of the database, or 0 if no migration has been applied yet.
+    
+    Args:
+        db_connection (sqlite3.Connection): SQLite database connection.
+    
+    Returns:
+        int: The schema version.
+    """
+    cursor = db_connection.cursor()
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {SCHEMA_VERSION_TABLE} (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_date DATETIME NOT NULL
+        )
+    """)
+    cursor.execute(f"SELECT COALESCE(MAX(version), 0) FROM {SCHEMA_VERSION_TABLE}")
+    return cursor.fetchone()[0]
+
+def _create_current_schema(db_connection):
+    """
+    Creates the video files table with its indexes, view and full-text index, and the hash and media
+    property caches, in the layout the migrations lead to, and records the latest schema version.
+    """
+    get_schema_version(db_connection)
+    cursor = db_connection.cursor()
+    db_connection.commit()
+    cursor.execute("BEGIN")
+    try:
+        _create_video_files_table(cursor, VIDEO_FILES_TABLE)
+        _create_video_files_indexes_and_view(cursor)
+        _migration_add_filename_search_index(cursor)
+        _create_cache_table(cursor, FILE_HASHES_TABLE, FILE_HASH_COLUMNS)
+        _create_cache_table(cursor, MEDIA_PROPERTIES_TABLE, MEDIA_PROPERTY_COLUMNS)
+        cursor.execute(f"INSERT INTO {SCHEMA_VERSION_TABLE} (version, description, applied_date) VALUES (?, ?, ?)",
+                       (MIGRATIONS[-1][0], "Create the current schema", datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+        db_connection.commit()
+    except sqlite3.Error:
+        db_connection.rollback()
+        raise
+
+def migrate_db(db_connection):
+    """
+    Upgrades the database in place by applying every migration newer than its schema version.
+    Each migration runs in its own transaction together with the update of the schema_version table,
+    so an interrupted upgrade leaves the database at the last completed version. Upgrades that rewrote
+    whole tables end with a VACUUM, so the database file shrinks back to the size of its data.
+    
+    Args:
+        db_connection (sqlite3.Connection): SQLite database connection.
+    
+    Returns:
+        int: The schema version after the upgrade.
+    """
+    current_version = get_schema_version(db_connection)
+    cursor = db_connection.cursor()
+    compact = False
+    for version, description, migration in MIGRATIONS:
+        if version <= current_version:
+            continue
+        db_connection.commit()
+        cursor.execute("BEGIN")
+        try:
+            migration(cursor)
+            cursor.execute(f"INSERT INTO {SCHEMA_VERSION_TABLE} (version, description, applied_date) VALUES (?, ?, ?)",
+                           (version, description, datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+            db_connection.commit()
+        except sqlite3.Error:
+            db_connection.rollback()
+            raise
+        print(f"Upgraded database schema to version {version}: {description}")
+        current_version = version
+        compact = compact or version in COMPACTING_MIGRATIONS
+    if compact:
+        db_connection.execute("VACUUM")
+    return current_version
+
+def update_device_metadata(folder_name, db_connection):
+    """
+    Updates the device_metadata table with the folder's details, including volume information and total volume size.
+    The volume is resolved through VolumeInfo, once per scan session for all folders on it.
+    
+    Args:
+        folder_name (str): The folder path to update metadata for.
+        db_connection (sqlite3.Connection): SQLite database connection.
+    """
+    if not os.path.isdir(folder_name):
+        raise ValueError(f"The folder '{folder_name}' does not exist.")
+    
+    partition_id = os.path.splitdrive(folder_name)[0]
+    last_scanned = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    
+    try:
+        volume_info = get_volume_info(folder_name)
+        partition_id = volume_info["partition_id"]
+        volume_name = volume_info["volume_name"]
+        serial_number = volume_info["serial_number"] or 0
+        total_volume_size = volume_info["total_size"]
+        remaining_free_space = volume_info["free_space"]
+    except Exception as e:
+        print(f"Unable to retrieve volume information for --{partition_id}--. Using Unknown. Error: {e}")
+        volume_name = "Unknown"
+        serial_number = 0
+        total_volume_size = 0
+        remaining_free_space = 0
+
+    cursor = db_connection.cursor()
+    try:
+        cursor.execute(f"""
+            INSERT INTO {DEVICE_METADATA_TABLE} (deviceid, partitionid, pathname, volumename, last_scanned, total_volume_size, remaining_free_space)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(deviceid) DO UPDATE SET
+            partitionid=excluded.partitionid,
+            pathname=excluded.pathname,
+            volumename=excluded.volumename,
+            last_scanned=excluded.last_scanned,
+            total_volume_size=excluded.total_volume_size,
+            remaining_free_space=excluded.remaining_free_space
+        """, (stable_device_id(folder_name), f"{partition_id} ({volume_name}, {serial_number})", folder_name, volume_name, last_scanned, total_volume_size, remaining_free_space))
+        db_connection.commit()
+    except sqlite3.Error as e:
+        print(f"Failed to update device metadata: {e}")
+
+
+def dump_all_device_metadata(db_connection):
+    """
+    Dumps all records from the device_metadata table.
+    
+    Args:
+        db_connection (sqlite3.Connection): SQLite database connection.
+    
+    Returns:
+        list: List of dictionaries containing all device metadata records.
+    """
+    cursor = db_connection.cursor()
+    cursor.execute(f"SELECT * FROM {DEVICE_METADATA_TABLE}")
+    rows = cursor.fetchall()
+    columns = [column[0] for column in cursor.description]
+    return [dict(zip(columns, row)) for row in rows]
+
+def _like_escape(text):
+    """
+    Escapes the LIKE wildcards in a text, for use with ESCAPE '\\'.
+    """
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def _video_filter_clause(device_id=None, min_size=None, max_size=None, modified_from=None, modified_to=None, extension=None):
+    """
+    Builds the WHERE conditions and parameters for the video file filters.
+    
+    Returns:
+        tuple: (list of SQL conditions, list of parameters)
+    """
+    conditions = []
+    params = []
+    if device_id is not None:
+        conditions.append("device_DUID = ?")
+        params.append(device_id)
+    if min_size is not None:
+        conditions.append("filesize >= ?")
+        params.append(min_size)
+    if max_size is not None:
+        conditions.append("filesize <= ?")
+        params.append(max_size)
+    if modified_from is not None:
+        conditions.append("modified_time >= ?")
+        params.append(_epoch_seconds(modified_from, strict=True))
+    if modified_to is not None:
+        conditions.append("modified_time <= ?")
+        params.append(_epoch_seconds(modified_to, strict=True))
+    if extension:
+        if not extension.startswith("."):
+            extension = "." + extension
+        conditions.append("filename LIKE ? ESCAPE '\\'")
+        params.append("%" + _like_escape(extension))
+    return conditions, params
+
+def query_video_files(db_connection, sort_key="filesize", after=None, page_size=PAGE_SIZE, **filters):
+    """
+    Returns one page of video file records, using keyset pagination on (sort_key, id).
+    Each page starts right after the last row of the previous one through the index on the sort key,
+    so fetching a page costs the same no matter how deep into the catalog it is. Rows without a value
+    for the sort key (such as files without a modified date) come first, as in SQLite's ORDER BY.
+    
+    Args:
+        db_connection (sqlite3.Connection): SQLite database connection.
+        sort_key (str): Column to sort on, one of VIDEO_SORT_KEYS. Defaults to 'filesize'.
+        after (tuple, optional): The next-page cursor returned for the previous page; None for the first page.
+        page_size (int): Maximum number of rows in the page. Defaults to PAGE_SIZE.
+        **filters: Optional device_id, min_size, max_size, modified_from, modified_to (datetime,
+            'YYYY-MM-DD HH:MM:SS' text or epoch seconds; other dates raise ValueError) and extension (e.g. '.mkv').
+    
+    Returns:
+        tuple: (list of sqlite3.Row objects from the video files view, with the dates both as text and
+                as epoch seconds, cursor for the next page or None if this was the last page)
+    """
+    if sort_key not in VIDEO_SORT_KEYS:
+        raise ValueError(f"Cannot sort video files on '{sort_key}'. Choose one of: {', '.join(sorted(VIDEO_SORT_KEYS))}.")
+    sort_column = VIDEO_SORT_KEYS[sort_key]
+
+    conditions, params = _video_filter_clause(**filters)
+    if after is not None:
+        if sort_column == "id":
+            conditions.append("id > ?")
+            params.append(after[1])
+        elif after[0] is None:
+            # NULLs sort first: finish the rows without a value, then go on to all rows with one
+            conditions.append(f"(({sort_column} IS NULL AND id > ?) OR {sort_column} IS NOT NULL)")
+            params.append(after[1])
+        else:
+            conditions.append(f"({sort_column}, id) > (?, ?)")
+            params.extend(after)
+    where_clause = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    order_clause = "id" if sort_column == "id" else f"{sort_column}, id"
+
+    cursor = db_connection.cursor()
+    cursor.row_factory = sqlite3.Row
+    cursor.execute(f"SELECT * FROM {VIDEO_FILES_VIEW} {where_clause} ORDER BY {order_clause} LIMIT ?", params + [page_size])
+    rows = cursor.fetchall()
+
+    if len(rows) < page_size:
+        return rows, None
+    last_row = rows[-1]
+    return rows, (last_row[sort_column], last_row["id"])
+
+def iter_video_file_rows(db_connection, sort_key="filesize", page_size=PAGE_SIZE, **filters):
+    """
+    Yields every video file record matching the filters, one page at a time.
+    Only one page is held in memory, so callers can stream or export catalogs of any size.
+    
+    Args:
+        db_connection (sqlite3.Connection): SQLite database connection.
+        sort_key (str): Column to sort on, one of VIDEO_SORT_KEYS. Defaults to 'filesize'.
+        page_size (int): Number of rows fetched per query. Defaults to PAGE_SIZE.
+        **filters: The filters accepted by query_video_files.
+    
+    Yields:
+        sqlite3.Row: One video file record; columns can be read by name or index.
+    """
+    after = None
+    while True:
+        rows, after = query_video_files(db_connection, sort_key, after, page_size, **filters)
+        yield from rows
+        if after is None:
+            return
+
+def dump_all_video_files(db_connection, device_id=None):
+    """
+    Dumps all records from the video_files table.
+    For large catalogs prefer iter_video_file_rows, which does not hold every record in memory.
+    
+    Args:
+        db_connection (sqlite3.Connection): SQLite database connection.
+        device_id (int, optional): If provided, only returns video files from this device ID.
+    
+    Returns:
+        list: List of dictionaries containing all video file records.
+    """
+    return [dict(row) for row in iter_video_file_rows(db_connection, device_id=device_id)]
+
+
+def _open_export_file(output_path, compression=None):
+    """
+    Opens an export file for writing text, compressed with gzip or xz if requested.
+    When no compression is given it is inferred from a '.gz' or '.xz' file extension.
+    """
+    if compression is None:
+        extension = os.path.splitext(output_path)[1].lower()
+        compression = {".gz": "gzip", ".xz": "xz"}.get(extension)
+    # Moderate levels: the highest ones are several times slower for a few percent smaller files
+    if compression == "gzip":
+        return gzip.open(output_path, mode="wt", compresslevel=6, newline="", encoding="utf-8")
+    if compression == "xz":
+        return lzma.open(output_path, mode="wt", preset=3, newline="", encoding="utf-8")
+    if compression is not None:
+        raise ValueError(f"Unsupported compression '{compression}'. Use 'gzip' or 'xz'.")
+    return open(output_path, mode="w", newline="", encoding="utf-8")
+
+def export_video_files_to_csv(db_connection, output_path, columns=CATALOG_EXPORT_COLUMNS, compression=None,
+                              chunk_size=PAGE_SIZE, progress_callback=None):
+    """
+    Streams all video file records, joined with their device's volume name, into a CSV file.
+    Rows go straight from the SQLite cursor to the CSV writer in chunks, so memory use stays flat
+    however large the catalog is.
+    
+    Args:
+        db_connection (sqlite3.Connection): SQLite database connection.
+        output_path (str): Path of the CSV file to write.
+        columns (list): (header, SQL expression) pairs to export; expressions may use the aliases
+            v (video files view) and d (device metadata). Defaults to CATALOG_EXPORT_COLUMNS.
+        compression (str, optional): 'gzip' or 'xz'. Inferred from the file extension if not given.
+        chunk_size (int): Number of rows fetched and written at a time. Defaults to PAGE_SIZE.
+        progress_callback (callable, optional): Called after each chunk as progress_callback(rows_written, total_rows).
+    
+    Returns:
+        int: Number of records written.
+    """
+    cursor = db_connection.cursor()
+    cursor.execute(f"SELECT COUNT(*) FROM {VIDEO_FILES_TABLE}")
+    total_rows = cursor.fetchone()[0]
+
+    cursor.execute(f"""
+        SELECT {', '.join(expression for _, expression in columns)}
+        FROM {VIDEO_FILES_VIEW} v
+        LEFT JOIN {DEVICE_METADATA_TABLE} d ON d.deviceid = v.device_DUID
+        ORDER BY v.filesize, v.id
+    """)
+
+    rows_written = 0
+    with _open_export_file(output_path, compression) as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow([header for header, _ in columns])
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            writer.writerows(rows)
+            rows_written += len(rows)
+            if progress_callback:
+                progress_callback(rows_written, total_rows)
+    return rows_written
+
+def _dictionary_array(pa, values, dictionary):
+    """
+    Dictionary-encodes a batch of strings against a dictionary shared by all batches of an export.
+    New values are appended to the dictionary, so each batch's dictionary extends the previous one
+    and can be written as a delta in Arrow IPC files.
+    """
+    indices = [None if value is None else dictionary.setdefault(value, len(dictionary)) for value in values]
+    return pa.DictionaryArray.from_arrays(pa.array(indices, type=pa.int32()), pa.array(list(dictionary), type=pa.string()))
+
+def export_video_files_to_arrow(db_connection, output_path, file_format=None, batch_size=ARROW_BATCH_SIZE, progress_callback=None):
+    """
+    Exports all video file records, joined with their device's volume name, to a Parquet or Arrow IPC file.
+    Columns are typed (int64 sizes and ids, timestamp dates, dictionary-encoded partition and volume names)
+    and the rows are written in batches of batch_size, one Parquet row group or IPC record batch each.
+    Requires the pyarrow package.
+    
+    Args:
+        db_connection (sqlite3.Connection): SQLite database connection.
+        output_path (str): Path of the file to write.
+        file_format (str, optional): 'parquet' or 'arrow'. Inferred from the file extension if not given
+            ('.arrow', '.feather' and '.ipc' mean Arrow IPC, anything else Parquet).
+        batch_size (int): Number of rows per row group / record batch. Defaults to ARROW_BATCH_SIZE.
+        progress_callback (callable, optional): Called after each batch as progress_callback(rows_written, total_rows).
+    
+    Returns:
+        int: Number of records written.
+    """
+    import pyarrow as pa
+
+    if file_format is None:
+        extension = os.path.splitext(output_path)[1].lower()
+        file_format = "arrow" if extension in (".arrow", ".feather", ".ipc") else "parquet"
+    if file_format not in ("parquet", "arrow"):
+        raise ValueError(f"Unsupported file format '{file_format}'. Use 'parquet' or 'arrow'.")
+
+    dictionary_type = pa.dictionary(pa.int32(), pa.string())
+    schema = pa.schema([
+        ("id", pa.int64()),
+        ("partitionID", dictionary_type),
+        ("full_pathname", pa.string()),
+        ("filename", pa.string()),
+        ("normalized_filename", pa.string()),
+        ("filesize", pa.int64()),
+        ("created_date", pa.timestamp("s")),
+        ("modified_date", pa.timestamp("s")),
+        ("device_DUID", pa.int64()),
+        ("volumename", dictionary_type),
+    ])
+    partition_dictionary = {}
+    volume_dictionary = {}
+
+    cursor = db_connection.cursor()
+    # Seed the volume names up front: an IPC file cannot grow a dictionary that started out empty
+    cursor.execute(f"SELECT DISTINCT volumename FROM {DEVICE_METADATA_TABLE} ORDER BY volumename")
+    for (volume_name,) in cursor.fetchall():
+        volume_dictionary.setdefault(volume_name, len(volume_dictionary))
+
+    cursor.execute(f"SELECT COUNT(*) FROM {VIDEO_FILES_TABLE}")
+    total_rows = cursor.fetchone()[0]
+    # The timestamps hold local wall-clock time, like the dates shown in the catalog
+    cursor.execute(f"""
+        SELECT v.id, v.partitionID, v.full_pathname, v.filename, v.normalized_filename, v.filesize,
+               CAST(strftime('%s', v.created_time, 'unixepoch', 'localtime') AS INTEGER),
+               CAST(strftime('%s', v.modified_time, 'unixepoch', 'localtime') AS INTEGER),
+               v.device_DUID, d.volumename
+        FROM {VIDEO_FILES_TABLE} v
+        LEFT JOIN {DEVICE_METADATA_TABLE} d ON d.deviceid = v.device_DUID
+        ORDER BY v.filesize, v.id
+    """)
+
+    if file_format == "parquet":
+        import pyarrow.parquet as pq
+        writer = pq.ParquetWriter(output_path, schema)
+    else:
+        writer = pa.ipc.new_file(output_path, schema, options=pa.ipc.IpcWriteOptions(emit_dictionary_deltas=True))
+
+    rows_written = 0
+    try:
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            ids, partitions, full_paths, filenames, normalized_filenames, sizes, created, modified, devices, volumes = zip(*rows)
+            writer.write_batch(pa.RecordBatch.from_arrays([
+                pa.array(ids, type=pa.int64()),
+                _dictionary_array(pa, partitions, partition_dictionary),
+                pa.array(full_paths, type=pa.string()),
+                pa.array(filenames, type=pa.string()),
+                pa.array(normalized_filenames, type=pa.string()),
+                pa.array(sizes, type=pa.int64()),
+                pa.array(created, type=pa.timestamp("s")),
+                pa.array(modified, type=pa.timestamp("s")),
+                pa.array(devices, type=pa.int64()),
+                _dictionary_array(pa, volumes, volume_dictionary),
+            ], schema=schema))
+            rows_written += len(rows)
+            if progress_callback:
+                progress_callback(rows_written, total_rows)
+    finally:
+        writer.close()
+    return rows_written
+
+def _excel_sheet_title(title, used_titles, tag=""):
+    """
+    Turns a text into a valid, unique Excel sheet title (at most 31 characters, none of []:*?/\\).
+    The tag is appended whole, after the text is shortened to make room for it.
+    """
+    title = re.sub(r'[\[\]:*?/\\]', '_', title or "Unknown").strip("'") or "Unknown"
+    tag = re.sub(r'[\[\]:*?/\\]', '_', tag)
+    candidate = f"{title[:31 - len(tag)]}{tag}"
+    suffix = 2
+    while candidate.lower() in used_titles:
+        counter = f" ({suffix})"
+        candidate = f"{title[:31 - len(tag) - len(counter)]}{tag}{counter}"
+        suffix += 1
+    used_titles.add(candidate.lower())
+    return candidate
+
+def export_video_files_to_xlsx(db_connection, output_path, columns=DISPLAY_EXPORT_COLUMNS, sheet_per_device=False,
+                               chunk_size=PAGE_SIZE, progress_callback=None):
+    """
+    Streams all video file records into an Excel workbook using openpyxl's write-only mode.
+    Rows are appended straight from the SQLite cursor and written out as they go, so the workbook is
+    never held in memory. Sizes are written as numbers and dates as real date cells. A sheet that
+    reaches Excel's row limit continues on a new sheet. Requires the openpyxl package.
+    
+    Args:
+        db_connection (sqlite3.Connection): SQLite database connection.
+        output_path (str): Path of the .xlsx file to write.
+        columns (list): (header, SQL expression) pairs to export, as for export_video_files_to_csv.
+            Defaults to DISPLAY_EXPORT_COLUMNS.
+        sheet_per_device (bool): If True, write each device's files to its own sheet named after the volume.
+        chunk_size (int): Number of rows fetched at a time. Defaults to PAGE_SIZE.
+        progress_callback (callable, optional): Called after each chunk as progress_callback(rows_written, total_rows).
+    
+    Returns:
+        int: Number of records written.
+    """
+    from openpyxl import Workbook
+
+    # Date columns are read as epoch seconds and written as date cells, without going through text
+    epoch_columns = {"v.created_date": "v.created_time", "v.modified_date": "v.modified_time"}
+    date_columns = [index for index, (_, expression) in enumerate(columns) if expression in epoch_columns]
+    expressions = [epoch_columns.get(expression, expression) for _, expression in columns]
+    headers = [header for header, _ in columns]
+    order_clause = "v.device_DUID, v.filesize, v.id" if sheet_per_device else "v.filesize, v.id"
+
+    cursor = db_connection.cursor()
+    cursor.execute(f"SELECT COUNT(*) FROM {VIDEO_FILES_TABLE}")
+    total_rows = cursor.fetchone()[0]
+    cursor.execute(f"""
+        SELECT {', '.join(expressions)}, v.device_DUID, d.volumename
+        FROM {VIDEO_FILES_VIEW} v
+        LEFT JOIN {DEVICE_METADATA_TABLE} d ON d.deviceid = v.device_DUID
+        ORDER BY {order_clause}
+    """)
+
+    workbook = Workbook(write_only=True)
+    used_titles = set()
+    sheet = None
+    sheet_name = "Videos List"
+    sheet_tag = ""
+    sheet_rows = 0
+    current_device = None
+    rows_written = 0
+
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        for row in rows:
+            device_id, volume_name = row[-2], row[-1]
+            if sheet_per_device and device_id != current_device:
+                current_device = device_id
+                # The device id tells apart volumes with the same name, so it is never cut off
+                sheet_name = volume_name or "Unknown"
+                sheet_tag = f" {device_id}"
+                sheet = None
+            if sheet is None or sheet_rows >= EXCEL_MAX_ROWS:
+                sheet = workbook.create_sheet(_excel_sheet_title(sheet_name, used_titles, sheet_tag))
+                sheet.append(headers)
+                sheet_rows = 1
+
+            values = list(row[:-2])
+            for index in date_columns:
+                if values[index] is not None:
+                    values[index] = datetime.fromtimestamp(values[index])
+            sheet.append(values)
+            sheet_rows += 1
+        rows_written += len(rows)
+        if progress_callback:
+            progress_callback(rows_written, total_rows)
 
-    # Check if the folder exists
-    if not os.path.isdir(folder_name):
-        raise ValueError(f"The folder '{folder_name}' does not exist.")
+    if sheet is None:
+        workbook.create_sheet(sheet_name).append(headers)
+    workbook.save(output_path)
+    return rows_written
 
-    # Iterate through files in the folder
-    for root, _, files in os.walk(folder_name):
-        for file in files:
-            # Check if the file has a video extension
-            if os.path.splitext(file)[1].lower() in video_extensions:
-                full_path = os.path.join(root, file)
-                try:
-                    stats = os.stat(full_path)
-                    video_files.append({
-                        "partitionID": os.path.splitdrive(full_path)[0],
-                        "full_pathname": full_path,
-                        "filename": file,
-                        "normalized_filename": normalize_filename(file),
-                        "filesize": stats.st_size,
-                        "created_date": datetime.fromtimestamp(stats.st_ctime).strftime('%Y-%m-%d %H:%M:%S'),
-                        "modified_date": datetime.fromtimestamp(stats.st_mtime).strftime('%Y-%m-%d %H:%M:%S'),
-                        "device_DUID": int(stats.st_dev)
-                    })
-                except (PermissionError, OSError) as e:
-                    print(f"Error accessing file '{full_path}': {e}")
-                    continue
+def _import_field_name(header):
+    """
+    Maps a column header of a catalog export to the video file field it holds, or None if it is not used.
+    """
+    key = re.sub(r'[^a-z0-9]', '', str(header or "").lower())
+    return IMPORT_HEADER_ALIASES.get(key)
 
-    return video_files
+def _import_text(value):
+    """
+    Cleans a cell value read from an export; formulas and empty cells count as missing.
+    """
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    value = str(value).strip()
+    if not value or value.startswith("="):
+        return None
+    return value
 
-def store_video_files_in_db(video_files, db_connection):
+def _read_catalog_rows(file_path):
     """
-    Stores the list of video files into an SQLite database.
+    Reads the rows of a CSV or XLSX catalog export one at a time.
     
-    Args:
-        video_files (list): List of dictionaries containing video file details.
-        db_connection (sqlite3.Connection): SQLite database connection.
+    Yields:
+        tuple: (kind, dict) where kind is 'video' for video file rows and 'device' for rows of a device sheet
+               (such as the 'Hard drives' sheet of a hand-maintained workbook), and dict maps field names to values.
     """
-    cursor = db_connection.cursor()
+    def rows_with_fields(rows):
+        header = next(rows, None)
+        if header is None:
+            return
+        fields = [_import_field_name(column) for column in header]
+        kind = "video" if "full_pathname" in fields else "device" if "deviceid" in fields and "volumename" in fields else None
+        if kind is None:
+            print(f"Skipping a table without a recognised header: {header}")
+            return
+        for row in rows:
+            record = {field: _import_text(value) for field, value in zip(fields, row) if field}
+            if any(record.values()):
+                yield kind, record
 
-    # Insert video file details into the table
-    for video in video_files:
+    if file_path.lower().endswith((".xlsx", ".xlsm")):
+        from openpyxl import load_workbook
+
+        # data_only returns the cached results of formulas such as volume name lookups
+        workbook = load_workbook(file_path, read_only=True, data_only=True)
         try:
-            cursor.execute(f"""
-                INSERT INTO {VIDEO_FILES_TABLE} (partitionID, full_pathname, filename, normalized_filename, filesize, created_date, modified_date, device_DUID)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                video["partitionID"],
-                video["full_pathname"],
-                video["filename"],
-                video["normalized_filename"],
-                video["filesize"],
-                video["created_date"],
-                video["modified_date"],
-                video["device_DUID"]
-            ))
-        except sqlite3.IntegrityError as e:
-            print(f"Failed to insert record for file '{video['filename']}': {e}")
-
-    # Commit the changes to the database
-    db_connection.commit()
+            for sheet in workbook.worksheets:
+                yield from rows_with_fields(sheet.iter_rows(values_only=True))
+        finally:
+            workbook.close()
+    else:
+        with _open_import_file(file_path) as csv_file:
+            yield from rows_with_fields(iter(csv.reader(csv_file)))
 
-def initialize_db(db_path="video_files.db"):
+def _open_import_file(file_path):
     """
-    Creates the video_files table in the SQLite database if it doesn't already exist and returns the connection.
-    
-    Args:
-        db_path (str): Path to the SQLite database file. Defaults to 'video_files.db'.
-    
-    Returns:
-        sqlite3.Connection: The SQLite connection object.
+    Opens a CSV export for reading text, decompressing '.gz' and '.xz' files.
     """
-    # Connect to the SQLite database (or create it if it doesn't exist)
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension == ".gz":
+        return gzip.open(file_path, mode="rt", newline="", encoding="utf-8-sig")
+    if extension == ".xz":
+        return lzma.open(file_path, mode="rt", newline="", encoding="utf-8-sig")
+    return open(file_path, mode="r", newline="", encoding="utf-8-sig")
 
-    # Create the table if it doesn't exist
-    cursor.execute(f"""
-        CREATE TABLE IF NOT EXISTS {VIDEO_FILES_TABLE} (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            partitionID TEXT NOT NULL,
-            full_pathname TEXT NOT NULL,
-            filename TEXT NOT NULL,
-            normalized_filename TEXT NOT NULL,
-            filesize INTEGER NOT NULL,
-            created_date TEXT NOT NULL,
-            modified_date TEXT NOT NULL,
-            device_DUID INTEGER NOT NULL,
-            UNIQUE(device_DUID, full_pathname)
-        )
-    """)
-    # Create the device_metadata table if it doesn't exist
-    cursor.execute(f"""
-        CREATE TABLE IF NOT EXISTS {DEVICE_METADATA_TABLE} (
-            deviceid INTEGER PRIMARY KEY UNIQUE,
-            partitionid TEXT NOT NULL,
-            pathname TEXT NOT NULL,
-            volumename TEXT NOT NULL,
-            last_scanned DATETIME NOT NULL,
-            total_volume_size INTEGER,
-            remaining_free_space INTEGER
-        )
-    """)
+def _is_volume_name(volume_name):
+    """
+    Tells whether a volume name read from an export names a volume, rather than being missing or 'Unknown'.
+    """
+    return bool(volume_name) and volume_name.strip().casefold() not in ("unknown", UNRESOLVED_VOLUME_NAME.casefold())
 
-    # Return the connection
-    return conn
+def _match_catalog_paths(cursor, device_ids, records):
+    """
+    Looks up which devices already hold the (partitionID, path key) of the given video file records,
+    one indexed lookup per device and chunk of path keys.
 
-def update_device_metadata(folder_name, db_connection):
+    Returns:
+        dict: (case-folded partitionID, path key) mapped to the ids of the devices holding that file.
     """
-    Updates the device_metadata table with the folder's details, including volume information and total volume size.
+    path_keys = list({record["path_key"] for record in records})
+    matches = {}
+    for device_id in device_ids:
+        for start in range(0, len(path_keys), IMPORT_MATCH_CHUNK):
+            chunk = path_keys[start:start + IMPORT_MATCH_CHUNK]
+            cursor.execute(f"""
+                SELECT partitionID, path_key FROM {VIDEO_FILES_TABLE}
+                WHERE device_DUID = ? AND path_key IN ({', '.join('?' * len(chunk))})
+            """, [device_id] + chunk)
+            for partition_id, path_key in cursor.fetchall():
+                matches.setdefault(((partition_id or "").casefold(), path_key), []).append(device_id)
+    return matches
+
+def import_catalog_file(db_connection, file_path, batch_size=IMPORT_BATCH_SIZE, progress_callback=None):
+    """
+    Bulk-loads a catalog exported as CSV or XLSX back into the database, so catalogs of drives that can
+    no longer be mounted can be rebuilt without rescanning. Both the raw CSV dump and the GUI layout are
+    understood, as well as hand-maintained workbooks with a device sheet.
+    Rows are parsed in chunks and inserted with executemany, one transaction per chunk. Files already in
+    the catalog, or repeated in the file, are skipped based on (device_DUID, canonical path key).
+    Rows without a device id are matched on (partitionID, path key) to files already in the catalog, then by
+    volume name to the one known device of that name. Missing or 'Unknown' volume names never pick a device:
+    the rows left over are filed under an unresolved device, one per partition and volume name, with a
+    negative id (real device ids are never negative) and, without a volume name, UNRESOLVED_VOLUME_NAME.
+    Devices imported without a volume name take the name of the first matched row or device row naming them.
     
     Args:
-        folder_name (str): The folder path to update metadata for.
         db_connection (sqlite3.Connection): SQLite database connection.
-    """
-    if not os.path.isdir(folder_name):
-        raise ValueError(f"The folder '{folder_name}' does not exist.")
-    
-    partition_id = os.path.splitdrive(folder_name)[0]
-    last_scanned = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        file_path (str): The CSV (optionally .gz/.xz compressed) or XLSX file to import.
+        batch_size (int): Number of rows inserted per transaction. Defaults to IMPORT_BATCH_SIZE.
+        progress_callback (callable, optional): Called after each chunk as progress_callback(rows_read).
     
-    # Get volume information using win32api
-    try:
-        volume_info = win32api.GetVolumeInformation(partition_id)
-        volume_name = volume_info[0]  # Volume name
-        serial_number = volume_info[1]  # Volume serial number
-        total_volume_size = win32api.GetDiskFreeSpaceEx(partition_id)[1]  # Total size of the volume
-        remaining_free_space = win32api.GetDiskFreeSpaceEx(partition_id)[0]  # Free space on the volume
-    except Exception as e:
-        print(f"Unable to retrieve volume information for --{partition_id}--. Using Unknown. Error: {e}")
-        volume_name = "Unknown"
-        serial_number = 0
-        total_volume_size = 0
-        remaining_free_space = 0
+    Returns:
+        dict: Number of video records "imported" and "skipped", and number of "devices" added.
+    """
+    if not os.path.isfile(file_path):
+        raise ValueError(f"The file '{file_path}' does not exist.")
+
+    # The export's modification time is the best guess of when its catalog was last scanned
+    exported_date = datetime.fromtimestamp(os.stat(file_path).st_mtime).strftime('%Y-%m-%d %H:%M:%S')
 
     cursor = db_connection.cursor()
-    try:
-        cursor.execute(f"""
-            INSERT INTO {DEVICE_METADATA_TABLE} (deviceid, partitionid, pathname, volumename, last_scanned, total_volume_size, remaining_free_space)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-            ON CONFLICT(deviceid) DO UPDATE SET
-            partitionid=excluded.partitionid,
-            pathname=excluded.pathname,
-            volumename=excluded.volumename,
-            last_scanned=excluded.last_scanned,
-            total_volume_size=excluded.total_volume_size,
-            remaining_free_space=excluded.remaining_free_space
-        """, (os.stat(folder_name).st_dev, f"{partition_id} ({volume_name}, {serial_number})", folder_name, volume_name, last_scanned, total_volume_size, remaining_free_space))
-        db_connection.commit()
-    except sqlite3.Error as e:
-        print(f"Failed to update device metadata: {e}")
+    cursor.execute(f"SELECT deviceid, volumename FROM {DEVICE_METADATA_TABLE}")
+    known_devices = dict(cursor.fetchall())
+    cursor.execute(f"SELECT MIN(MIN(deviceid), 0) FROM {DEVICE_METADATA_TABLE}")
+    last_unresolved_id = cursor.fetchone()[0] or 0
 
+    new_devices = {}
+    named_devices = {}
+    unresolved_devices = {}
+    counts = {"imported": 0, "skipped": 0, "devices": 0}
+    rows_read = 0
+    batch = []
+    # Rows without a device id, resolved when their batch is written
+    unmatched = []
 
-def dump_all_device_metadata(db_connection):
+    def add_device(device_id, partition_id, pathname, volume_name, last_scanned, replace=False):
+        if device_id in known_devices:
+            # Name devices that were imported without a volume name once the name turns up
+            if _is_volume_name(volume_name) and not _is_volume_name(known_devices[device_id]):
+                named_devices[device_id] = known_devices[device_id] = volume_name
+            return
+        if device_id in new_devices and not replace:
+            return
+        if device_id in new_devices:
+            partition_id = partition_id or new_devices[device_id][1]
+        new_devices[device_id] = (device_id, partition_id or "", pathname or partition_id or "",
+                                  volume_name or "Unknown", last_scanned or exported_date)
+
+    def write_devices():
+        if new_devices:
+            # Devices first, so every imported file has its device row
+            cursor.executemany(f"""
+                INSERT INTO {DEVICE_METADATA_TABLE} (deviceid, partitionid, pathname, volumename, last_scanned)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(deviceid) DO NOTHING
+            """, list(new_devices.values()))
+            db_connection.commit()
+            counts["devices"] += len(new_devices)
+            for device in new_devices.values():
+                known_devices[device[0]] = device[3]
+            new_devices.clear()
+        if named_devices:
+            cursor.executemany(f"UPDATE {DEVICE_METADATA_TABLE} SET volumename = ? WHERE deviceid = ?",
+                               [(volume_name, device_id) for device_id, volume_name in named_devices.items()])
+            db_connection.commit()
+            named_devices.clear()
+
+    def store(records):
+        if records:
+            stored = store_video_files_in_db(records, db_connection, update_existing=False)
+            counts["imported"] += stored["inserted"]
+            counts["skipped"] += stored["unchanged"]
+
+    def resolve_device(record, volume_name, matches):
+        nonlocal last_unresolved_id
+        named = _is_volume_name(volume_name)
+        candidates = matches.get((record["partitionID"].casefold(), record["path_key"]), [])
+        if candidates:
+            device_id = next((device_id for device_id in candidates if named and known_devices[device_id] == volume_name), candidates[0])
+            add_device(device_id, None, None, volume_name, None)
+            return device_id
+        if named:
+            devices = [device_id for device_id, name in known_devices.items() if name == volume_name]
+            if len(devices) == 1:
+                return devices[0]
+        key = (record["partitionID"].casefold(), volume_name if named else None)
+        if key not in unresolved_devices:
+            last_unresolved_id -= 1
+            unresolved_devices[key] = last_unresolved_id
+            add_device(last_unresolved_id, record["partitionID"], record["partitionID"],
+                       volume_name if named else UNRESOLVED_VOLUME_NAME, None)
+        return unresolved_devices[key]
+
+    def write_batch():
+        write_devices()
+        store(batch)
+        batch.clear()
+        if unmatched:
+            # Rows stored above take part in the matching, so a file listed twice is not imported twice
+            matches = _match_catalog_paths(cursor, list(known_devices), [record for record, _ in unmatched])
+            for record, volume_name in unmatched:
+                record["device_DUID"] = resolve_device(record, volume_name, matches)
+            write_devices()
+            store([record for record, _ in unmatched])
+            unmatched.clear()
+        if progress_callback:
+            progress_callback(rows_read)
+
+    for kind, record in _read_catalog_rows(file_path):
+        rows_read += 1
+        if kind == "device":
+            try:
+                add_device(int(record["deviceid"]), None, record.get("pathname"), record.get("volumename"), record.get("last_scanned"), replace=True)
+            except (TypeError, ValueError):
+                print(f"Skipping device row without a valid device id: {record}")
+            continue
+
+        full_path = record.get("full_pathname")
+        try:
+            filesize = int(float(record["filesize"]))
+        except (KeyError, TypeError, ValueError):
+            filesize = None
+        if not full_path or filesize is None:
+            counts["skipped"] += 1
+            continue
+
+        filename = record.get("filename") or ntpath.basename(full_path)
+        partition_id = record.get("partitionID") or ntpath.splitdrive(full_path)[0]
+        volume_name = record.get("volumename")
+        try:
+            device_id = int(record["device_DUID"])
+        except (KeyError, TypeError, ValueError):
+            device_id = None
+        else:
+            add_device(device_id, partition_id, partition_id, volume_name, None)
+
+        video_file = {
+            "partitionID": partition_id,
+            "full_pathname": full_path,
+            "path_key": canonical_path_key(full_path),
+            "filename": filename,
+            "normalized_filename": record.get("normalized_filename") or normalize_filename(filename),
+            "filesize": filesize,
+            "created_time": _epoch_seconds(record.get("created_date")),
+            "modified_time": _epoch_seconds(record.get("modified_date")),
+            "device_DUID": device_id
+        }
+        if device_id is None:
+            unmatched.append((video_file, volume_name))
+        else:
+            batch.append(video_file)
+        if len(batch) + len(unmatched) >= batch_size:
+            write_batch()
+    write_batch()
+    return counts
+
+def merge_catalog_db(db_connection, other_db_path):
     """
-    Dumps all records from the device_metadata table.
+    Merges the video and device records of another catalog database into this one.
+    The other catalog is ATTACHed and copied with set-based INSERT ... SELECT ... ON CONFLICT statements,
+    all in one transaction. When both catalogs know a file or device, the copy from the catalog whose
+    device was scanned most recently (newest last_scanned) wins. Files only one catalog knows are kept.
+    Catalogs created by earlier versions of this program can be merged as they are.
     
     Args:
-        db_connection (sqlite3.Connection): SQLite database connection.
+        db_connection (sqlite3.Connection): SQLite database connection of the catalog to merge into.
+        other_db_path (str): Path of the catalog database to merge from. It is only read.
     
     Returns:
-        list: List of dictionaries containing all device metadata records.
+        dict: Number of "devices_added", "devices_updated", "files_added", "files_updated" and "files_unchanged".
     """
+    if not os.path.isfile(other_db_path):
+        raise ValueError(f"The database '{other_db_path}' does not exist.")
     cursor = db_connection.cursor()
-    cursor.execute(f"SELECT * FROM {DEVICE_METADATA_TABLE}")
-    rows = cursor.fetchall()
-    columns = [column[0] for column in cursor.description]
-    return [dict(zip(columns, row)) for row in rows]
+    cursor.execute("PRAGMA database_list")
+    if any(path and os.path.samefile(path, other_db_path) for _, name, path in cursor.fetchall() if name == "main"):
+        raise ValueError("A catalog cannot be merged into itself.")
 
-def dump_all_video_files(db_connection, device_id=None):
+    # ATTACH is not allowed inside an open transaction
+    db_connection.commit()
+    cursor.execute("ATTACH DATABASE ? AS merged_catalog", (other_db_path,))
+    try:
+        cursor.execute("SELECT name FROM merged_catalog.sqlite_master WHERE type = 'table'")
+        other_tables = {row[0] for row in cursor.fetchall()}
+        if VIDEO_FILES_TABLE not in other_tables or DEVICE_METADATA_TABLE not in other_tables:
+            raise ValueError(f"'{other_db_path}' is not a video catalog database.")
+
+        cursor.execute(f"PRAGMA merged_catalog.table_info({VIDEO_FILES_TABLE})")
+        other_video_columns = {row[1] for row in cursor.fetchall()}
+        if "created_time" in other_video_columns:
+            created_time, modified_time = "f.created_time", "f.modified_time"
+        else:
+            # Catalogs from before dates were stored as epoch seconds get them converted while copying
+            created_time, modified_time = _epoch_from_text("f.created_date"), _epoch_from_text("f.modified_date")
+        if "normalized_filename" in other_video_columns:
+            normalized_filename = "f.normalized_filename"
+        else:
+            # Catalogs from before the normalized name column get it computed while copying
+            db_connection.create_function("normalize_filename", 1, normalize_filename, deterministic=True)
+            normalized_filename = "normalize_filename(f.filename)"
+        if "path_key" in other_video_columns:
+            path_key = "f.path_key"
+        else:
+            # Catalogs from before path keys get them computed while copying
+            db_connection.create_function("canonical_path_key", 1, canonical_path_key, deterministic=True)
+            path_key = "canonical_path_key(f.full_pathname)"
+        cursor.execute(f"PRAGMA merged_catalog.table_info({DEVICE_METADATA_TABLE})")
+        other_device_columns = {row[1] for row in cursor.fetchall()}
+        volume_sizes = ", ".join(f"d.{column}" if column in other_device_columns else "NULL"
+                                 for column in ("total_volume_size", "remaining_free_space"))
+
+        search_indexed = _table_exists(cursor, SEARCH_CONTROL_TABLE)
+        with db_connection:
+            # The ids and counts the result is worked out from are read inside the write transaction,
+            # so rows other connections commit meanwhile are neither indexed twice nor counted as merged
+            _begin_write(db_connection)
+            cursor.execute(f"SELECT COALESCE(MAX(id), 0), COUNT(*) FROM {VIDEO_FILES_TABLE}")
+            last_id, files_before = cursor.fetchone()
+            cursor.execute(f"SELECT COUNT(*) FROM {DEVICE_METADATA_TABLE}")
+            devices_before = cursor.fetchone()[0]
+            cursor.execute(f"SELECT COUNT(*) FROM merged_catalog.{VIDEO_FILES_TABLE}")
+            other_files = cursor.fetchone()[0]
+
+            # Earlier versions keyed devices on st_dev. Devices with a recorded serial are filed under the
+            # stable id derived from it, as migration 9 does, so they do not come back as duplicates.
+            cursor.execute(f"SELECT deviceid, partitionid, last_scanned FROM merged_catalog.{DEVICE_METADATA_TABLE}")
+            merged_devices = []
+            for device_id, partition_id, last_scanned in cursor.fetchall():
+                stable_id = device_id_from_serial(_recorded_serial(partition_id))
+                merged_devices.append((device_id, device_id if stable_id is None else stable_id, last_scanned))
+            cursor.execute("""
+                CREATE TEMP TABLE IF NOT EXISTS merged_device_ids (
+                    deviceid INTEGER PRIMARY KEY, stable_id INTEGER NOT NULL, last_scanned DATETIME)
+            """)
+            cursor.execute("DELETE FROM temp.merged_device_ids")
+            cursor.executemany("INSERT INTO temp.merged_device_ids (deviceid, stable_id, last_scanned) VALUES (?, ?, ?)", merged_devices)
+
+            if search_indexed:
+                cursor.execute(f"UPDATE {SEARCH_CONTROL_TABLE} SET paused = 1")
+            # Files go first, while the device table still holds this catalog's scan dates. The other catalog
+            # is collapsed to one file per device and path key, the copy of the most recently scanned device
+            # and then the newest record, so no file updates a row inserted by this statement: the paused
+            # full-text index has not seen those rows yet.
+            cursor.execute(f"""
+                INSERT INTO {VIDEO_FILES_TABLE} (partitionID, full_pathname, path_key, filename, normalized_filename, filesize, created_time, modified_time, device_DUID)
+                SELECT partitionID, full_pathname, path_key, filename, normalized_filename, filesize, created_time, modified_time, device_DUID
+                FROM (
+                    SELECT f.partitionID, f.full_pathname, {path_key} AS path_key, f.filename,
+                           {normalized_filename} AS normalized_filename, f.filesize,
+                           {created_time} AS created_time, {modified_time} AS modified_time,
+                           COALESCE(m.stable_id, f.device_DUID) AS device_DUID,
+                           ROW_NUMBER() OVER (PARTITION BY COALESCE(m.stable_id, f.device_DUID), {path_key}
+                                              ORDER BY m.last_scanned DESC, f.id DESC) AS copy_number
+                    FROM merged_catalog.{VIDEO_FILES_TABLE} f
+                    LEFT JOIN temp.merged_device_ids m ON m.deviceid = f.device_DUID
+                )
+                WHERE copy_number = 1
+                ON CONFLICT(device_DUID, path_key) DO UPDATE SET
+                partitionID=excluded.partitionID,
+                full_pathname=excluded.full_pathname,
+                filename=excluded.filename,
+                normalized_filename=excluded.normalized_filename,
+                filesize=excluded.filesize,
+                created_time=excluded.created_time,
+                modified_time=excluded.modified_time
+                WHERE (filesize IS NOT excluded.filesize
+                OR created_time IS NOT excluded.created_time
+                OR modified_time IS NOT excluded.modified_time
+                OR normalized_filename IS NOT excluded.normalized_filename
+                OR full_pathname IS NOT excluded.full_pathname)
+                AND COALESCE((SELECT MAX(last_scanned) FROM temp.merged_device_ids WHERE stable_id = excluded.device_DUID), '')
+                  > COALESCE((SELECT last_scanned FROM main.{DEVICE_METADATA_TABLE} WHERE deviceid = excluded.device_DUID), '')
+            """)
+            files_changed = cursor.rowcount
+            if search_indexed:
+                cursor.execute(f"""
+                    INSERT INTO {VIDEO_FILES_SEARCH_TABLE} (rowid, filename, normalized_filename)
+                    SELECT id, filename, normalized_filename FROM {VIDEO_FILES_TABLE} WHERE id > ?
+                """, (last_id,))
+                cursor.execute(f"UPDATE {SEARCH_CONTROL_TABLE} SET paused = 0")
+
+            cursor.execute(f"""
+                INSERT INTO {DEVICE_METADATA_TABLE} (deviceid, partitionid, pathname, volumename, last_scanned, total_volume_size, remaining_free_space)
+                SELECT COALESCE(m.stable_id, d.deviceid), d.partitionid, d.pathname, d.volumename, d.last_scanned, {volume_sizes}
+                FROM merged_catalog.{DEVICE_METADATA_TABLE} d
+                LEFT JOIN temp.merged_device_ids m ON m.deviceid = d.deviceid
+                WHERE true ORDER BY d.last_scanned
+                ON CONFLICT(deviceid) DO UPDATE SET
+                partitionid=excluded.partitionid,
+                pathname=excluded.pathname,
+                volumename=excluded.volumename,
+                last_scanned=excluded.last_scanned,
+                total_volume_size=COALESCE(excluded.total_volume_size, total_volume_size),
+                remaining_free_space=COALESCE(excluded.remaining_free_space, remaining_free_space)
+                WHERE excluded.last_scanned > last_scanned
+            """)
+            devices_changed = cursor.rowcount
+            cursor.execute(f"SELECT COUNT(*) FROM {VIDEO_FILES_TABLE}")
+            files_added = cursor.fetchone()[0] - files_before
+            cursor.execute(f"SELECT COUNT(*) FROM {DEVICE_METADATA_TABLE}")
+            devices_added = cursor.fetchone()[0] - devices_before
+    except sqlite3.Error as e:
+        print(f"Failed to merge the catalog '{other_db_path}': {e}")
+        raise
+    finally:
+        cursor.execute("DETACH DATABASE merged_catalog")
+
+    return {
+        "devices_added": devices_added,
+        "devices_updated": devices_changed - devices_added,
+        "files_added": files_added,
+        "files_updated": files_changed - files_added,
+        "files_unchanged": other_files - files_changed
+    }
+
+def search_video_files(db_connection, query, limit=100, device_id=None):
     """
-    Dumps all records from the video_files table.
+    Searches the catalog for video files whose filename or normalized filename contains the query text.
+    Queries of three or more characters are answered from the trigram full-text index and ranked by
+    relevance; shorter queries, or databases without the index, use a LIKE scan instead.
     
     Args:
         db_connection (sqlite3.Connection): SQLite database connection.
-        device_id (int, optional): If provided, only returns video files from this device ID.
+        query (str): The text to search for. Matching is case-insensitive.
+        limit (int): Maximum number of results. Defaults to 100.
+        device_id (int, optional): If provided, only searches video files from this device ID.
     
     Returns:
-        list: List of dictionaries containing all video file records.
+        list: List of dictionaries containing the matching video file records, best matches first.
     """
+    query = query.strip()
+    if not query:
+        return []
+
     cursor = db_connection.cursor()
-    if device_id is not None:
-        cursor.execute(f"SELECT * FROM {VIDEO_FILES_TABLE} WHERE device_DUID = ? ORDER BY filesize", (device_id,))
+    has_search_index = _table_exists(cursor, VIDEO_FILES_SEARCH_TABLE)
+
+    device_filter = "AND v.device_DUID = ?" if device_id is not None else ""
+    device_params = (device_id,) if device_id is not None else ()
+
+    if has_search_index and len(query) >= 3:
+        # A quoted phrase matches the query as a substring with the trigram tokenizer. Every match is
+        # ranked before the limit is applied; the index sorts them on rank itself
+        match_expression = '"' + query.replace('"', '""') + '"'
+        cursor.execute(f"""
+            SELECT v.*, s.rank AS search_rank FROM {VIDEO_FILES_SEARCH_TABLE} s
+            JOIN {VIDEO_FILES_VIEW} v ON v.id = s.rowid
+            WHERE {VIDEO_FILES_SEARCH_TABLE} MATCH ? {device_filter}
+            ORDER BY s.rank
+            LIMIT ?
+        """, (match_expression,) + device_params + (limit,))
+        rows = cursor.fetchall()
+        columns = [column[0] for column in cursor.description][:-1]
+        return [dict(zip(columns, row)) for row in rows]
     else:
-        cursor.execute(f"SELECT * FROM {VIDEO_FILES_TABLE} ORDER BY filesize")
+        like_pattern = "%" + _like_escape(query) + "%"
+        cursor.execute(f"""
+            SELECT v.* FROM {VIDEO_FILES_VIEW} v
+            WHERE (v.filename LIKE ? ESCAPE '\\' OR v.normalized_filename LIKE ? ESCAPE '\\') {device_filter}
+            ORDER BY v.filename
+            LIMIT ?
+        """, (like_pattern, like_pattern) + device_params + (limit,))
+
     rows = cursor.fetchall()
     columns = [column[0] for column in cursor.description]
     return [dict(zip(columns, row)) for row in rows]
 
-
 def delete_video_files_by_device_id(device_id, db_connection):
     """
     Deletes all records from the video_files_metadata table for a given deviceID.
@@ -243,44 +2207,348 @@ def delete_video_files_by_device_id(device_id, db_connection):
             return
         
         cursor.execute(f"DELETE FROM {VIDEO_FILES_TABLE} WHERE device_DUID = ?", (device_id,))
+        # Forget the device's folders too, so the next scan lists them again
+        cursor.execute(f"DELETE FROM {DIRECTORY_MANIFEST_TABLE} WHERE device_DUID = ?", (device_id,))
         db_connection.commit()
         print(f"{count} video file record(s) for deviceID {device_id} have been deleted.")
     except sqlite3.Error as e:
         print(f"Failed to delete video file records for deviceID {device_id}: {e}")
    
 
-def scan_folder_and_update_db(db_connection, folder_to_scan):
+def _next_scan_generation(db_connection, device_id):
+    """
+    Returns the generation number for a new scan of a device: one more than any generation its files carry.
+    """
+    cursor = db_connection.cursor()
+    cursor.execute(f"SELECT COALESCE(MAX(scan_generation), 0) + 1 FROM {VIDEO_FILES_TABLE} WHERE device_DUID = ?", (device_id,))
+    return cursor.fetchone()[0]
+
+def _prepare_unseen_condition(cursor, unchanged_dirs=(), failed_dirs=()):
+    """
+    Fills the TEMP tables of folders a scan skipped or could not list, and returns the SQL condition that
+    selects the rows of the video files table (aliased as v) the scan should have seen but did not.
+    The condition takes (device_id, lower bound, upper bound, scan_generation) as parameters, the bounds
+    being path keys from path_key_subtree_bounds.
+    """
+    cursor.execute("CREATE TEMP TABLE IF NOT EXISTS scan_unchanged_dirs (dir_prefix TEXT PRIMARY KEY)")
+    cursor.execute("CREATE TEMP TABLE IF NOT EXISTS scan_failed_dirs (lower TEXT NOT NULL, upper TEXT NOT NULL)")
+    cursor.execute("DELETE FROM temp.scan_unchanged_dirs")
+    cursor.execute("DELETE FROM temp.scan_failed_dirs")
+    cursor.executemany("INSERT OR IGNORE INTO temp.scan_unchanged_dirs (dir_prefix) VALUES (?)",
+                       [(path_key_subtree_bounds(dir_path)[0],) for dir_path in unchanged_dirs])
+    cursor.executemany("INSERT INTO temp.scan_failed_dirs (lower, upper) VALUES (?, ?)",
+                       [path_key_subtree_bounds(dir_path) for dir_path in failed_dirs])
+    # rtrim(key, <every character of key but '/'>) cuts the file name off the path key,
+    # leaving its folder with a trailing '/'
+    return """
+        v.device_DUID = ? AND v.path_key >= ? AND v.path_key < ?
+        AND COALESCE(v.scan_generation, 0) < ?
+        AND rtrim(v.path_key, replace(v.path_key, '/', '')) NOT IN (SELECT dir_prefix FROM temp.scan_unchanged_dirs)
+        AND NOT EXISTS (SELECT 1 FROM temp.scan_failed_dirs f WHERE v.path_key >= f.lower AND v.path_key < f.upper)
+    """
+
+def _relink_paired_video_files(cursor, device_id, pairing_condition, params, scan_generation=None):
+    """
+    Pairs records added to a device (aliased as n) with older records (v) of the same file, recognised by the
+    same (inode, size, modification date), among the pairs selected by pairing_condition and its params.
+    The old record of each unambiguous pair takes over the new path, filename and normalized filename in
+    place, the new record is dropped, and hashes and media properties move along to the new path.
+    Runs inside the caller's transaction.
+    
+    Returns:
+        int: Number of moved or renamed files.
+    """
+    cursor.execute("DROP TABLE IF EXISTS temp.moved_video_files")
+    # Pair each new record with exactly one old record, and the other way round, so that
+    # ambiguous matches such as hard links are left alone. The inode index is forced, as the
+    # planner would otherwise search the old records by their path range once per new record.
+    cursor.execute(f"""
+        CREATE TEMP TABLE moved_video_files AS
+        SELECT MIN(v.id) AS old_id, n.id AS new_id, MIN(v.full_pathname) AS old_path, n.full_pathname AS new_path,
+               n.path_key AS new_key, n.partitionID, n.filename, n.normalized_filename, n.created_time
+        FROM {VIDEO_FILES_TABLE} n
+        JOIN {VIDEO_FILES_TABLE} v INDEXED BY idx_video_files_device_inode
+             ON v.device_DUID = n.device_DUID AND v.file_inode = n.file_inode
+             AND v.filesize = n.filesize AND v.modified_time = n.modified_time
+        WHERE n.device_DUID = ? AND n.file_inode IS NOT NULL AND {pairing_condition}
+        GROUP BY n.id HAVING COUNT(*) = 1
+    """, (device_id,) + tuple(params))
+    cursor.execute("DELETE FROM temp.moved_video_files WHERE old_id IN (SELECT old_id FROM temp.moved_video_files GROUP BY old_id HAVING COUNT(*) > 1)")
+    cursor.execute("SELECT COUNT(*) FROM temp.moved_video_files")
+    moved = cursor.fetchone()[0]
+    if moved:
+        for table in (FILE_HASHES_TABLE, MEDIA_PROPERTIES_TABLE):
+            if _table_exists(cursor, table):
+                cursor.execute(f"""
+                    UPDATE OR REPLACE {table} SET full_pathname = m.new_path
+                    FROM temp.moved_video_files m
+                    WHERE {table}.device_DUID = ? AND {table}.full_pathname = m.old_path
+                """, (device_id,))
+        cursor.execute(f"DELETE FROM {VIDEO_FILES_TABLE} WHERE id IN (SELECT new_id FROM temp.moved_video_files)")
+        cursor.execute(f"""
+            UPDATE {VIDEO_FILES_TABLE} SET
+                full_pathname = m.new_path,
+                path_key = m.new_key,
+                partitionID = m.partitionID,
+                filename = m.filename,
+                normalized_filename = m.normalized_filename,
+                created_time = m.created_time,
+                scan_generation = COALESCE(?, scan_generation)
+            FROM temp.moved_video_files m
+            WHERE {VIDEO_FILES_TABLE}.id = m.old_id
+        """, (scan_generation,))
+    cursor.execute("DROP TABLE temp.moved_video_files")
+    return moved
+
+def relink_moved_video_files(db_connection, device_id, folder_name, scan_generation, first_new_id,
+                             unchanged_dirs=(), failed_dirs=()):
+    """
+    Finds files a scan added that are really files it no longer saw under another path: moved or renamed
+    on the same drive, recognised by the same (device, inode, size, modification date). The old record
+    takes over the new path, filename and normalized filename in place, the duplicate new record is
+    dropped, and hashes and media properties move along to the new path instead of being computed again.
+    Everything is done with set-based statements in one transaction. Run it before sweeping unseen files.
+    
+    Args:
+        db_connection (sqlite3.Connection): SQLite database connection.
+        device_id (int): The device that was scanned.
+        folder_name (str): The root folder of the scan.
+        scan_generation (int): The generation the scan tagged the files it saw with.
+        first_new_id (int): Records with a higher id were added by the scan.
+        unchanged_dirs (iterable): Folders skipped because they were unchanged.
+        failed_dirs (iterable): Folders that could not be listed.
+    
+    Returns:
+        int: Number of moved or renamed files.
+    """
+    lower, upper = path_key_subtree_bounds(folder_name)
+    cursor = db_connection.cursor()
+    try:
+        with db_connection:
+            unseen = _prepare_unseen_condition(cursor, unchanged_dirs, failed_dirs)
+            return _relink_paired_video_files(cursor, device_id, f"n.id > ? AND n.scan_generation = ? AND {unseen}",
+                                              (first_new_id, scan_generation, device_id, lower, upper, scan_generation),
+                                              scan_generation)
+    except sqlite3.Error as e:
+        print(f"Failed to detect moved video files: {e}")
+        raise
+
+def relink_removed_video_files(db_connection, device_id, removed_files, removed_dirs, first_new_id):
+    """
+    Like relink_moved_video_files, for callers that know which paths went away, such as the folder watcher:
+    records added after first_new_id take over the records of the same files at the removed paths, or
+    anywhere below the removed folders, so their hashes and media properties are kept. Run it before
+    deleting the records of the removed paths.
+    
+    Args:
+        db_connection (sqlite3.Connection): SQLite database connection.
+        device_id (int): The device the paths are on.
+        removed_files (iterable): Paths of files that no longer exist.
+        removed_dirs (iterable): Folders that no longer exist.
+        first_new_id (int): Records with a higher id were just added.
+    
+    Returns:
+        int: Number of moved or renamed files.
+    """
+    ranges = [(key, key + "\0") for key in map(canonical_path_key, removed_files)]
+    ranges += [path_key_subtree_bounds(dir_path) for dir_path in removed_dirs]
+    if not ranges:
+        return 0
+    cursor = db_connection.cursor()
+    try:
+        with db_connection:
+            cursor.execute("CREATE TEMP TABLE IF NOT EXISTS removed_path_ranges (lower TEXT NOT NULL, upper TEXT NOT NULL)")
+            cursor.execute("DELETE FROM temp.removed_path_ranges")
+            cursor.executemany("INSERT INTO temp.removed_path_ranges (lower, upper) VALUES (?, ?)", ranges)
+            return _relink_paired_video_files(cursor, device_id, """
+                n.id > ? AND v.id <= ?
+                AND EXISTS (SELECT 1 FROM temp.removed_path_ranges r WHERE v.path_key >= r.lower AND v.path_key < r.upper)
+            """, (first_new_id, first_new_id))
+    except sqlite3.Error as e:
+        print(f"Failed to detect moved video files: {e}")
+        raise
+
+def sweep_unseen_video_files(db_connection, device_id, folder_name, scan_generation, unchanged_dirs=(), failed_dirs=()):
+    """
+    Deletes the records of video files below a scanned folder that the scan did not see, because the files
+    were deleted or moved away, with a single set-based DELETE on the scan generation.
+    Files in folders the scan skipped as unchanged, and anything below folders it could not list, are kept.
+    Only call this after a scan of the folder has completed.
+    
+    Args:
+        db_connection (sqlite3.Connection): SQLite database connection.
+        device_id (int): The device that was scanned.
+        folder_name (str): The root folder of the scan.
+        scan_generation (int): The generation the scan tagged the files it saw with.
+        unchanged_dirs (iterable): Folders skipped because they were unchanged; their files are kept.
+        failed_dirs (iterable): Folders that could not be listed; everything below them is kept.
+    
+    Returns:
+        int: Number of deleted video file records.
+    """
+    lower, upper = path_key_subtree_bounds(folder_name)
+    cursor = db_connection.cursor()
+    try:
+        with db_connection:
+            unseen = _prepare_unseen_condition(cursor, unchanged_dirs, failed_dirs)
+            cursor.execute(f"DELETE FROM {VIDEO_FILES_TABLE} AS v WHERE {unseen}",
+                           (device_id, lower, upper, scan_generation))
+            deleted = cursor.rowcount
+    except sqlite3.Error as e:
+        print(f"Failed to remove deleted video files from the catalog: {e}")
+        raise
+    return deleted
+
+def _adopt_legacy_device(db_connection, st_dev, device_id):
+    """
+    Moves the records of a device catalogued under its st_dev by an earlier version, before its volume
+    could be identified, to its stable device id. This is only done when the scan root recorded for the
+    st_dev device is on the same volume now, as st_dev numbers are handed out again to other drives.
+    """
+    cursor = db_connection.cursor()
+    cursor.execute(f"SELECT partitionid, pathname FROM {DEVICE_METADATA_TABLE} WHERE deviceid = ?", (st_dev,))
+    row = cursor.fetchone()
+    if row is None or device_id_from_serial(_recorded_serial(row[0])) is not None:
+        return
+    try:
+        if not os.path.isdir(row[1]) or stable_device_id(row[1]) != device_id:
+            return
+    except OSError:
+        return
+    with db_connection:
+        cursor.execute(f"SELECT deviceid FROM {DEVICE_METADATA_TABLE} WHERE deviceid IN (?, ?) ORDER BY last_scanned DESC", (device_id, st_dev))
+        _merge_device_rows(cursor, [device[0] for device in cursor.fetchall()], device_id)
+    print(f"Moved the records of device {st_dev} to its volume id {device_id}.")
+
+def scan_folder_and_update_db(db_connection, folder_to_scan, workers=1, full_rescan=False, batch_size=SCAN_BATCH_SIZE,
+                              symlinks=DEFAULT_SYMLINK_POLICY, hdd_mode=None):
     """
     Scans a folder for video files and updates the database with the results.
+    Folders whose modification time is unchanged since the previous scan are not listed again,
+    unless a full rescan is requested. Results are committed in batches while the walk is running.
+    Once the whole folder has been walked, files the scan did not see are removed from the catalog.
     
     Args:
         db_connection (sqlite3.Connection): SQLite database connection.
         folder_to_scan (str): The folder path to scan for video files.
+        workers (int): Number of threads used to walk the folder tree. Defaults to 1.
+        full_rescan (bool): If True, list every folder even if it is unchanged. Defaults to False.
+        batch_size (int): Number of video files written per transaction. Defaults to SCAN_BATCH_SIZE.
+        symlinks (str): One of SYMLINK_POLICIES. Defaults to DEFAULT_SYMLINK_POLICY.
+        hdd_mode (bool, optional): Stat the files of each folder in inode order. Defaults to None, which
+                                   turns it on when the folder is on a spinning disk.
+    
+    Returns:
+        dict: Number of video files "found", "inserted", "updated", "unchanged", "moved" and "removed", and
+              of "skipped_dirs" that were unchanged. None if the scan failed; the error is printed.
     """
     if not folder_to_scan:
         print("Folder path cannot be empty.")
-        return
+        return None
         
     # Remove quotes if present
     folder_to_scan = folder_to_scan.strip('"\'')
     
+    # Drop doubled and trailing separators, so the folder matches the paths the walk produces
+    folder_to_scan = os.path.normpath(folder_to_scan)
+
     # Convert to lowercase on Windows since case doesn't matter
     if os.name == 'nt':  # Windows
         folder_to_scan = folder_to_scan.lower() 
     
     try:
-        video_files = get_video_files(folder_to_scan)
-        if video_files:
-            print(f"Found {len(video_files)} video file(s).")
-            store_video_files_in_db(video_files, db_connection)
-            update_device_metadata(folder_to_scan, db_connection)
-            print("Database updated successfully.")
+        if not os.path.isdir(folder_to_scan):
+            raise ValueError(f"The folder '{folder_to_scan}' does not exist.")
+
+        # A new scan session: read the volume's size and free space fresh
+        clear_volume_cache()
+        st_dev = os.stat(folder_to_scan).st_dev
+        device_id = stable_device_id(folder_to_scan, st_dev)
+        if device_id != st_dev:
+            _adopt_legacy_device(db_connection, st_dev, device_id)
+        if hdd_mode is None:
+            hdd_mode = is_rotational(folder_to_scan)
+        manifest = load_directory_manifest(db_connection, device_id)
+        previous_dirs = manifest_subtree(manifest, folder_to_scan)
+        if full_rescan:
+            manifest = {"dirs": {}, "children": {}}
+        scan_generation = _next_scan_generation(db_connection, device_id)
+        cursor = db_connection.cursor()
+        first_new_id = None
+
+        pending_files = []
+        pending_states = []
+        found_files = 0
+        store_counts = {"inserted": 0, "updated": 0, "unchanged": 0}
+        visited_dirs = set()
+        unchanged_dirs = []
+        failed_dirs = []
+
+        def write_pending():
+            nonlocal first_new_id
+            if first_new_id is None:
+                # Records with a higher id were added by this scan. The first batch is written in the same
+                # transaction, so rows another writer commits meanwhile are not taken for this scan's.
+                _begin_write(db_connection)
+                cursor.execute(f"SELECT COALESCE(MAX(id), 0) FROM {VIDEO_FILES_TABLE}")
+                first_new_id = cursor.fetchone()[0]
+            # Store the batch and the states of the folders it came from in one go, so an
+            # interrupted scan keeps everything written so far and relists the rest next time
+            if pending_files:
+                for key, count in store_video_files_in_db(pending_files, db_connection, scan_generation=scan_generation).items():
+                    store_counts[key] += count
+            update_directory_manifest(db_connection, device_id, pending_states)
+            pending_files.clear()
+            pending_states.clear()
+
+        for _, dir_path, parent_path, dir_files, dir_state in walk_tree(folder_to_scan, workers, manifest, symlinks, hdd_mode):
+            visited_dirs.add(dir_path)
+            if dir_files is None:
+                unchanged_dirs.append(dir_path)
+                continue
+            if dir_state is None:
+                failed_dirs.append(dir_path)
+                continue
+            pending_files.extend(dir_files)
+            found_files += len(dir_files)
+            pending_states.append((dir_path, parent_path) + dir_state)
+            if len(pending_files) >= batch_size:
+                write_pending()
+        write_pending()
+
+        moved_files = removed_files = 0
+        if os.path.isdir(folder_to_scan):
+            # Only sweep while the drive is still there, so unplugging it mid-scan does not empty the catalog
+            moved_files = relink_moved_video_files(db_connection, device_id, folder_to_scan, scan_generation,
+                                                   first_new_id, unchanged_dirs, failed_dirs)
+            removed_files = sweep_unseen_video_files(db_connection, device_id, folder_to_scan, scan_generation,
+                                                     unchanged_dirs, failed_dirs)
+
+        skipped_dirs = len(unchanged_dirs)
+        if skipped_dirs:
+            print(f"Skipped {skipped_dirs} unchanged folder(s).")
+        if found_files:
+            print(f"Found {found_files} video file(s): {store_counts['inserted']} added, "
+                  f"{store_counts['updated']} updated, {store_counts['unchanged']} unchanged.")
+        elif skipped_dirs:
+            print("No new video files found since the last scan.")
         else:
             print("No video files found in the specified folder.")
+        if moved_files:
+            print(f"Recognised {moved_files} of the added video file(s) as moved or renamed.")
+        if removed_files:
+            print(f"Removed {removed_files} video file(s) that no longer exist.")
+
+        update_directory_manifest(db_connection, device_id, [], previous_dirs - visited_dirs)
+        if found_files or skipped_dirs or moved_files or removed_files:
+            update_device_metadata(folder_to_scan, db_connection)
+            print("Database updated successfully.")
+        return dict(store_counts, found=found_files, moved=moved_files, removed=removed_files, skipped_dirs=skipped_dirs)
     except ValueError as e:
         print(f"Error: {e}")
     except Exception as e:
         print(f"An unexpected error occurred: {e}")
+    return None
 
 def commandline_user_interface():
     """
@@ -301,29 +2569,35 @@ def commandline_user_interface():
             print("2. Dump all video file records to a CSV file")
             print("3. Dump all device metadata from the database")
             print("4. Delete all records for a given deviceID")
-            print("5. Exit the program")
+            print("5. Export all video file records to a Parquet or Arrow file")
+            print("6. Export all video file records to an Excel (.xlsx) file")
+            print("7. Import video file records from a CSV or Excel export")
+            print("8. Merge another catalog database into this one")
+            print("9. Find duplicate video files by content")
+            print("10. Read duration, resolution and codecs of video files")
+            print("11. Watch scanned folders and keep the catalog up to date")
+            print("12. Exit the program")
             
-            choice = input("Enter your choice (1/2/3/4/5): ").strip()
+            choice = input("Enter your choice (1/2/3/4/5/6/7/8/9/10/11/12): ").strip()
             
             if choice == "1":
                 folder_to_scan = input("Enter the folder path to scan for video files: ").strip()
                 scan_folder_and_update_db(db_connection, folder_to_scan)
             elif choice == "2":
+                output_file = "output_videos_list.csv"
                 try:
-                    # Dump all video files from the database and print them
-                    all_video_files = dump_all_video_files(db_connection)
-                    if all_video_files:
-                        output_file = "output_videos_list.csv"
-                        try:
-                            with open(output_file, mode="w", newline="", encoding="utf-8") as csvfile:
-                                writer = csv.DictWriter(csvfile, fieldnames=all_video_files[0].keys())
-                                writer.writeheader()
-                                writer.writerows(all_video_files)
-                            print(f"{len(all_video_files)} file records written to '{output_file}'.")
-                        except (IOError, PermissionError) as e:
-                            print(f"Error writing to CSV file: {e}")
+                    def show_progress(rows_written, total_rows):
+                        print(f"\rExported {rows_written} of {total_rows} file records...", end="", flush=True)
+
+                    # Stream all video files from the database into the CSV file
+                    rows_written = export_video_files_to_csv(db_connection, output_file, progress_callback=show_progress)
+                    if rows_written:
+                        print()
+                        print(f"{rows_written} file records written to '{output_file}'.")
                     else:
                         print("No video files found in the database.")
+                except (IOError, PermissionError) as e:
+                    print(f"Error writing to CSV file: {e}")
                 except sqlite3.Error as e:
                     print(f"Database error while dumping video files: {e}")
             elif choice == "3":
@@ -356,10 +2630,120 @@ def commandline_user_interface():
                 except sqlite3.Error as e:
                     print(f"Database error while deleting records: {e}")
             elif choice == "5":
+                output_file = input("Enter the output file (.parquet or .arrow) [output_videos_list.parquet]: ").strip().strip('"\'')
+                if not output_file:
+                    output_file = "output_videos_list.parquet"
+                try:
+                    def show_progress(rows_written, total_rows):
+                        print(f"\rExported {rows_written} of {total_rows} file records...", end="", flush=True)
+
+                    rows_written = export_video_files_to_arrow(db_connection, output_file, progress_callback=show_progress)
+                    if rows_written:
+                        print()
+                    print(f"{rows_written} file records written to '{output_file}'.")
+                except ImportError as e:
+                    print(f"Parquet/Arrow export needs the pyarrow package: {e}")
+                except (IOError, PermissionError, ValueError) as e:
+                    print(f"Error writing to file: {e}")
+                except sqlite3.Error as e:
+                    print(f"Database error while exporting video files: {e}")
+            elif choice == "6":
+                output_file = input("Enter the output file [output_videos_list.xlsx]: ").strip().strip('"\'')
+                if not output_file:
+                    output_file = "output_videos_list.xlsx"
+                sheet_per_device = input("Write one sheet per device? (y/N): ").strip().lower() == "y"
+                try:
+                    def show_progress(rows_written, total_rows):
+                        print(f"\rExported {rows_written} of {total_rows} file records...", end="", flush=True)
+
+                    rows_written = export_video_files_to_xlsx(db_connection, output_file, sheet_per_device=sheet_per_device,
+                                                              progress_callback=show_progress)
+                    if rows_written:
+                        print()
+                    print(f"{rows_written} file records written to '{output_file}'.")
+                except ImportError as e:
+                    print(f"Excel export needs the openpyxl package: {e}")
+                except (IOError, PermissionError) as e:
+                    print(f"Error writing to Excel file: {e}")
+                except sqlite3.Error as e:
+                    print(f"Database error while exporting video files: {e}")
+            elif choice == "7":
+                import_file = input("Enter the CSV or Excel file to import: ").strip().strip('"\'')
+                try:
+                    def show_progress(rows_read):
+                        print(f"\rRead {rows_read} rows...", end="", flush=True)
+
+                    counts = import_catalog_file(db_connection, import_file, progress_callback=show_progress)
+                    print()
+                    print(f"{counts['imported']} video file record(s) imported, {counts['skipped']} skipped, "
+                          f"{counts['devices']} device(s) added.")
+                except ImportError as e:
+                    print(f"Importing Excel files needs the openpyxl package: {e}")
+                except ValueError as e:
+                    print(f"Error: {e}")
+                except (IOError, PermissionError) as e:
+                    print(f"Error reading the import file: {e}")
+                except sqlite3.Error as e:
+                    print(f"Database error while importing video files: {e}")
+            elif choice == "8":
+                other_db = input("Enter the catalog database to merge (e.g. 11May2025_video_files.db): ").strip().strip('"\'')
+                try:
+                    counts = merge_catalog_db(db_connection, other_db)
+                    print(f"Devices: {counts['devices_added']} added, {counts['devices_updated']} updated.")
+                    print(f"Video files: {counts['files_added']} added, {counts['files_updated']} updated, "
+                          f"{counts['files_unchanged']} unchanged.")
+                except ValueError as e:
+                    print(f"Error: {e}")
+                except sqlite3.Error as e:
+                    print(f"Database error while merging catalogs: {e}")
+            elif choice == "9":
+                device_id = input("Enter a deviceID to search within, or leave empty to search all devices: ").strip()
+                try:
+                    from DuplicateFinder import find_duplicate_files, print_duplicate_report
+
+                    def show_progress(stage, done, total):
+                        print(f"\r{stage.replace('_', ' ').capitalize()}: {done}/{total} file(s)...", end="", flush=True)
+
+                    groups, stats = find_duplicate_files(db_connection, int(device_id) if device_id else None,
+                                                         workers=os.cpu_count() or 1, progress_callback=show_progress)
+                    print()
+                    print_duplicate_report(db_connection, groups, stats)
+                except ValueError:
+                    print("Invalid deviceID. Please enter a numeric value.")
+                except ImportError as e:
+                    print(f"Failed to load the duplicate finder: {e}")
+                except sqlite3.Error as e:
+                    print(f"Database error while looking for duplicates: {e}")
+            elif choice == "10":
+                device_id = input("Enter a deviceID to probe, or leave empty to probe all devices: ").strip()
+                try:
+                    from MediaProbe import probe_catalog_media
+
+                    def show_progress(done, total):
+                        print(f"\rProbed {done}/{total} file(s)...", end="", flush=True)
+
+                    counts = probe_catalog_media(db_connection, int(device_id) if device_id else None,
+                                                 progress_callback=show_progress)
+                    print()
+                    print(f"{counts['probed']} file(s) probed, {counts['unsupported']} in unsupported or corrupt "
+                          f"containers, {counts['unreadable']} could not be read.")
+                except ValueError:
+                    print("Invalid deviceID. Please enter a numeric value.")
+                except ImportError as e:
+                    print(f"Failed to load the media probe: {e}")
+                except sqlite3.Error as e:
+                    print(f"Database error while probing video files: {e}")
+            elif choice == "11":
+                try:
+                    from FolderWatcher import watch_catalog
+                    watch_catalog(db_connection)
+                except ImportError as e:
+                    print(f"Failed to load the folder watcher: {e}")
+            elif choice == "12":
                 print("Exiting the program.")
                 break
             else:
-                print("Invalid choice. Please enter 1, 2, 3, 4, or 5.")
+                print("Invalid choice. Please enter 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, or 12.")
     except Exception as e:
         print(f"An unexpected error occurred: {e}")
     finally:
@@ -375,36 +2759,9 @@ if __name__ == "__main__":
     if len(sys.argv) > 1 and sys.argv[1] == "--gui":
         from VSCode.FileOrganizer.gui_interface import graphical_user_interface
         graphical_user_interface()
+    elif len(sys.argv) > 1 and sys.argv[1] == "--watch":
+        # Daemon mode: keep the catalog in sync with the scanned folders; add --poll to skip inotify
+        from FolderWatcher import watch_catalog
+        watch_catalog(initialize_db(), use_inotify="--poll" not in sys.argv[2:])
     else:
         commandline_user_interface()
-
-def export_to_csv():
-    """Export video files to a CSV file"""
-    try:
-        file_path = filedialog.asksaveasfilename(
-            defaultextension=".csv",
-            filetypes=[("CSV files", "*.csv")],
-            title="Save Video Files as CSV"
-        )
-        if file_path:
-            with open(file_path, mode="w", newline="", encoding="utf-8") as csv_file:
-                writer = csv.writer(csv_file)
-                # Write header
-                writer.writerow(["Device Volume", "Filename", "Normalized Filename", "Full Path", "Size", "Created Date", "Modified Date"])
-                # Write video file data
-                db_connection = initialize_db()  # Initialize the database connection
-                all_video_items = dump_all_video_files(db_connection)  # Retrieve video file records from the database
-                for item in all_video_items:
-                    writer.writerow([
-                        item['volume_name'],
-                        item['filename'],
-                        item['normalized_filename'],
-                        item['fullpath'],
-                        item['filesize'],
-                        item['created_date'],
-                        item['modified_date']
-                    ])
-            messagebox.showinfo("Export Successful", "Video files exported successfully.")
-    except Exception as e:
-        messagebox.showerror("Export Error", f"Error exporting video files: {e}")
-
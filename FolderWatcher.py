@@ -0,0 +1,428 @@
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import sqlite3
+import struct
+import sys
+import time
+
+from FileOrganizer import (
+    VIDEO_FILES_TABLE,
+    DEVICE_METADATA_TABLE,
+    DIRECTORY_MANIFEST_TABLE,
+    SCAN_BATCH_SIZE,
+    canonical_path_key,
+    is_within,
+    scan_directory,
+    subtree_bounds,
+    path_key_subtree_bounds,
+    walk_tree,
+    manifest_subtree,
+    load_directory_manifest,
+    update_directory_manifest,
+    store_video_files_in_db,
+    relink_removed_video_files,
+)
+from VolumeInfo import stable_device_id
+
+# Seconds without new events after which a burst of changes is written to the catalog
+WATCH_COALESCE_DELAY = 2.0
+
+# Longest time in seconds a change waits while events keep coming in
+WATCH_MAX_DELAY = 30.0
+
+# Seconds between two passes of the polling fallback
+WATCH_POLL_INTERVAL = 60.0
+
+# inotify constants from <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_EVENT_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_ONLYDIR
+INOTIFY_EVENT_HEADER = struct.Struct("iIII")
+
+class _Inotify:
+    """
+    Minimal inotify binding through ctypes, watching every folder of a set of trees.
+    Raises OSError if inotify is not available on this system.
+    """
+
+    def __init__(self):
+        if not sys.platform.startswith("linux"):
+            raise OSError(errno.ENOSYS, "inotify is only available on Linux")
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.paths = {}
+
+    def add_watch(self, dir_path):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(dir_path), WATCH_EVENT_MASK)
+        if wd < 0:
+            error = ctypes.get_errno()
+            if error in (errno.ENOENT, errno.ENOTDIR, errno.EACCES):
+                return
+            # ENOSPC means the fs.inotify.max_user_watches limit was reached
+            raise OSError(error, f"Cannot watch '{dir_path}': {os.strerror(error)}")
+        self.paths[wd] = dir_path
+
+    def add_tree(self, root):
+        pending_dirs = [root]
+        while pending_dirs:
+            dir_path = pending_dirs.pop()
+            self.add_watch(dir_path)
+            try:
+                with os.scandir(dir_path) as entries:
+                    pending_dirs.extend(entry.path for entry in entries if entry.is_dir(follow_symlinks=False))
+            except OSError:
+                pass
+
+    def read_events(self, timeout):
+        """
+        Waits up to timeout seconds and returns the pending events as (path, mask) tuples.
+        """
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        events = []
+        pos = 0
+        while pos + INOTIFY_EVENT_HEADER.size <= len(data):
+            wd, mask, _, name_length = INOTIFY_EVENT_HEADER.unpack_from(data, pos)
+            pos += INOTIFY_EVENT_HEADER.size
+            name = os.fsdecode(data[pos:pos + name_length].rstrip(b"\0"))
+            pos += name_length
+            if mask & IN_IGNORED:
+                self.paths.pop(wd, None)
+                continue
+            dir_path = self.paths.get(wd)
+            if mask & IN_Q_OVERFLOW or dir_path is None:
+                events.append((None, mask))
+            else:
+                events.append((os.path.join(dir_path, name) if name else dir_path, mask))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+def load_watch_roots(db_connection):
+    """
+    Returns the roots of the previous scans whose drive is connected: the top folders of the directory
+    manifest, and the last scanned folder of each device. Roots nested in another root are dropped.
+
+    Args:
+        db_connection (sqlite3.Connection): SQLite database connection.
+
+    Returns:
+        list: (device_id, root folder) tuples.
+    """
+    cursor = db_connection.cursor()
+    cursor.execute(f"""
+        SELECT device_DUID, dir_path FROM {DIRECTORY_MANIFEST_TABLE} WHERE parent_path IS NULL
+        UNION
+        SELECT deviceid, pathname FROM {DEVICE_METADATA_TABLE}
+    """)
+    roots = []
+    for device_id, root in sorted(cursor.fetchall(), key=lambda row: len(row[1])):
+        try:
+            # The folder must be on the drive the catalog recorded for it
+            if stable_device_id(root) != device_id:
+                continue
+        except OSError:
+            continue
+        if not any(is_within(root, known_root) for _, known_root in roots):
+            roots.append((device_id, root))
+    return roots
+
+def delete_folder_records(db_connection, device_id, dir_path):
+    """
+    Deletes the catalog records of all video files at any depth below a folder, and the folder's manifest entries.
+
+    Args:
+        db_connection (sqlite3.Connection): SQLite database connection.
+        device_id (int): The device the folder is on.
+        dir_path (str): The folder that was deleted or moved away.
+
+    Returns:
+        int: Number of deleted video file records.
+    """
+    with db_connection:
+        cursor = db_connection.execute(f"""
+            DELETE FROM {VIDEO_FILES_TABLE} WHERE device_DUID = ? AND path_key >= ? AND path_key < ?
+        """, (device_id,) + path_key_subtree_bounds(dir_path))
+        deleted = cursor.rowcount
+        lower, upper = subtree_bounds(dir_path)
+        db_connection.execute(f"""
+            DELETE FROM {DIRECTORY_MANIFEST_TABLE} WHERE device_DUID = ? AND (dir_path = ? OR (dir_path >= ? AND dir_path < ?))
+        """, (device_id, dir_path, lower, upper))
+    return deleted
+
+def _delete_file_records(db_connection, device_id, paths):
+    if not paths:
+        return 0
+    with db_connection:
+        cursor = db_connection.executemany(f"DELETE FROM {VIDEO_FILES_TABLE} WHERE device_DUID = ? AND path_key = ?",
+                                           [(device_id, canonical_path_key(path)) for path in paths])
+    return cursor.rowcount
+
+def _vanished_files(db_connection, device_id, dir_path, dir_files):
+    """
+    Returns the paths of the catalog records directly inside a folder that a fresh listing of it no longer holds.
+    """
+    lower, upper = path_key_subtree_bounds(dir_path)
+    cursor = db_connection.cursor()
+    # Only the files directly inside the folder, not those in its subfolders
+    cursor.execute(f"""
+        SELECT full_pathname FROM {VIDEO_FILES_TABLE} WHERE device_DUID = ? AND path_key >= ? AND path_key < ?
+        AND instr(substr(path_key, ?), '/') = 0
+    """, (device_id, lower, upper, len(lower) + 1))
+    listed = {video["path_key"] for video in dir_files}
+    return [path for (path,) in cursor.fetchall() if canonical_path_key(path) not in listed]
+
+def _last_video_id(db_connection):
+    return db_connection.execute(f"SELECT COALESCE(MAX(id), 0) FROM {VIDEO_FILES_TABLE}").fetchone()[0]
+
+def _store(db_connection, video_files, counts):
+    for start in range(0, len(video_files), SCAN_BATCH_SIZE):
+        stored = store_video_files_in_db(video_files[start:start + SCAN_BATCH_SIZE], db_connection)
+        counts["upserted"] += stored["inserted"] + stored["updated"]
+
+def _remove_paths(db_connection, device_id, removed_files, removed_dirs, first_new_id, counts):
+    """
+    Removes the records of files and folders that went away. Files that reappeared under a new path, added
+    after first_new_id, keep their record, hashes and media properties, which move to the new path.
+    """
+    moved = relink_removed_video_files(db_connection, device_id, removed_files, removed_dirs, first_new_id)
+    # The new records of moved files were counted as upserted
+    counts["upserted"] -= moved
+    counts["moved"] += moved
+    counts["deleted"] += _delete_file_records(db_connection, device_id, removed_files)
+    for dir_path in removed_dirs:
+        counts["deleted"] += delete_folder_records(db_connection, device_id, dir_path)
+
+def poll_roots(db_connection, roots, batch_size=SCAN_BATCH_SIZE, inotify=None):
+    """
+    One pass of the polling fallback. Every root is walked with its directory manifest, so only folders whose
+    modification time changed are listed. Their files are upserted, files missing from them are deleted, and
+    folders that disappeared are removed with all their files; files that only moved keep their records.
+    Files changed in place, without any change to their folder, are only picked up by inotify or the next scan.
+
+    Args:
+        db_connection (sqlite3.Connection): SQLite database connection.
+        roots (list): (device_id, root folder) tuples, as returned by load_watch_roots.
+        batch_size (int): Number of video files written per transaction. Defaults to SCAN_BATCH_SIZE.
+        inotify (_Inotify, optional): Watcher to add the listed folders to, such as folders created while
+                                      its events were lost.
+
+    Returns:
+        dict: Number of records "upserted" (inserted or updated), "moved" and "deleted".
+    """
+    counts = {"upserted": 0, "moved": 0, "deleted": 0}
+    for device_id, root in roots:
+        manifest = load_directory_manifest(db_connection, device_id)
+        previous_dirs = manifest_subtree(manifest, root)
+        first_new_id = _last_video_id(db_connection)
+        seen_dirs = set()
+        removed_files = []
+        pending_files = []
+        pending_states = []
+        for _, dir_path, parent_path, dir_files, dir_state in walk_tree(root, manifest=manifest):
+            seen_dirs.add(dir_path)
+            if dir_files is None or dir_state is None:
+                # Unchanged, or could not be listed this time
+                continue
+            if inotify is not None:
+                # Watching a folder twice keeps the one watch, so only new folders are added
+                inotify.add_watch(dir_path)
+            removed_files.extend(_vanished_files(db_connection, device_id, dir_path, dir_files))
+            pending_files.extend(dir_files)
+            pending_states.append((dir_path, parent_path) + dir_state)
+            if len(pending_files) >= batch_size:
+                _store(db_connection, pending_files, counts)
+                update_directory_manifest(db_connection, device_id, pending_states)
+                pending_files, pending_states = [], []
+        _store(db_connection, pending_files, counts)
+        update_directory_manifest(db_connection, device_id, pending_states)
+        _remove_paths(db_connection, device_id, removed_files, sorted(previous_dirs - seen_dirs), first_new_id, counts)
+    return counts
+
+def _root_of(roots, path):
+    for device_id, root in roots:
+        if is_within(path, root):
+            return device_id, root
+    return None, None
+
+def apply_changes(db_connection, roots, changed_paths, inotify=None):
+    """
+    Writes a coalesced set of changed paths to the catalog. The folder holding each changed path is listed
+    again, and new or moved-in folders are listed in full (and watched): their files are upserted, files
+    missing from them are deleted, and their state is recorded in the directory manifest, so the next scan
+    or polling pass skips them. Folders that no longer exist are deleted with everything below them.
+    Files and folders moved within the watched roots keep their records, hashes and media properties.
+
+    Args:
+        db_connection (sqlite3.Connection): SQLite database connection.
+        roots (list): (device_id, root folder) tuples being watched.
+        changed_paths (dict): Maps each changed path to True if it was reported as a folder.
+        inotify (_Inotify, optional): Watcher to add new folders to.
+
+    Returns:
+        dict: Number of records "upserted" (inserted or updated), "moved" and "deleted".
+    """
+    # Per device: the folders listed, as dir_path -> (root, dir_files, subdirs, dir_mtime), and the folders removed
+    listed_dirs = {}
+    removed_dirs = {}
+    counts = {"upserted": 0, "moved": 0, "deleted": 0}
+
+    def list_folder(device_id, root, dir_path):
+        device_dirs = listed_dirs.setdefault(device_id, {})
+        if dir_path in device_dirs:
+            return []
+        try:
+            dir_mtime = os.stat(dir_path).st_mtime_ns
+            dir_files, subdirs = scan_directory(dir_path, strict=True)
+        except OSError as e:
+            print(f"Error accessing folder '{dir_path}': {e}")
+            return []
+        device_dirs[dir_path] = (root, dir_files, subdirs, dir_mtime)
+        return subdirs
+
+    for path, is_dir in sorted(changed_paths.items()):
+        device_id, root = _root_of(roots, path)
+        if device_id is None:
+            continue
+        if os.path.isdir(path) and not os.path.islink(path):
+            if inotify is not None:
+                inotify.add_tree(path)
+            pending_dirs = [path]
+            while pending_dirs:
+                pending_dirs.extend(list_folder(device_id, root, pending_dirs.pop()))
+        elif is_dir and not os.path.lexists(path):
+            removed_dirs.setdefault(device_id, []).append(path)
+        if path != root and os.path.isdir(os.path.dirname(path)):
+            # The folder the change happened in
+            list_folder(device_id, root, os.path.dirname(path))
+
+    first_new_id = _last_video_id(db_connection)
+    removed_files = {}
+    for device_id, device_dirs in listed_dirs.items():
+        videos = []
+        for dir_path, (_, dir_files, _, _) in device_dirs.items():
+            removed_files.setdefault(device_id, []).extend(_vanished_files(db_connection, device_id, dir_path, dir_files))
+            videos.extend(dict(video, device_DUID=device_id) for video in dir_files)
+        _store(db_connection, videos, counts)
+    for device_id in set(listed_dirs) | set(removed_dirs):
+        _remove_paths(db_connection, device_id, removed_files.get(device_id, []), removed_dirs.get(device_id, []),
+                      first_new_id, counts)
+        update_directory_manifest(db_connection, device_id, [
+            (dir_path, None if dir_path == root else os.path.dirname(dir_path), dir_mtime, len(subdirs))
+            for dir_path, (root, _, subdirs, dir_mtime) in listed_dirs.get(device_id, {}).items()])
+    return counts
+
+def _report(counts):
+    if counts["upserted"] or counts["moved"] or counts["deleted"]:
+        print(f"{time.strftime('%H:%M:%S')} Catalog updated: {counts['upserted']} video file(s) added or changed, "
+              f"{counts['moved']} moved, {counts['deleted']} removed.")
+
+def watch_catalog(db_connection, roots=None, use_inotify=True, coalesce_delay=WATCH_COALESCE_DELAY,
+                  poll_interval=WATCH_POLL_INTERVAL, stop_after=None):
+    """
+    Keeps the catalog in sync with previously scanned folders until interrupted with Ctrl+C.
+    On Linux, inotify reports created, written, moved and deleted files and folders. Events are collected
+    until no new one arrives for coalesce_delay seconds (or for at most WATCH_MAX_DELAY seconds), and each
+    burst is written with batched upserts and deletes. Where inotify is not available, its watch limit is
+    reached or its queue overflows, the roots are polled with the directory manifest instead.
+
+    Args:
+        db_connection (sqlite3.Connection): SQLite database connection.
+        roots (list, optional): (device_id, root folder) tuples to watch. Defaults to load_watch_roots().
+        use_inotify (bool): If False, always use the polling fallback. Defaults to True.
+        coalesce_delay (float): Quiet time in seconds that ends a burst of events. Defaults to WATCH_COALESCE_DELAY.
+        poll_interval (float): Seconds between polling passes. Defaults to WATCH_POLL_INTERVAL.
+        stop_after (float, optional): Stop after this many seconds instead of running until interrupted.
+    """
+    roots = load_watch_roots(db_connection) if roots is None else roots
+    if not roots:
+        print("No previously scanned folders are connected. Scan a folder first.")
+        return
+
+    inotify = None
+    if use_inotify:
+        try:
+            inotify = _Inotify()
+            for _, root in roots:
+                inotify.add_tree(root)
+        except OSError as e:
+            print(f"Filesystem events are not available ({e}); polling every {poll_interval:g} seconds instead.")
+            if inotify is not None:
+                inotify.close()
+            inotify = None
+
+    for _, root in roots:
+        print(f"Watching '{root}'")
+    print("Press Ctrl+C to stop.")
+
+    # Catch up with changes made while nobody was watching
+    _report(poll_roots(db_connection, roots))
+
+    deadline = time.monotonic() + stop_after if stop_after is not None else None
+    changed_paths = {}
+    first_change = last_change = None
+    try:
+        while deadline is None or time.monotonic() < deadline:
+            if inotify is None:
+                time.sleep(poll_interval if deadline is None else max(0, min(poll_interval, deadline - time.monotonic())))
+                _report(poll_roots(db_connection, roots))
+                continue
+
+            overflow = False
+            for path, mask in inotify.read_events(coalesce_delay / 2):
+                if path is None:
+                    overflow = True
+                    continue
+                if mask & IN_DELETE_SELF:
+                    continue
+                changed_paths[path] = changed_paths.get(path, False) or bool(mask & IN_ISDIR)
+                last_change = time.monotonic()
+                first_change = first_change or last_change
+            now = time.monotonic()
+            try:
+                if overflow:
+                    # Events were lost, so only a full pass can tell what changed; it also watches
+                    # the folders created in the meantime
+                    changed_paths = {}
+                    first_change = None
+                    _report(poll_roots(db_connection, roots, inotify=inotify))
+                elif changed_paths and (now - last_change >= coalesce_delay or now - first_change >= WATCH_MAX_DELAY):
+                    changes, changed_paths = changed_paths, {}
+                    first_change = None
+                    _report(apply_changes(db_connection, roots, changes, inotify))
+            except OSError as e:
+                print(f"Filesystem events are no longer available ({e}); switching to polling.")
+                inotify.close()
+                inotify = None
+        if changed_paths:
+            _report(apply_changes(db_connection, roots, changed_paths))
+    except KeyboardInterrupt:
+        if changed_paths:
+            _report(apply_changes(db_connection, roots, changed_paths))
+        print("\nStopped watching.")
+    except sqlite3.Error as e:
+        print(f"Database error while watching folders: {e}")
+    finally:
+        if inotify is not None:
+            inotify.close()
@@ -0,0 +1,512 @@
+import os
+import sqlite3
+import struct
+import uuid
+from datetime import datetime
+from itertools import groupby
+
+from FileOrganizer import VIDEO_FILES_TABLE, MEDIA_PROPERTIES_TABLE
+from VolumeInfo import is_rotational, physical_offset
+
+# Number of probed files written to the catalog per transaction
+MEDIA_WRITE_BATCH = 500
+
+# Largest header structure read into memory in one piece (a Matroska Tracks element, an AVI hdrl list
+# or an ASF header object). Real headers are a few KB; anything larger is treated as corrupt.
+MAX_HEADER_READ = 1024 * 1024
+
+# Audio codecs of the WAVEFORMATEX format tags used by AVI and ASF files
+AUDIO_FORMAT_TAGS = {
+    0x0001: "pcm",
+    0x0002: "adpcm",
+    0x0050: "mp2",
+    0x0055: "mp3",
+    0x00FF: "aac",
+    0x0160: "wmav1",
+    0x0161: "wmav2",
+    0x0162: "wmapro",
+    0x0163: "wmalossless",
+    0x2000: "ac3",
+    0x2001: "dts",
+}
+
+ASF_HEADER_GUID = uuid.UUID("75B22630-668E-11CF-A6D9-00AA0062CE6C")
+ASF_FILE_PROPERTIES_GUID = uuid.UUID("8CABDCA1-A947-11CF-8EE4-00C00C205365")
+ASF_STREAM_PROPERTIES_GUID = uuid.UUID("B7DC0791-A9B7-11CF-8EE6-00C00C205365")
+ASF_VIDEO_MEDIA_GUID = uuid.UUID("BC19EFC0-5B4D-11CF-A8FD-00805F5C442B")
+ASF_AUDIO_MEDIA_GUID = uuid.UUID("F8699E40-5B4D-11CF-A8FD-00805F5C442B")
+
+# Matroska element ids, with their length marker bits kept
+EBML_HEADER_ID = 0x1A45DFA3
+EBML_DOCTYPE_ID = 0x4282
+MKV_SEGMENT_ID = 0x18538067
+MKV_SEEKHEAD_ID = 0x114D9B74
+MKV_SEEK_ID = 0x4DBB
+MKV_SEEK_ELEMENT_ID = 0x53AB
+MKV_SEEK_POSITION_ID = 0x53AC
+MKV_INFO_ID = 0x1549A966
+MKV_TIMECODE_SCALE_ID = 0x2AD7B1
+MKV_DURATION_ID = 0x4489
+MKV_TRACKS_ID = 0x1654AE6B
+MKV_TRACK_ENTRY_ID = 0xAE
+MKV_TRACK_TYPE_ID = 0x83
+MKV_CODEC_ID = 0x86
+MKV_VIDEO_ID = 0xE0
+MKV_PIXEL_WIDTH_ID = 0xB0
+MKV_PIXEL_HEIGHT_ID = 0xBA
+MKV_CLUSTER_ID = 0x1F43B675
+
+# Top-level box types an MP4 or QuickTime file can start with
+MP4_FIRST_BOXES = {b"ftyp", b"moov", b"mdat", b"wide", b"free", b"skip", b"pnot"}
+
+def _read_at(file, offset, size):
+    file.seek(offset)
+    return file.read(size)
+
+def _empty_properties(container):
+    return {"container": container, "duration": None, "width": None, "height": None,
+            "video_codec": None, "audio_codec": None}
+
+def _fourcc(data):
+    return data.decode("latin-1").strip("\x00 ") or None
+
+def _iter_mp4_boxes(file, start, end):
+    """
+    Yields (type, payload start, box end) for the boxes between start and end, reading only box headers.
+    """
+    offset = start
+    while offset + 8 <= end:
+        header = _read_at(file, offset, 16)
+        if len(header) < 8:
+            return
+        size, box_type = struct.unpack(">I4s", header[:8])
+        header_size = 8
+        if size == 1 and len(header) == 16:
+            size = struct.unpack(">Q", header[8:16])[0]
+            header_size = 16
+        elif size == 0:
+            size = end - offset
+        if size < header_size:
+            return
+        yield box_type, offset + header_size, min(offset + size, end)
+        offset += size
+
+def _find_mp4_box(file, start, end, box_type):
+    for found_type, payload, box_end in _iter_mp4_boxes(file, start, end):
+        if found_type == box_type:
+            return payload, box_end
+    return None
+
+def _probe_mp4(file, filesize):
+    """
+    Reads duration, resolution and codecs of an MP4 or QuickTime file from its moov box
+    (mvhd, and tkhd, hdlr and stsd of each track). The moov box is found by skipping from box header
+    to box header, so files that keep it at the end cost a handful of small reads as well.
+    """
+    properties = _empty_properties("mp4")
+    moov = None
+    for box_type, payload, box_end in _iter_mp4_boxes(file, 0, filesize):
+        if box_type == b"ftyp" and _read_at(file, payload, 4) == b"qt  ":
+            properties["container"] = "mov"
+        elif box_type == b"moov":
+            moov = (payload, box_end)
+            break
+    if moov is None:
+        return properties
+
+    mvhd = _find_mp4_box(file, moov[0], moov[1], b"mvhd")
+    if mvhd:
+        data = _read_at(file, mvhd[0], 32)
+        if data[0] == 1:
+            timescale, duration = struct.unpack(">IQ", data[20:32])
+        else:
+            timescale, duration = struct.unpack(">II", data[12:20])
+        if timescale:
+            properties["duration"] = duration / timescale
+
+    for box_type, trak_start, trak_end in _iter_mp4_boxes(file, moov[0], moov[1]):
+        if box_type != b"trak":
+            continue
+        mdia = _find_mp4_box(file, trak_start, trak_end, b"mdia")
+        hdlr = mdia and _find_mp4_box(file, mdia[0], mdia[1], b"hdlr")
+        if not hdlr:
+            continue
+        handler = _read_at(file, hdlr[0] + 8, 4)
+        minf = _find_mp4_box(file, mdia[0], mdia[1], b"minf")
+        stbl = minf and _find_mp4_box(file, minf[0], minf[1], b"stbl")
+        stsd = stbl and _find_mp4_box(file, stbl[0], stbl[1], b"stsd")
+        # The first sample entry: size, codec fourcc, then for video 24 bytes before width and height
+        entry = _read_at(file, stsd[0] + 8, 36) if stsd else b""
+        codec = _fourcc(entry[4:8]) if len(entry) >= 8 else None
+
+        if handler == b"vide" and properties["video_codec"] is None:
+            properties["video_codec"] = codec
+            tkhd = _find_mp4_box(file, trak_start, trak_end, b"tkhd")
+            if tkhd:
+                data = _read_at(file, tkhd[0], 96)
+                dimensions = data[88:96] if data[:1] == b"\x01" else data[76:84]
+                if len(dimensions) == 8:
+                    width, height = struct.unpack(">II", dimensions)
+                    properties["width"], properties["height"] = width >> 16, height >> 16
+            if not properties["width"] and len(entry) == 36:
+                properties["width"], properties["height"] = struct.unpack(">HH", entry[32:36])
+        elif handler == b"soun" and properties["audio_codec"] is None:
+            properties["audio_codec"] = codec
+    return properties
+
+def _read_ebml_vint(data, pos, keep_marker=False):
+    """
+    Decodes an EBML variable-length integer. Returns (value, next position); the value of a size
+    with all its bits set, which means 'unknown size', is None.
+    """
+    first = data[pos]
+    length = 1
+    while length <= 8 and not first & (0x80 >> (length - 1)):
+        length += 1
+    if length > 8 or pos + length > len(data):
+        raise ValueError("Invalid EBML variable-length integer.")
+    value = int.from_bytes(data[pos:pos + length], "big")
+    if keep_marker:
+        return value, pos + length
+    value &= (1 << (7 * length)) - 1
+    if value == (1 << (7 * length)) - 1:
+        value = None
+    return value, pos + length
+
+def _read_ebml_header(file, offset):
+    """
+    Reads the id and size of the EBML element at offset. Returns (id, payload start, size).
+    """
+    data = _read_at(file, offset, 12)
+    element_id, pos = _read_ebml_vint(data, 0, keep_marker=True)
+    size, pos = _read_ebml_vint(data, pos)
+    return element_id, offset + pos, size
+
+def _iter_ebml(data, start=0, end=None):
+    """
+    Yields (id, payload start, payload end) for the EBML elements in a buffer.
+    """
+    pos = start
+    end = len(data) if end is None else end
+    while pos < end:
+        element_id, pos = _read_ebml_vint(data, pos, keep_marker=True)
+        size, pos = _read_ebml_vint(data, pos)
+        payload_end = end if size is None else min(pos + size, end)
+        yield element_id, pos, payload_end
+        pos = payload_end
+
+def _read_ebml_element(file, payload, size):
+    if size is None or size > MAX_HEADER_READ:
+        raise ValueError("Matroska header element is too large.")
+    return _read_at(file, payload, size)
+
+def _probe_matroska(file, filesize):
+    """
+    Reads duration, resolution and codecs of a Matroska or WebM file from the Info and Tracks elements
+    of its segment. Elements are skipped by their sizes up to the first Cluster; if Info or Tracks come
+    after the clusters, the positions listed in the SeekHead are used instead.
+    """
+    element_id, payload, size = _read_ebml_header(file, 0)
+    header = _read_ebml_element(file, payload, size)
+    doc_type = next((header[start:end] for child, start, end in _iter_ebml(header) if child == EBML_DOCTYPE_ID), b"")
+    properties = _empty_properties("webm" if doc_type == b"webm" else "matroska")
+
+    segment_id, segment_start, segment_size = _read_ebml_header(file, payload + size)
+    if segment_id != MKV_SEGMENT_ID:
+        return properties
+    segment_end = filesize if segment_size is None else min(segment_start + segment_size, filesize)
+
+    found = {}
+    seek_positions = {}
+    offset = segment_start
+    while offset < segment_end and not (MKV_INFO_ID in found and MKV_TRACKS_ID in found):
+        element_id, payload, size = _read_ebml_header(file, offset)
+        if element_id == MKV_CLUSTER_ID or size is None:
+            break
+        if element_id in (MKV_INFO_ID, MKV_TRACKS_ID):
+            found[element_id] = _read_ebml_element(file, payload, size)
+        elif element_id == MKV_SEEKHEAD_ID:
+            seek_head = _read_ebml_element(file, payload, size)
+            for seek, start, end in _iter_ebml(seek_head):
+                if seek != MKV_SEEK_ID:
+                    continue
+                entry = {child: seek_head[child_start:child_end] for child, child_start, child_end in _iter_ebml(seek_head, start, end)}
+                if MKV_SEEK_ELEMENT_ID in entry and MKV_SEEK_POSITION_ID in entry:
+                    seek_positions[int.from_bytes(entry[MKV_SEEK_ELEMENT_ID], "big")] = int.from_bytes(entry[MKV_SEEK_POSITION_ID], "big")
+        offset = payload + size
+    for element_id in (MKV_INFO_ID, MKV_TRACKS_ID):
+        if element_id not in found and element_id in seek_positions:
+            found_id, payload, size = _read_ebml_header(file, segment_start + seek_positions[element_id])
+            if found_id == element_id:
+                found[element_id] = _read_ebml_element(file, payload, size)
+
+    info = found.get(MKV_INFO_ID, b"")
+    timecode_scale = 1000000
+    duration = None
+    for element_id, start, end in _iter_ebml(info):
+        if element_id == MKV_TIMECODE_SCALE_ID:
+            timecode_scale = int.from_bytes(info[start:end], "big")
+        elif element_id == MKV_DURATION_ID and end - start in (4, 8):
+            duration = struct.unpack(">f" if end - start == 4 else ">d", info[start:end])[0]
+    if duration is not None:
+        properties["duration"] = duration * timecode_scale / 1e9
+
+    tracks = found.get(MKV_TRACKS_ID, b"")
+    for element_id, start, end in _iter_ebml(tracks):
+        if element_id != MKV_TRACK_ENTRY_ID:
+            continue
+        entry = {child: (child_start, child_end) for child, child_start, child_end in _iter_ebml(tracks, start, end)}
+        track_type = int.from_bytes(tracks[slice(*entry[MKV_TRACK_TYPE_ID])], "big") if MKV_TRACK_TYPE_ID in entry else None
+        codec = tracks[slice(*entry[MKV_CODEC_ID])].decode("ascii", "replace").strip("\x00") if MKV_CODEC_ID in entry else None
+        if track_type == 1 and properties["video_codec"] is None:
+            properties["video_codec"] = codec
+            if MKV_VIDEO_ID in entry:
+                for child, child_start, child_end in _iter_ebml(tracks, *entry[MKV_VIDEO_ID]):
+                    if child == MKV_PIXEL_WIDTH_ID:
+                        properties["width"] = int.from_bytes(tracks[child_start:child_end], "big")
+                    elif child == MKV_PIXEL_HEIGHT_ID:
+                        properties["height"] = int.from_bytes(tracks[child_start:child_end], "big")
+        elif track_type == 2 and properties["audio_codec"] is None:
+            properties["audio_codec"] = codec
+    return properties
+
+def _iter_riff_chunks(data, start, end):
+    """
+    Yields (id, payload start, payload end) for the RIFF chunks in a buffer; LIST chunks yield their list type as id.
+    Stops at a chunk that does not move past its own header or whose list is too small for its type.
+    """
+    pos = start
+    while pos + 8 <= end:
+        chunk_id = data[pos:pos + 4]
+        size = struct.unpack("<I", data[pos + 4:pos + 8])[0]
+        payload = pos + 8
+        next_pos = payload + size + (size & 1)
+        if next_pos <= pos:
+            return
+        if chunk_id == b"LIST":
+            if size < 4 or payload + 4 > end:
+                return
+            yield data[payload:payload + 4], payload + 4, min(payload + size, end)
+        else:
+            yield chunk_id, payload, min(payload + size, end)
+        pos = next_pos
+
+def _probe_avi(file, filesize):
+    """
+    Reads duration, resolution and codecs of an AVI file from its hdrl list: the avih main header,
+    and the strh stream header and strf stream format of each stream.
+    """
+    properties = _empty_properties("avi")
+    list_header = _read_at(file, 12, 12)
+    if len(list_header) < 12 or list_header[:4] != b"LIST" or list_header[8:12] != b"hdrl":
+        return properties
+    size = struct.unpack("<I", list_header[4:8])[0]
+    if size > MAX_HEADER_READ:
+        raise ValueError("AVI header list is too large.")
+    # The list size counts the 'hdrl' type, so the list runs from offset 20 to 20 + size
+    if size < 4 or 20 + size > filesize:
+        raise ValueError("AVI header list is truncated or has an invalid size.")
+    hdrl = _read_at(file, 24, size - 4)
+
+    frame_duration = total_frames = None
+    for chunk_id, start, end in _iter_riff_chunks(hdrl, 0, len(hdrl)):
+        if chunk_id == b"avih" and end - start >= 40:
+            micro_seconds_per_frame, _, _, _, total_frames = struct.unpack("<5I", hdrl[start:start + 20])
+            properties["width"], properties["height"] = struct.unpack("<II", hdrl[start + 32:start + 40])
+            frame_duration = micro_seconds_per_frame / 1e6
+        elif chunk_id == b"odml":
+            # OpenDML files over 1 GB count their frames in dmlh, as avih only counts the first RIFF part
+            for child, child_start, child_end in _iter_riff_chunks(hdrl, start, end):
+                if child == b"dmlh" and child_end - child_start >= 4:
+                    total_frames = struct.unpack("<I", hdrl[child_start:child_start + 4])[0]
+        elif chunk_id == b"strl":
+            stream = {child: hdrl[child_start:child_end] for child, child_start, child_end in _iter_riff_chunks(hdrl, start, end)}
+            strh, strf = stream.get(b"strh", b""), stream.get(b"strf", b"")
+            if len(strh) < 36:
+                continue
+            if strh[:4] == b"vids" and properties["video_codec"] is None:
+                properties["video_codec"] = _fourcc(strf[16:20]) if len(strf) >= 20 else _fourcc(strh[4:8])
+                scale, rate, _, length = struct.unpack("<4I", strh[20:36])
+                if scale and rate and length:
+                    properties["duration"] = length * scale / rate
+            elif strh[:4] == b"auds" and properties["audio_codec"] is None and len(strf) >= 2:
+                format_tag = struct.unpack("<H", strf[:2])[0]
+                properties["audio_codec"] = AUDIO_FORMAT_TAGS.get(format_tag, f"0x{format_tag:04x}")
+    if properties["duration"] is None and frame_duration and total_frames:
+        properties["duration"] = total_frames * frame_duration
+    return properties
+
+def _probe_asf(file, filesize):
+    """
+    Reads duration, resolution and codecs of an ASF (WMV/WMA) file from the File Properties and
+    Stream Properties objects of its header object.
+    """
+    properties = _empty_properties("asf")
+    header_size = struct.unpack("<Q", _read_at(file, 16, 8))[0]
+    if header_size > MAX_HEADER_READ:
+        raise ValueError("ASF header object is too large.")
+    header = _read_at(file, 0, header_size)
+
+    pos = 30
+    while pos + 24 <= len(header):
+        object_guid = uuid.UUID(bytes_le=header[pos:pos + 16])
+        object_size = struct.unpack("<Q", header[pos + 16:pos + 24])[0]
+        if object_size < 24:
+            break
+        data = header[pos + 24:pos + object_size]
+        if object_guid == ASF_FILE_PROPERTIES_GUID and len(data) >= 72:
+            # Play duration is in 100-nanosecond units and includes the preroll, which is in milliseconds
+            play_duration, _, preroll = struct.unpack("<3Q", data[40:64])
+            properties["duration"] = max(play_duration / 1e7 - preroll / 1000, 0)
+        elif object_guid == ASF_STREAM_PROPERTIES_GUID and len(data) >= 54:
+            stream_type = uuid.UUID(bytes_le=data[:16])
+            type_data = data[54:54 + struct.unpack("<I", data[40:44])[0]]
+            if stream_type == ASF_VIDEO_MEDIA_GUID and properties["video_codec"] is None and len(type_data) >= 31:
+                properties["width"], properties["height"] = struct.unpack("<II", type_data[:8])
+                # BITMAPINFOHEADER after the encoded size, reserved byte and format data size
+                properties["video_codec"] = _fourcc(type_data[27:31])
+            elif stream_type == ASF_AUDIO_MEDIA_GUID and properties["audio_codec"] is None and len(type_data) >= 2:
+                format_tag = struct.unpack("<H", type_data[:2])[0]
+                properties["audio_codec"] = AUDIO_FORMAT_TAGS.get(format_tag, f"0x{format_tag:04x}")
+        pos += object_size
+    return properties
+
+def probe_media_file(file_path):
+    """
+    Reads the container, duration, resolution and codecs of a video file from its headers, without
+    decoding anything or starting an external program. The container is recognised from the first bytes
+    of the file, not from its extension. Supports MP4/MOV, Matroska/WebM, AVI and ASF (WMV) files.
+
+    Args:
+        file_path (str): The video file to probe.
+
+    Returns:
+        dict: "container", "duration" (seconds), "width", "height", "video_codec" and "audio_codec",
+              any of which may be None when the file does not record it; or None if the container
+              is not supported.
+
+    Raises:
+        OSError: If the file cannot be read.
+        ValueError: If the headers are corrupt.
+    """
+    with open(file_path, "rb") as file:
+        filesize = os.fstat(file.fileno()).st_size
+        magic = file.read(16)
+        try:
+            if magic[:4] == b"\x1a\x45\xdf\xa3":
+                return _probe_matroska(file, filesize)
+            if magic[:4] == b"RIFF" and magic[8:12] == b"AVI ":
+                return _probe_avi(file, filesize)
+            if len(magic) == 16 and uuid.UUID(bytes_le=magic) == ASF_HEADER_GUID:
+                return _probe_asf(file, filesize)
+            if magic[4:8] in MP4_FIRST_BOXES:
+                return _probe_mp4(file, filesize)
+        except (struct.error, IndexError) as e:
+            raise ValueError(f"Corrupt media headers: {e}") from e
+    return None
+
+def store_media_properties(db_connection, files):
+    """
+    Writes probed media properties to the catalog in one transaction, replacing properties stored
+    for an earlier size or modification date of the same file.
+
+    Args:
+        db_connection (sqlite3.Connection): SQLite database connection.
+        files (list): Tuples of (video file dictionary, properties dictionary or None).
+    """
+    if not files:
+        return
+    probed_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    try:
+        with db_connection:
+            db_connection.executemany(f"""
+                DELETE FROM {MEDIA_PROPERTIES_TABLE}
+                WHERE device_DUID = ? AND full_pathname = ? AND (filesize <> ? OR modified_time <> ?)
+            """, [(f["device_DUID"], f["full_pathname"], f["filesize"], f["modified_time"]) for f, _ in files])
+            db_connection.executemany(f"""
+                INSERT OR REPLACE INTO {MEDIA_PROPERTIES_TABLE} (device_DUID, full_pathname, filesize, modified_time,
+                    container, duration, width, height, video_codec, audio_codec, probed_date)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, [(f["device_DUID"], f["full_pathname"], f["filesize"], f["modified_time"],
+                   p["container"], p["duration"], p["width"], p["height"], p["video_codec"], p["audio_codec"], probed_date)
+                  for f, p in ((f, p or _empty_properties(None)) for f, p in files)])
+    except sqlite3.Error as e:
+        print(f"Failed to store media properties of {len(files)} file(s): {e}")
+        raise
+
+def disk_order(files, hdd_mode=None):
+    """
+    Orders the files of each device for reading their headers. They come sorted by inode from the catalog.
+    On spinning disks their physical offsets are then looked up, in that inode order, and the files are
+    read by offset, so the heads sweep the disk once. Files without a known offset are read last.
+
+    Args:
+        files (list): Dicts with at least "device_DUID" and "full_pathname", grouped by device.
+        hdd_mode (bool, optional): True to treat every device as a spinning disk, False as solid state.
+            Detected per device when None.
+
+    Returns:
+        list: The same dicts in reading order.
+    """
+    ordered = []
+    for _, device_files in groupby(files, key=lambda file: file["device_DUID"]):
+        device_files = list(device_files)
+        rotational = hdd_mode if hdd_mode is not None else is_rotational(device_files[0]["full_pathname"])
+        if rotational:
+            offsets = [physical_offset(file["full_pathname"]) for file in device_files]
+            # sorted is stable, so files at the same offset, or without one, stay in inode order
+            order = sorted(range(len(device_files)), key=lambda index: (offsets[index] is None, offsets[index] or 0))
+            device_files = [device_files[index] for index in order]
+        ordered.extend(device_files)
+    return ordered
+
+def probe_catalog_media(db_connection, device_id=None, progress_callback=None, hdd_mode=None):
+    """
+    Probes the catalogued video files that have no media properties for their current size and
+    modification date yet, and stores the results in the app_media_properties table in batches.
+    Files in unsupported or corrupt containers are stored without properties, so they are not read
+    again until they change. Files on drives that are not connected are skipped and probed next time.
+    The files of each device are read in inode order, and on spinning disks in the order of their data.
+
+    Args:
+        db_connection (sqlite3.Connection): SQLite database connection.
+        device_id (int, optional): Only probe the files of this device.
+        progress_callback (callable, optional): Called as progress_callback(done, total).
+        hdd_mode (bool, optional): Read the files in the order of their data on the disk. Defaults to None,
+                                   which turns it on for the devices that are spinning disks.
+
+    Returns:
+        dict: Number of files "probed", "unsupported" and "unreadable".
+    """
+    device_filter = "AND v.device_DUID = ?" if device_id is not None else ""
+    cursor = db_connection.cursor()
+    cursor.execute(f"""
+        SELECT v.device_DUID, v.full_pathname, v.filesize, COALESCE(v.modified_time, 0)
+        FROM {VIDEO_FILES_TABLE} v
+        LEFT JOIN {MEDIA_PROPERTIES_TABLE} m ON m.device_DUID = v.device_DUID AND m.full_pathname = v.full_pathname
+             AND m.filesize = v.filesize AND m.modified_time = COALESCE(v.modified_time, 0)
+        WHERE m.device_DUID IS NULL {device_filter}
+        ORDER BY v.device_DUID, v.file_inode
+    """, (device_id,) if device_id is not None else ())
+    files = disk_order([dict(zip(("device_DUID", "full_pathname", "filesize", "modified_time"), row))
+                         for row in cursor.fetchall()], hdd_mode)
+
+    counts = {"probed": 0, "unsupported": 0, "unreadable": 0}
+    pending = []
+    for done, file in enumerate(files, start=1):
+        try:
+            properties = probe_media_file(file["full_pathname"])
+            counts["probed" if properties else "unsupported"] += 1
+            pending.append((file, properties))
+        except ValueError:
+            counts["unsupported"] += 1
+            pending.append((file, None))
+        except OSError:
+            counts["unreadable"] += 1
+        if len(pending) >= MEDIA_WRITE_BATCH:
+            store_media_properties(db_connection, pending)
+            pending = []
+        if progress_callback:
+            progress_callback(done, len(files))
+    store_media_properties(db_connection, pending)
+    return counts
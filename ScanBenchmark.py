@@ -0,0 +1,131 @@
+import os
+import random
+import sys
+import tempfile
+import time
+
+from FileOrganizer import VIDEO_EXTENSIONS, get_video_files
+from MediaProbe import disk_order
+from VolumeInfo import physical_offset
+
+# Shape of the synthetic tree: folders, video files per folder and bytes written to each file
+BENCHMARK_FOLDERS = 200
+BENCHMARK_FILES_PER_FOLDER = 50
+BENCHMARK_FILE_SIZE = 16 * 1024
+
+# Bytes read from the start of each file in the header read pass, as the media probe does
+BENCHMARK_HEADER_READ = 4096
+
+# Linux control file that drops the page, dentry and inode caches, so every pass starts cold (root only)
+DROP_CACHES_PATH = "/proc/sys/vm/drop_caches"
+
+def build_synthetic_tree(root, folders=BENCHMARK_FOLDERS, files_per_folder=BENCHMARK_FILES_PER_FOLDER,
+                         file_size=BENCHMARK_FILE_SIZE, seed=1):
+    """
+    Creates a tree of video files whose inodes and data are allocated in a shuffled order, like a drive
+    that was filled over years: the files of one folder are spread over the disk instead of lying in
+    listing order.
+
+    Args:
+        root (str): The folder to create the tree in.
+        folders (int): Number of folders.
+        files_per_folder (int): Number of video files per folder.
+        file_size (int): Size of each file in bytes.
+        seed (int): Seed of the shuffle, so runs can be compared.
+
+    Returns:
+        int: Number of files created.
+    """
+    rng = random.Random(seed)
+    extensions = sorted(VIDEO_EXTENSIONS)
+    paths = [os.path.join(root, f"folder_{folder:04d}", f"clip_{number:04d}{rng.choice(extensions)}")
+             for folder in range(folders) for number in range(files_per_folder)]
+    for folder in range(folders):
+        os.makedirs(os.path.join(root, f"folder_{folder:04d}"), exist_ok=True)
+    rng.shuffle(paths)
+    for path in paths:
+        with open(path, "wb") as file:
+            file.write(rng.randbytes(file_size))
+    # Have the data written out, so every file has its place on the disk
+    os.sync()
+    return len(paths)
+
+def seek_distance(positions):
+    """
+    Returns the distance the disk heads travel to visit positions in the given order: the sum of the jumps
+    between consecutive known positions.
+    """
+    positions = [position for position in positions if position is not None]
+    return sum(abs(current - previous) for previous, current in zip(positions, positions[1:]))
+
+def _drop_caches():
+    """
+    Empties the kernel caches so the next pass reads from the disk. Returns False when not allowed.
+    """
+    try:
+        os.sync()
+        with open(DROP_CACHES_PATH, "w") as drop_caches:
+            drop_caches.write("3\n")
+        return True
+    except OSError:
+        return False
+
+def _read_headers(paths):
+    for path in paths:
+        with open(path, "rb", buffering=0) as file:
+            file.read(BENCHMARK_HEADER_READ)
+
+def run_benchmark(root):
+    """
+    Compares the default order with HDD mode on a tree: the inode distance covered while stat'ing the files
+    during a walk, and the byte distance covered while reading their headers. With the rights to drop the
+    kernel caches, every pass is also timed from a cold cache.
+
+    Args:
+        root (str): The tree to walk.
+
+    Returns:
+        dict: For "stat" and "header", the seek distance and cold time (None if not measured) of each order.
+    """
+    results = {"stat": {}, "header": {}}
+
+    for label, hdd_mode in (("default order", False), ("HDD mode", True)):
+        cold = _drop_caches()
+        start = time.perf_counter()
+        video_files = get_video_files(root, hdd_mode=hdd_mode)
+        elapsed = time.perf_counter() - start if cold else None
+        results["stat"][label] = (seek_distance([video["file_inode"] for video in video_files]), elapsed)
+
+    # The catalog used to hand the probe its files in path order
+    files = sorted(video_files, key=lambda video: video["full_pathname"])
+    inode_sorted = sorted(files, key=lambda file: (file["device_DUID"], file["file_inode"]))
+    for label, hdd_mode in (("default order", False), ("HDD mode", True)):
+        cold = _drop_caches()
+        start = time.perf_counter()
+        # Looking up the physical offsets is part of the cost of HDD mode
+        ordered = disk_order(inode_sorted, hdd_mode=True) if hdd_mode else files
+        _read_headers([file["full_pathname"] for file in ordered])
+        elapsed = time.perf_counter() - start if cold else None
+        results["header"][label] = (seek_distance([physical_offset(file["full_pathname"]) for file in ordered]), elapsed)
+    return results
+
+def print_benchmark(results):
+    """
+    Prints the results of run_benchmark, with HDD mode's seek distance relative to the default order.
+    """
+    for stage, title, unit in (("stat", "Stat pass (inode distance)", "inodes"), ("header", "Header reads (byte distance)", "bytes")):
+        print(f"\n{title}:")
+        baseline = results[stage]["default order"][0] or 1
+        for label, (distance, elapsed) in results[stage].items():
+            timing = f", {elapsed:.3f} s from a cold cache" if elapsed is not None else ""
+            print(f"  {label:14} {distance:>16,} {unit} ({distance / baseline:.2%}){timing}")
+
+if __name__ == "__main__":
+    # Benchmarks the given tree, or builds a synthetic one in a temporary folder
+    if len(sys.argv) > 1:
+        print_benchmark(run_benchmark(sys.argv[1]))
+    else:
+        with tempfile.TemporaryDirectory() as tree:
+            count = build_synthetic_tree(tree)
+            print(f"Built a synthetic tree of {count} video files in {BENCHMARK_FOLDERS} folders.")
+            print_benchmark(run_benchmark(tree))
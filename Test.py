@@ -0,0 +1,794 @@
+import datetime
+import importlib.util
+import os
+import shutil
+import sqlite3
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import unittest
+
+import DuplicateFinder
+import FileOrganizer
+import FolderWatcher
+import MediaProbe
+import VolumeInfo
+from FileOrganizer import (DEVICE_METADATA_TABLE, DIRECTORY_MANIFEST_TABLE, FILE_HASHES_TABLE, SEARCH_CONTROL_TABLE, VIDEO_FILES_SEARCH_TABLE, VIDEO_FILES_TABLE,
+                           VIDEO_SORT_KEYS, canonical_path_key, import_catalog_file, initialize_db, iter_video_file_rows,
+                           normalize_filename, query_video_files, store_video_files_in_db)
+
+# Catalogs and exports kept in the repository, used as real-world test data
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def repo_file(name):
+    return os.path.join(REPO_DIR, name)
+
+class CatalogTestCase(unittest.TestCase):
+    """
+    Gives each test an empty catalog in a temporary folder.
+    """
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.temp_dir, "video_files.db")
+        self.db_connection = initialize_db(self.db_path)
+
+    def tearDown(self):
+        self.db_connection.close()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def query(self, sql, params=()):
+        return self.db_connection.execute(sql, params).fetchall()
+
+    def assertSearchIndexIntact(self):
+        self.db_connection.execute(f"INSERT INTO {VIDEO_FILES_SEARCH_TABLE} ({VIDEO_FILES_SEARCH_TABLE}) VALUES ('integrity-check')")
+
+def video_record(full_path, filesize=100, device_id=1, modified_time=None):
+    filename = os.path.basename(full_path.replace("\\", "/"))
+    return {
+        "partitionID": "",
+        "full_pathname": full_path,
+        "path_key": canonical_path_key(full_path),
+        "filename": filename,
+        "normalized_filename": normalize_filename(filename),
+        "filesize": filesize,
+        "created_time": modified_time,
+        "modified_time": modified_time,
+        "device_DUID": device_id,
+    }
+
+class ImportCatalogTest(CatalogTestCase):
+    def test_exports_with_and_without_device_ids(self):
+        # The raw dump has device ids but no volume names, the GUI export has volume names but no device
+        # ids, and the later workbook has both and a device sheet
+        counts = [import_catalog_file(self.db_connection, repo_file(name)) for name in
+                  ("output_videos_list.csv", "output_videos_list.xlsx")]
+        self.assertEqual(counts[0]["imported"], 1708)
+
+        # Every row of the GUI export without a mangled path is matched to the row of the raw dump
+        self.assertEqual(counts[1]["skipped"], 1693)
+        self.assertEqual(self.query(f"SELECT COUNT(*) FROM {DEVICE_METADATA_TABLE} WHERE deviceid < 0"), [(0,)])
+        self.assertEqual(self.query(f"""
+            SELECT COUNT(*) FROM (SELECT path_key FROM {VIDEO_FILES_TABLE} GROUP BY path_key HAVING COUNT(*) > 1)
+        """), [(0,)])
+        import_catalog_file(self.db_connection, repo_file("11May2025_output_videos_list.xlsx"))
+
+        # The 'Unknown' volume's files stay on the E: drive instead of the first device without a name
+        self.assertEqual(self.query(f"""
+            SELECT DISTINCT device_DUID FROM {VIDEO_FILES_TABLE} WHERE partitionID = 'E:'
+        """), [(1759995664,)])
+        self.assertEqual(self.query(f"""
+            SELECT COUNT(*) FROM {VIDEO_FILES_TABLE} WHERE device_DUID = 210578004 AND partitionID <> 'H:'
+        """), [(0,)])
+
+        # Devices imported without a name learn it from the later exports
+        self.assertEqual(self.query(f"SELECT volumename FROM {DEVICE_METADATA_TABLE} WHERE deviceid = 405414637"),
+                         [("AjayDisk1",)])
+
+        # Importing an export again adds nothing
+        again = import_catalog_file(self.db_connection, repo_file("output_videos_list.xlsx"))
+        self.assertEqual((again["imported"], again["devices"]), (0, 0))
+
+    def test_unknown_volume_without_match_is_unresolved(self):
+        import_catalog_file(self.db_connection, repo_file("output_videos_list.csv"))
+        export_path = os.path.join(self.temp_dir, "export.csv")
+        with open(export_path, "w", encoding="utf-8") as export:
+            export.write("Device Volume,Full Path,Size\n")
+            export.write("Unknown,E:\\New Folder\\a.avi,100\n")
+            export.write(",E:\\New Folder\\b.avi,200\n")
+            export.write("Spare Disk,E:\\New Folder\\c.avi,300\n")
+        counts = import_catalog_file(self.db_connection, export_path)
+        self.assertEqual((counts["imported"], counts["devices"]), (3, 2))
+
+        # Files are never filed under a real device because of a missing name, nor hashed from the name
+        devices = self.query(f"""
+            SELECT v.filename, v.device_DUID, d.volumename FROM {VIDEO_FILES_TABLE} v
+            JOIN {DEVICE_METADATA_TABLE} d ON d.deviceid = v.device_DUID
+            WHERE v.filename IN ('a.avi', 'b.avi', 'c.avi') ORDER BY v.filename
+        """)
+        self.assertTrue(all(device_id < 0 for _, device_id, _ in devices))
+        self.assertEqual(devices[0][1], devices[1][1])
+        self.assertEqual([name for _, _, name in devices],
+                         [FileOrganizer.UNRESOLVED_VOLUME_NAME, FileOrganizer.UNRESOLVED_VOLUME_NAME, "Spare Disk"])
+
+class MigrationTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_old_catalogs_are_upgraded_without_losing_records(self):
+        for name in ("video_files.db", "11May2025_video_files.db"):
+            with self.subTest(name=name):
+                db_path = os.path.join(self.temp_dir, name)
+                shutil.copy(repo_file(name), db_path)
+                old_connection = sqlite3.connect(db_path)
+                old_rows = old_connection.execute(f"""
+                    SELECT id, full_pathname, filesize, created_date, modified_date, device_DUID FROM {VIDEO_FILES_TABLE} ORDER BY id
+                """).fetchall()
+                old_sequence = old_connection.execute("SELECT seq FROM sqlite_sequence WHERE name = ?", (VIDEO_FILES_TABLE,)).fetchone()
+                old_connection.close()
+
+                db_connection = initialize_db(db_path)
+                try:
+                    self.assertEqual(db_connection.execute(f"SELECT MAX(version) FROM {FileOrganizer.SCHEMA_VERSION_TABLE}").fetchone()[0],
+                                     FileOrganizer.MIGRATIONS[-1][0])
+                    # The view shows the dates stored as epoch seconds as the text they were migrated from
+                    self.assertEqual(db_connection.execute(f"""
+                        SELECT id, full_pathname, filesize, created_date, modified_date, device_DUID FROM {FileOrganizer.VIDEO_FILES_VIEW} ORDER BY id
+                    """).fetchall(), old_rows)
+                    self.assertEqual(db_connection.execute("SELECT seq FROM sqlite_sequence WHERE name = ?", (VIDEO_FILES_TABLE,)).fetchone(),
+                                     old_sequence)
+                    db_connection.execute(f"INSERT INTO {VIDEO_FILES_SEARCH_TABLE} ({VIDEO_FILES_SEARCH_TABLE}) VALUES ('integrity-check')")
+                    self.assertTrue(FileOrganizer.search_video_files(db_connection, old_rows[0][1].replace("\\", "/").split("/")[-1]))
+                finally:
+                    db_connection.close()
+
+                # Opening the upgraded catalog again changes nothing
+                db_connection = initialize_db(db_path)
+                try:
+                    self.assertEqual(db_connection.execute(f"SELECT COUNT(*) FROM {FileOrganizer.SCHEMA_VERSION_TABLE}").fetchone()[0],
+                                     len(FileOrganizer.MIGRATIONS))
+                finally:
+                    db_connection.close()
+
+    def test_devices_catalogued_twice_are_merged(self):
+        db_path = os.path.join(self.temp_dir, "video_files.db")
+        shutil.copy(repo_file("video_files.db"), db_path)
+        with sqlite3.connect(db_path) as old_connection:
+            def add_device(device_id, copied_device_id, last_scanned, copy_files=True, extra_file=None):
+                # A device row as an older version wrote it after a remount, keyed on st_dev
+                old_connection.execute(f"""
+                    INSERT INTO {DEVICE_METADATA_TABLE} (deviceid, partitionid, pathname, volumename, last_scanned, total_volume_size, remaining_free_space)
+                    SELECT ?, partitionid, pathname, volumename, ?, total_volume_size, remaining_free_space
+                    FROM {DEVICE_METADATA_TABLE} WHERE deviceid = ?
+                """, (device_id, last_scanned, copied_device_id))
+                if copy_files:
+                    old_connection.execute(f"""
+                        INSERT INTO {VIDEO_FILES_TABLE} (partitionID, full_pathname, filename, normalized_filename, filesize, created_date, modified_date, device_DUID)
+                        SELECT partitionID, full_pathname, filename, normalized_filename, filesize, created_date, modified_date, ?
+                        FROM {VIDEO_FILES_TABLE} WHERE device_DUID = ?
+                    """, (device_id, copied_device_id))
+                if extra_file:
+                    old_connection.execute(f"""
+                        INSERT INTO {VIDEO_FILES_TABLE} (partitionID, full_pathname, filename, normalized_filename, filesize, created_date, modified_date, device_DUID)
+                        VALUES ('', ?, ?, ?, 1, '2020-01-01 00:00:00', '2020-01-01 00:00:00', ?)
+                    """, (extra_file, os.path.basename(extra_file), os.path.basename(extra_file), device_id))
+
+            # Bak_Metron, serial 210578004, catalogued a second time under an st_dev with one more file
+            add_device(66306, 210578004, "2025-01-01 00:00:00", extra_file="H:/Videos/only_seen_before.mp4")
+            # Disk2 catalogued only under its st_dev
+            old_connection.execute(f"UPDATE {DEVICE_METADATA_TABLE} SET deviceid = 2049 WHERE deviceid = 3699291193")
+            old_connection.execute(f"UPDATE {VIDEO_FILES_TABLE} SET device_DUID = 2049 WHERE device_DUID = 3699291193")
+            # A drive without a serial: the same name and root sharing files is the same drive, without shared files it is not
+            add_device(2050, 1759995664, "2025-01-01 00:00:00", extra_file="E:/Videos/only_seen_before.mp4")
+            add_device(2051, 1759995664, "2025-01-01 00:00:00", copy_files=False, extra_file="E:/Videos/another_drive.mp4")
+            old_files = old_connection.execute(f"SELECT COUNT(*) FROM {VIDEO_FILES_TABLE}").fetchone()[0]
+
+        db_connection = initialize_db(db_path)
+        try:
+            devices = dict(db_connection.execute(f"SELECT deviceid, last_scanned FROM {DEVICE_METADATA_TABLE}").fetchall())
+            self.assertEqual(len(devices), 9)
+            self.assertFalse({66306, 2049, 2050} & set(devices))
+            self.assertIn(2051, devices)
+            # The device row of the latest scan is kept
+            self.assertEqual(devices[210578004], "2025-05-13 13:06:39")
+            file_counts = dict(db_connection.execute(f"SELECT device_DUID, COUNT(*) FROM {VIDEO_FILES_TABLE} GROUP BY device_DUID").fetchall())
+            self.assertEqual((file_counts[210578004], file_counts[3699291193], file_counts[1759995664], file_counts[2051]), (25, 141, 15, 1))
+            self.assertEqual(sum(file_counts.values()), old_files - 24 - 14)
+            db_connection.execute(f"INSERT INTO {VIDEO_FILES_SEARCH_TABLE} ({VIDEO_FILES_SEARCH_TABLE}) VALUES ('integrity-check')")
+        finally:
+            db_connection.close()
+
+    def test_new_catalogs_get_the_schema_old_ones_are_upgraded_to(self):
+        def schema(db_connection):
+            # The columns of every table and index, and the text of every trigger and view
+            layout = {}
+            for kind, name, sql in db_connection.execute("SELECT type, name, sql FROM sqlite_master WHERE name NOT LIKE 'sqlite_%'"):
+                if kind == "table":
+                    layout[name] = db_connection.execute(f"SELECT name, type, \"notnull\", pk FROM pragma_table_info('{name}')").fetchall()
+                elif kind == "index":
+                    layout[name] = db_connection.execute(f"SELECT name, \"desc\", key FROM pragma_index_xinfo('{name}')").fetchall()
+                else:
+                    layout[name] = " ".join(sql.split())
+            return layout
+
+        upgraded_path = os.path.join(self.temp_dir, "upgraded.db")
+        shutil.copy(repo_file("video_files.db"), upgraded_path)
+        new_connection = initialize_db(os.path.join(self.temp_dir, "new.db"))
+        upgraded_connection = initialize_db(upgraded_path)
+        try:
+            self.assertEqual(schema(new_connection), schema(upgraded_connection))
+            self.assertEqual(FileOrganizer.get_schema_version(new_connection), FileOrganizer.MIGRATIONS[-1][0])
+        finally:
+            new_connection.close()
+            upgraded_connection.close()
+
+class MergeCatalogTest(CatalogTestCase):
+    def test_merging_an_old_catalog_twice_or_respelled_adds_nothing(self):
+        old_catalog = os.path.join(self.temp_dir, "old.db")
+        shutil.copy(repo_file("video_files.db"), old_catalog)
+        counts = FileOrganizer.merge_catalog_db(self.db_connection, old_catalog)
+        self.assertEqual(counts["files_added"], 1708)
+
+        counts = FileOrganizer.merge_catalog_db(self.db_connection, old_catalog)
+        self.assertEqual((counts["files_added"], counts["files_unchanged"]), (0, 1708))
+
+        # The same files with their paths spelled another way are recognised by their path key
+        with sqlite3.connect(old_catalog) as old_connection:
+            old_connection.execute(f"UPDATE {VIDEO_FILES_TABLE} SET full_pathname = upper(replace(full_pathname, '\\', '/'))")
+        counts = FileOrganizer.merge_catalog_db(self.db_connection, old_catalog)
+        self.assertEqual(counts["files_added"], 0)
+        self.assertEqual(self.query(f"SELECT COUNT(*) FROM {VIDEO_FILES_TABLE}"), [(1708,)])
+        self.assertSearchIndexIntact()
+
+    def test_devices_keyed_on_st_dev_are_filed_under_their_serial(self):
+        old_catalog = os.path.join(self.temp_dir, "old.db")
+        shutil.copy(repo_file("video_files.db"), old_catalog)
+        FileOrganizer.merge_catalog_db(self.db_connection, old_catalog)
+
+        # The same drive as an older version catalogued it after a remount, under its st_dev
+        with sqlite3.connect(old_catalog) as old_connection:
+            old_connection.execute(f"UPDATE {DEVICE_METADATA_TABLE} SET deviceid = 66306 WHERE deviceid = 210578004")
+            old_connection.execute(f"UPDATE {VIDEO_FILES_TABLE} SET device_DUID = 66306 WHERE device_DUID = 210578004")
+        counts = FileOrganizer.merge_catalog_db(self.db_connection, old_catalog)
+        self.assertEqual((counts["devices_added"], counts["files_added"]), (0, 0))
+        self.assertEqual(self.query(f"SELECT COUNT(*) FROM {DEVICE_METADATA_TABLE} WHERE deviceid = 66306"), [(0,)])
+        self.assertEqual(self.query(f"SELECT COUNT(*) FROM {VIDEO_FILES_TABLE} WHERE device_DUID = 66306"), [(0,)])
+
+    def test_catalog_with_two_spellings_of_a_path(self):
+        # An old catalog, keyed on the path as typed, that holds one file under two spellings
+        other_path = os.path.join(self.temp_dir, "other.db")
+        shutil.copy(repo_file("video_files.db"), other_path)
+        with sqlite3.connect(other_path) as other_connection:
+            other_connection.execute(f"DELETE FROM {VIDEO_FILES_TABLE} WHERE id > 1")
+            other_connection.execute(f"""
+                INSERT INTO {VIDEO_FILES_TABLE} (partitionID, full_pathname, filename, normalized_filename, filesize, created_date, modified_date, device_DUID)
+                SELECT partitionID, 'g:\\general videos\\trains\\sncf2.wmv', 'sncf2.wmv', 'sncf2.wmv', filesize, created_date, modified_date, device_DUID
+                FROM {VIDEO_FILES_TABLE}
+            """)
+            other_connection.execute(f"""
+                UPDATE {VIDEO_FILES_TABLE} SET full_pathname = 'G:/General Videos\\Trains\\SNCF2.wmv', filename = 'SNCF2.wmv',
+                normalized_filename = 'SNCF2.wmv' WHERE id = 1
+            """)
+
+        counts = FileOrganizer.merge_catalog_db(self.db_connection, other_path)
+        self.assertEqual(counts["files_added"], 1)
+        self.assertEqual(FileOrganizer.merge_catalog_db(self.db_connection, other_path)["files_added"], 0)
+        self.assertEqual(self.query(f"SELECT COUNT(*) FROM {VIDEO_FILES_TABLE}"), [(1,)])
+        self.assertSearchIndexIntact()
+
+class StoreVideoFilesTest(CatalogTestCase):
+    def test_rows_committed_by_another_connection_are_not_indexed_twice(self):
+        store_video_files_in_db([video_record("/videos/a.mp4")], self.db_connection)
+        other_connection = sqlite3.connect(self.db_path, timeout=0)
+        blocked = []
+
+        def write_from_other_connection(statement):
+            # Runs as the store starts its writes; the other connection has to wait for it
+            if statement.startswith(f"UPDATE {SEARCH_CONTROL_TABLE}") and not blocked:
+                try:
+                    with other_connection:
+                        other_connection.execute(f"""
+                            INSERT INTO {VIDEO_FILES_TABLE} (partitionID, full_pathname, path_key, filename, normalized_filename, filesize, device_DUID)
+                            VALUES ('', '/videos/b.mp4', '/videos/b.mp4', 'b.mp4', 'b.mp4', 1, 1)
+                        """)
+                    blocked.append(False)
+                except sqlite3.OperationalError:
+                    blocked.append(True)
+
+        self.db_connection.set_trace_callback(write_from_other_connection)
+        try:
+            counts = store_video_files_in_db([video_record("/videos/c.mp4")], self.db_connection)
+        finally:
+            self.db_connection.set_trace_callback(None)
+            other_connection.close()
+        self.assertEqual(blocked, [True])
+        self.assertEqual(counts["inserted"], 1)
+        self.assertSearchIndexIntact()
+
+    def test_two_spellings_of_a_path_in_one_batch(self):
+        counts = store_video_files_in_db([video_record("G:/Videos\\A.wmv"), video_record("g:\\videos\\a.wmv")],
+                                         self.db_connection)
+        self.assertEqual(counts, {"inserted": 1, "updated": 0, "unchanged": 1})
+        self.assertEqual(self.query(f"SELECT full_pathname FROM {VIDEO_FILES_TABLE}"), [("g:\\videos\\a.wmv",)])
+        self.assertSearchIndexIntact()
+
+    def test_unchanged_files_are_stamped_with_the_scan_generation(self):
+        videos = [video_record(f"/videos/{number}.mp4") for number in range(5)]
+        self.assertEqual(store_video_files_in_db(videos, self.db_connection, scan_generation=1),
+                         {"inserted": 5, "updated": 0, "unchanged": 0})
+        self.assertEqual(store_video_files_in_db(videos, self.db_connection, scan_generation=2),
+                         {"inserted": 0, "updated": 0, "unchanged": 5})
+        videos[0]["filesize"] = 200
+        self.assertEqual(store_video_files_in_db(videos, self.db_connection, scan_generation=3),
+                         {"inserted": 0, "updated": 1, "unchanged": 4})
+        self.assertEqual(self.query(f"SELECT DISTINCT scan_generation FROM {VIDEO_FILES_TABLE}"), [(3,)])
+        self.assertSearchIndexIntact()
+
+class QueryVideoFilesTest(CatalogTestCase):
+    def test_paging_goes_past_rows_without_a_sort_value(self):
+        # Every other file has no modified date, so pages start both on and after NULL sort values
+        store_video_files_in_db([video_record(f"/videos/{number:02d}.mp4", filesize=number,
+                                              modified_time=None if number % 2 else 1600000000 + number)
+                                 for number in range(10)], self.db_connection)
+        for sort_key in VIDEO_SORT_KEYS:
+            for page_size in (1, 2, 3, 10):
+                rows = list(iter_video_file_rows(self.db_connection, sort_key, page_size=page_size))
+                self.assertEqual(len(rows), 10, (sort_key, page_size))
+                self.assertEqual(len({row["id"] for row in rows}), 10)
+
+        rows, after = query_video_files(self.db_connection, "modified_date", page_size=5)
+        self.assertEqual([row["modified_time"] for row in rows], [None] * 5)
+        rows, after = query_video_files(self.db_connection, "modified_date", after, page_size=5)
+        self.assertEqual([row["modified_time"] for row in rows], [1600000000 + number for number in range(0, 10, 2)])
+
+    def test_unreadable_filter_dates_are_refused(self):
+        store_video_files_in_db([video_record("/videos/a.mp4", modified_time=1600000000)], self.db_connection)
+        rows, _ = query_video_files(self.db_connection, "id", modified_from="2020-09-01 00:00:00")
+        self.assertEqual(len(rows), 1)
+        with self.assertRaises(ValueError):
+            query_video_files(self.db_connection, "id", modified_from="13/09/2020")
+
+class SearchVideoFilesTest(CatalogTestCase):
+    def test_best_match_is_found_among_many_matches(self):
+        # The best match, whose name is mostly the query, comes after thousands of weaker ones
+        store_video_files_in_db([video_record(f"/videos/holiday clip from a long summer trip {number:04d}.mp4")
+                                 for number in range(6000)] + [video_record("/videos/clip.mp4")], self.db_connection)
+        results = FileOrganizer.search_video_files(self.db_connection, "clip", limit=1)
+        self.assertEqual([row["filename"] for row in results], ["clip.mp4"])
+
+@unittest.skipUnless(importlib.util.find_spec("pyarrow"), "pyarrow is not installed")
+class ArrowExportTest(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.db_connection.executemany(f"""
+            INSERT INTO {DEVICE_METADATA_TABLE} (deviceid, partitionid, pathname, volumename, last_scanned)
+            VALUES (?, ?, ?, ?, '2024-01-01 00:00:00')
+        """, [(1, "part-1", "/mnt/a", "Alpha"), (2, "part-2", "/mnt/b", "Beta"), (3, "part-3", "/mnt/c", "Gamma")])
+        self.db_connection.commit()
+        # Files are exported by size, so each batch of three brings a device and partition the earlier ones did not
+        # have. The last file's device has no metadata row and so no volume name.
+        videos = []
+        for number in range(10):
+            video = video_record(f"/videos/{number}.mp4", filesize=number, device_id=number // 3 + 1,
+                                 modified_time=1600000000 + number)
+            video["partitionID"] = f"part-{video['device_DUID']}"
+            videos.append(video)
+        store_video_files_in_db(videos, self.db_connection)
+
+    def assertRoundTrip(self, table):
+        self.assertEqual(table.num_rows, 10)
+        self.assertEqual(str(table.schema.field("volumename").type), "dictionary<values=string, indices=int32, ordered=0>")
+        rows = table.to_pylist()
+        self.assertEqual([row["filesize"] for row in rows], list(range(10)))
+        self.assertEqual([row["full_pathname"] for row in rows], [f"/videos/{number}.mp4" for number in range(10)])
+        self.assertEqual([row["volumename"] for row in rows], ["Alpha"] * 3 + ["Beta"] * 3 + ["Gamma"] * 3 + [None])
+        self.assertEqual([row["partitionID"] for row in rows], [f"part-{number // 3 + 1}" for number in range(10)])
+        self.assertEqual([row["modified_date"] for row in rows],
+                         [datetime.datetime.fromtimestamp(1600000000 + number) for number in range(10)])
+
+    def test_parquet_round_trip(self):
+        import pyarrow.parquet as pq
+        output_path = os.path.join(self.temp_dir, "videos.parquet")
+        progress = []
+        written = FileOrganizer.export_video_files_to_arrow(self.db_connection, output_path, batch_size=3,
+                                                            progress_callback=lambda done, total: progress.append(done))
+        self.assertEqual(written, 10)
+        self.assertEqual(progress, [3, 6, 9, 10])
+        self.assertEqual(pq.ParquetFile(output_path).num_row_groups, 4)
+        self.assertRoundTrip(pq.read_table(output_path))
+
+    def test_arrow_ipc_round_trip(self):
+        import pyarrow as pa
+        output_path = os.path.join(self.temp_dir, "videos.arrow")
+        self.assertEqual(FileOrganizer.export_video_files_to_arrow(self.db_connection, output_path, batch_size=3), 10)
+        with pa.memory_map(output_path) as source:
+            reader = pa.ipc.open_file(source)
+            self.assertEqual(reader.num_record_batches, 4)
+            self.assertRoundTrip(reader.read_all())
+
+class ExcelSheetTitleTest(unittest.TestCase):
+    def test_long_volume_names_keep_the_whole_device_id(self):
+        used_titles = set()
+        first = FileOrganizer._excel_sheet_title("A volume name far longer than a sheet title", used_titles, " 1234567890123")
+        second = FileOrganizer._excel_sheet_title("A volume name far longer than a sheet title", used_titles, " 1234567890123")
+        self.assertEqual(first, "A volume name far 1234567890123")
+        self.assertEqual(second, "A volume name 1234567890123 (2)")
+        self.assertTrue(len(first) <= 31 and len(second) <= 31)
+
+class ProbeAviTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def probe(self, hdrl_size, hdrl=b""):
+        path = os.path.join(self.temp_dir, "clip.avi")
+        with open(path, "wb") as file:
+            file.write(b"RIFF" + struct.pack("<I", 4 + 12 + len(hdrl)) + b"AVI ")
+            file.write(b"LIST" + struct.pack("<I", hdrl_size) + b"hdrl" + hdrl)
+        return MediaProbe.probe_media_file(path)
+
+    def test_header_list_sizes_outside_the_file_are_rejected(self):
+        avih = b"avih" + struct.pack("<I", 56) + struct.pack("<14I", 40000, 0, 0, 0, 100, 0, 1, 0, 640, 480, 0, 0, 0, 0)
+        self.assertEqual(self.probe(4 + len(avih), avih)["duration"], 4.0)
+        for size in (0, 3, 5 + len(avih)):
+            with self.assertRaises(ValueError):
+                self.probe(size, avih)
+
+    def test_chunk_loop_stops_at_a_list_too_small_for_its_type(self):
+        # A LIST chunk of size 0 would otherwise be yielded with its payload start past its end
+        self.assertEqual(list(MediaProbe._iter_riff_chunks(b"LIST\0\0\0\0strlJUNK\0\0\0\0", 0, 20)), [])
+        chunks = list(MediaProbe._iter_riff_chunks(b"JUNK\0\0\0\0JUNK\2\0\0\0ab", 0, 18))
+        self.assertEqual(chunks, [(b"JUNK", 8, 8), (b"JUNK", 16, 18)])
+
+class HeadlessImportTest(unittest.TestCase):
+    def test_scanner_modules_import_without_tkinter(self):
+        # Scan hosts without python3-tk run the command line and the folder watcher
+        blocker = """
+import sys
+class NoTkinter:
+    def find_spec(self, name, path=None, target=None):
+        if name.split(".")[0] in ("tkinter", "_tkinter"):
+            raise ImportError(name)
+sys.meta_path.insert(0, NoTkinter())
+import FileOrganizer, FolderWatcher, DuplicateFinder, MediaProbe
+"""
+        subprocess.run([sys.executable, "-c", blocker], cwd=REPO_DIR, check=True)
+
+class WalkTreeTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        for folder in range(60):
+            os.makedirs(os.path.join(self.temp_dir, f"folder_{folder:02d}", "sub"))
+            for number in range(3):
+                open(os.path.join(self.temp_dir, f"folder_{folder:02d}", f"clip_{number}.mp4"), "wb").close()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_threaded_walk_finds_every_file(self):
+        serial = FileOrganizer.get_video_files(self.temp_dir)
+        threaded = FileOrganizer.get_video_files(self.temp_dir, workers=8, preserve_order=True)
+        self.assertEqual(len(serial), 180)
+        self.assertEqual([video["full_pathname"] for video in threaded], [video["full_pathname"] for video in serial])
+
+    def test_abandoned_walk_stops_its_threads(self):
+        threads_before = threading.active_count()
+        walk = FileOrganizer.walk_tree(self.temp_dir, workers=12)
+        next(walk)
+        # The workers fill the bounded result queue while the caller holds on to the generator
+        self.assertGreater(threading.active_count(), threads_before)
+        walk.close()
+        self.assertEqual(threading.active_count(), threads_before)
+
+class SymlinkPolicyTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.tree = os.path.join(self.temp_dir, "tree")
+        os.makedirs(os.path.join(self.tree, "real"))
+        os.makedirs(os.path.join(self.temp_dir, "outside"))
+        open(os.path.join(self.tree, "real", "a.mp4"), "wb").close()
+        open(os.path.join(self.temp_dir, "outside", "b.mp4"), "wb").close()
+        os.symlink(os.path.join(self.tree, "real", "a.mp4"), os.path.join(self.tree, "link.mp4"))
+        # A loop back to the root, a second path into the tree and a folder outside it
+        os.symlink(self.tree, os.path.join(self.tree, "real", "loop"))
+        os.symlink(os.path.join(self.tree, "real"), os.path.join(self.tree, "linked_real"))
+        os.symlink(os.path.join(self.temp_dir, "outside"), os.path.join(self.tree, "linked_outside"))
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def walk(self, symlinks, workers=1):
+        return sorted(os.path.relpath(video["full_pathname"], self.tree)
+                      for video in FileOrganizer.get_video_files(self.tree, workers, symlinks=symlinks))
+
+    def test_each_policy_lists_its_links(self):
+        expected = {
+            "never": ["real/a.mp4"],
+            "files": ["link.mp4", "real/a.mp4"],
+            "always": ["link.mp4", "linked_outside/b.mp4", "real/a.mp4"],
+        }
+        for symlinks, paths in expected.items():
+            for workers in (1, 4):
+                with self.subTest(symlinks=symlinks, workers=workers):
+                    self.assertEqual(self.walk(symlinks, workers), [path.replace("/", os.sep) for path in paths])
+
+    def test_unknown_policy_is_refused(self):
+        with self.assertRaises(ValueError):
+            self.walk("sometimes")
+
+class FilesystemProvider(VolumeInfo.StatVolumeInfoProvider):
+    """
+    Reports every volume as having the given filesystem type.
+    """
+    def __init__(self, filesystem):
+        self.filesystem = filesystem
+
+    def volume_info(self, mount_point):
+        return dict(super().volume_info(mount_point), filesystem=self.filesystem)
+
+class RotationalProvider(VolumeInfo.StatVolumeInfoProvider):
+    """
+    Reports every volume as a spinning disk or not.
+    """
+    def __init__(self, rotational):
+        self.rotational = rotational
+
+    def volume_info(self, mount_point):
+        return dict(super().volume_info(mount_point), rotational=self.rotational)
+
+class DuplicateFinderTest(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.tree = os.path.join(self.temp_dir, "tree")
+        os.makedirs(self.tree)
+
+    def write(self, name, content):
+        with open(os.path.join(self.tree, name), "wb") as file:
+            file.write(content)
+
+    def find(self, **options):
+        FileOrganizer.scan_folder_and_update_db(self.db_connection, self.tree)
+        groups, stats = DuplicateFinder.find_duplicate_files(self.db_connection, **options)
+        return [sorted(os.path.basename(file["full_pathname"]) for file in group["files"]) for group in groups], stats
+
+    def test_only_colliding_samples_are_hashed_in_full(self):
+        chunk = DuplicateFinder.SAMPLE_CHUNK_SIZE
+        content = bytes(range(256)) * (4 * chunk // 256)
+        self.write("a.mp4", content)
+        self.write("b.mp4", content)
+        # Differs between the first and the middle chunk, where the sample hash does not look
+        self.write("c.mp4", content[:chunk + 100] + b"x" + content[chunk + 101:])
+        self.write("d.mp4", b"y" + content[1:])
+        self.write("e.mp4", content[:-1])
+        groups, stats = self.find()
+        self.assertEqual(groups, [["a.mp4", "b.mp4"]])
+        self.assertEqual((stats["candidates"], stats["sample_hashed"], stats["full_hashed"], stats["cached"]), (4, 4, 3, 0))
+
+        # The second search takes every hash from the cache
+        groups, stats = self.find()
+        self.assertEqual(groups, [["a.mp4", "b.mp4"]])
+        self.assertEqual((stats["sample_hashed"], stats["full_hashed"], stats["cached"]), (0, 0, 4))
+
+        # Rewritten files are hashed again
+        self.write("c.mp4", content + b"z")
+        self.write("e.mp4", content + b"z")
+        # Rewriting files leaves their folder's date alone, so only a full rescan catalogs the new sizes
+        FileOrganizer.scan_folder_and_update_db(self.db_connection, self.tree, full_rescan=True)
+        groups, stats = self.find()
+        self.assertEqual(groups, [["c.mp4", "e.mp4"], ["a.mp4", "b.mp4"]])
+        self.assertEqual((stats["sample_hashed"], stats["full_hashed"]), (2, 2))
+
+    def test_small_files_need_no_full_hash(self):
+        for name in ("a.mp4", "b.mp4"):
+            self.write(name, b"small" * 100)
+        self.write("c.mp4", b"SMALL" * 100)
+        groups, stats = self.find()
+        self.assertEqual(groups, [["a.mp4", "b.mp4"]])
+        self.assertEqual((stats["sample_hashed"], stats["full_hashed"]), (3, 0))
+
+    def test_hard_links_are_one_copy(self):
+        content = b"same content" * 1000
+        self.write("a.mp4", content)
+        self.write("b.mp4", content)
+        os.link(os.path.join(self.tree, "a.mp4"), os.path.join(self.tree, "hard_link.mp4"))
+        os.symlink(os.path.join(self.tree, "a.mp4"), os.path.join(self.tree, "symlink.mp4"))
+        # Links alone are not duplicates: the data is stored once
+        self.write("c.mp4", b"other content" * 1000)
+        os.link(os.path.join(self.tree, "c.mp4"), os.path.join(self.tree, "c_link.mp4"))
+        groups, stats = self.find()
+        self.assertEqual(groups, [["a.mp4", "b.mp4", "hard_link.mp4", "symlink.mp4"]])
+        self.assertEqual(stats["hard_linked"], 3)
+        self.assertEqual(stats["sample_hashed"], 2)
+        group = DuplicateFinder.find_duplicate_files(self.db_connection)[0][0]
+        self.assertEqual((group["copies"], group["reclaimable_bytes"]), (2, len(content)))
+        # One of the three paths to the data stands for it; the other two are listed as its links
+        linked_to = [os.path.basename(file["hard_link_of"]) for file in group["files"] if "hard_link_of" in file]
+        self.assertEqual(len(linked_to), 2)
+        self.assertEqual(len(set(linked_to)), 1)
+        self.assertIn(linked_to[0], ("a.mp4", "hard_link.mp4", "symlink.mp4"))
+
+    def test_reader_limits_follow_the_kind_of_disk(self):
+        for rotational, readers in ((True, DuplicateFinder.HDD_DEVICE_READERS), (False, DuplicateFinder.SSD_DEVICE_READERS)):
+            VolumeInfo.set_volume_info_provider(RotationalProvider(rotational))
+            self.addCleanup(VolumeInfo.set_volume_info_provider, None)
+            self.assertEqual(DuplicateFinder.device_reader_limit(self.tree), readers)
+        self.assertGreater(DuplicateFinder.SSD_DEVICE_READERS, DuplicateFinder.HDD_DEVICE_READERS)
+
+    def test_worker_processes_find_the_same_duplicates(self):
+        VolumeInfo.set_volume_info_provider(RotationalProvider(False))
+        self.addCleanup(VolumeInfo.set_volume_info_provider, None)
+        for name in ("a.mp4", "b.mp4", "c.mp4"):
+            self.write(name, b"same content" * 1000)
+        self.write("d.mp4", b"other content" * 923 + b"x")
+        groups, stats = self.find(workers=2)
+        self.assertEqual(groups, [["a.mp4", "b.mp4", "c.mp4"]])
+        self.assertEqual(stats["unreadable"], 0)
+
+class ManifestRescanTest(CatalogTestCase):
+    def rescan_after_silent_change(self, filesystem):
+        VolumeInfo.set_volume_info_provider(FilesystemProvider(filesystem))
+        self.addCleanup(VolumeInfo.set_volume_info_provider, None)
+        tree = os.path.join(self.temp_dir, "tree")
+        os.makedirs(os.path.join(tree, "folder"))
+        open(os.path.join(tree, "folder", "a.mp4"), "wb").close()
+        FileOrganizer.scan_folder_and_update_db(self.db_connection, tree)
+
+        # Add a file without the folder's modification time changing, as FAT and exFAT may do
+        folder_stats = os.stat(os.path.join(tree, "folder"))
+        open(os.path.join(tree, "folder", "b.mp4"), "wb").close()
+        os.utime(os.path.join(tree, "folder"), ns=(folder_stats.st_atime_ns, folder_stats.st_mtime_ns))
+        FileOrganizer.scan_folder_and_update_db(self.db_connection, tree)
+        return {row[0] for row in self.query(f"SELECT filename FROM {VIDEO_FILES_TABLE}")}
+
+    def test_unchanged_folders_are_skipped(self):
+        self.assertEqual(self.rescan_after_silent_change("ext4"), {"a.mp4"})
+
+    def test_fat_volumes_are_always_listed(self):
+        for filesystem in ("vfat", "exFAT", "FAT32"):
+            with self.subTest(filesystem=filesystem):
+                self.assertEqual(self.rescan_after_silent_change(filesystem), {"a.mp4", "b.mp4"})
+                shutil.rmtree(os.path.join(self.temp_dir, "tree"))
+
+    def test_moved_and_renamed_files_keep_their_records(self):
+        tree = os.path.join(self.temp_dir, "tree")
+        for folder in ("old", "new"):
+            os.makedirs(os.path.join(tree, folder))
+        for name, content in (("a.mp4", b"same" * 1000), ("b.mp4", b"same" * 1000), ("c.mp4", b"other" * 1000)):
+            with open(os.path.join(tree, "old", name), "wb") as file:
+                file.write(content)
+        FileOrganizer.scan_folder_and_update_db(self.db_connection, tree)
+        DuplicateFinder.find_duplicate_files(self.db_connection)
+        ids = dict(self.query(f"SELECT filename, id FROM {VIDEO_FILES_TABLE}"))
+
+        os.rename(os.path.join(tree, "old", "a.mp4"), os.path.join(tree, "new", "moved.mp4"))
+        os.rename(os.path.join(tree, "old", "b.mp4"), os.path.join(tree, "old", "renamed.mp4"))
+        # A copy is another file, even with the same size and modification date
+        shutil.copy2(os.path.join(tree, "old", "c.mp4"), os.path.join(tree, "new", "copy.mp4"))
+        os.remove(os.path.join(tree, "old", "c.mp4"))
+        summary = FileOrganizer.scan_folder_and_update_db(self.db_connection, tree)
+
+        self.assertEqual((summary["moved"], summary["removed"]), (2, 1))
+        files = dict(self.query(f"SELECT filename, id FROM {VIDEO_FILES_TABLE}"))
+        self.assertEqual(set(files), {"moved.mp4", "renamed.mp4", "copy.mp4"})
+        self.assertEqual((files["moved.mp4"], files["renamed.mp4"]), (ids["a.mp4"], ids["b.mp4"]))
+        self.assertNotIn(files["copy.mp4"], ids.values())
+        # The hashes moved along with the files, so nothing is read again
+        self.assertEqual({row[0] for row in self.query(f"SELECT full_pathname FROM {FILE_HASHES_TABLE}")},
+                         {os.path.join(tree, "new", "moved.mp4"), os.path.join(tree, "old", "renamed.mp4")})
+        groups, stats = DuplicateFinder.find_duplicate_files(self.db_connection)
+        self.assertEqual([len(group["files"]) for group in groups], [2])
+        self.assertEqual((stats["sample_hashed"], stats["full_hashed"]), (0, 0))
+        self.assertEqual([row["filename"] for row in FileOrganizer.search_video_files(self.db_connection, "renamed")],
+                         ["renamed.mp4"])
+        self.assertSearchIndexIntact()
+
+    def test_first_new_id_is_read_inside_the_write_transaction(self):
+        tree = os.path.join(self.temp_dir, "tree")
+        os.makedirs(tree)
+        open(os.path.join(tree, "a.mp4"), "wb").close()
+        other_connection = sqlite3.connect(self.db_path, timeout=0)
+        blocked = []
+
+        def write_from_other_connection(statement):
+            # Another writer, such as the folder watcher, tries to add a file while the scan reads the last id
+            if statement.startswith("SELECT COALESCE(MAX(id), 0)") and not blocked:
+                try:
+                    with other_connection:
+                        other_connection.execute(f"""
+                            INSERT INTO {VIDEO_FILES_TABLE} (partitionID, full_pathname, path_key, filename, normalized_filename, filesize, device_DUID)
+                            VALUES ('', '/videos/b.mp4', '/videos/b.mp4', 'b.mp4', 'b.mp4', 1, 1)
+                        """)
+                    blocked.append(False)
+                except sqlite3.OperationalError:
+                    blocked.append(True)
+
+        self.db_connection.set_trace_callback(write_from_other_connection)
+        try:
+            summary = FileOrganizer.scan_folder_and_update_db(self.db_connection, tree)
+        finally:
+            self.db_connection.set_trace_callback(None)
+            other_connection.close()
+        self.assertEqual(blocked, [True])
+        self.assertEqual(summary["inserted"], 1)
+
+class RecordingInotify:
+    """
+    Stands in for the inotify watcher and records the folders it is asked to watch.
+    """
+    def __init__(self):
+        self.watched = []
+
+    def add_watch(self, dir_path):
+        self.watched.append(dir_path)
+
+    def add_tree(self, root):
+        self.watched.append(root)
+
+class FolderWatcherTest(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.tree = os.path.join(self.temp_dir, "tree")
+        os.makedirs(os.path.join(self.tree, "folder"))
+        for name in ("a.mp4", "b.mp4"):
+            with open(os.path.join(self.tree, "folder", name), "wb") as file:
+                file.write(name.encode())
+        FileOrganizer.scan_folder_and_update_db(self.db_connection, self.tree)
+        self.roots = [(VolumeInfo.stable_device_id(self.tree), self.tree)]
+
+    def manifest_is_current(self):
+        # A polling pass lists nothing when the manifest matches every folder
+        counts = FolderWatcher.poll_roots(self.db_connection, self.roots, inotify=RecordingInotify())
+        return counts == {"upserted": 0, "moved": 0, "deleted": 0}
+
+    def test_moves_keep_records_and_caches(self):
+        old_path = os.path.join(self.tree, "folder", "a.mp4")
+        (old_id,) = self.query(f"SELECT id FROM {VIDEO_FILES_TABLE} WHERE full_pathname = ?", (old_path,))[0]
+        with self.db_connection:
+            self.db_connection.execute(f"""
+                INSERT INTO {FILE_HASHES_TABLE} (device_DUID, full_pathname, filesize, modified_time, full_hash, hashed_date)
+                VALUES (?, ?, 5, 0, 'hash', '')
+            """, (self.roots[0][0], old_path))
+
+        new_folder = os.path.join(self.tree, "moved")
+        os.makedirs(new_folder)
+        os.rename(old_path, os.path.join(new_folder, "c.mp4"))
+        os.rename(os.path.join(self.tree, "folder"), os.path.join(self.tree, "renamed"))
+        counts = FolderWatcher.apply_changes(self.db_connection, self.roots, {
+            old_path: False, new_folder: True,
+            os.path.join(self.tree, "folder"): True, os.path.join(self.tree, "renamed"): True,
+        })
+        self.assertEqual(counts, {"upserted": 0, "moved": 2, "deleted": 0})
+        self.assertEqual(self.query(f"SELECT id FROM {VIDEO_FILES_TABLE} WHERE filename = 'c.mp4'"), [(old_id,)])
+        self.assertEqual(self.query(f"SELECT full_pathname FROM {FILE_HASHES_TABLE}"), [(os.path.join(new_folder, "c.mp4"),)])
+        self.assertEqual(sorted(row[0] for row in self.query(f"SELECT dir_path FROM {DIRECTORY_MANIFEST_TABLE}")),
+                         [self.tree, new_folder, os.path.join(self.tree, "renamed")])
+        self.assertTrue(self.manifest_is_current())
+
+    def test_deleted_files_and_folders_are_removed(self):
+        os.remove(os.path.join(self.tree, "folder", "a.mp4"))
+        counts = FolderWatcher.apply_changes(self.db_connection, self.roots, {os.path.join(self.tree, "folder", "a.mp4"): False})
+        self.assertEqual(counts, {"upserted": 0, "moved": 0, "deleted": 1})
+        shutil.rmtree(os.path.join(self.tree, "folder"))
+        counts = FolderWatcher.apply_changes(self.db_connection, self.roots, {os.path.join(self.tree, "folder"): True})
+        self.assertEqual(counts["deleted"], 1)
+        self.assertEqual(self.query(f"SELECT COUNT(*) FROM {VIDEO_FILES_TABLE}"), [(0,)])
+        self.assertTrue(self.manifest_is_current())
+
+    def test_poll_after_lost_events_watches_new_folders(self):
+        new_folder = os.path.join(self.tree, "folder", "new")
+        os.makedirs(new_folder)
+        open(os.path.join(new_folder, "d.mp4"), "wb").close()
+        inotify = RecordingInotify()
+        counts = FolderWatcher.poll_roots(self.db_connection, self.roots, inotify=inotify)
+        self.assertEqual(counts["upserted"], 1)
+        self.assertIn(new_folder, inotify.watched)
+        self.assertTrue(self.manifest_is_current())
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,389 @@
+import os
+import re
+import shutil
+import struct
+import sys
+
+# Files and folders the Linux provider reads mount and filesystem details from
+MOUNTINFO_PATH = "/proc/self/mountinfo"
+DISK_BY_UUID_DIR = "/dev/disk/by-uuid"
+DISK_BY_LABEL_DIR = "/dev/disk/by-label"
+SYS_BLOCK_DIR = "/sys/class/block"
+
+# ioctl request asking Linux filesystems for the physical extents of a file, from <linux/fs.h>
+FS_IOC_FIEMAP = 0xC020660B
+# struct fiemap header (start, length, flags, mapped extents, extent count, reserved) and one struct fiemap_extent
+FIEMAP_HEADER = struct.Struct("=QQLLLL")
+FIEMAP_EXTENT = struct.Struct("=QQQQQLLLL")
+# Extent flag set while the data has no place on the disk yet (delayed allocation)
+FIEMAP_EXTENT_UNKNOWN = 0x00000002
+
+# Filesystem types, as named on Linux and Windows, whose folder modification times cannot show whether a
+# folder's entries changed: FAT keeps no times for the root folder and neither FAT nor exFAT reliably
+# updates a folder's time when entries are added, renamed or removed
+FAT_FILESYSTEMS = {"vfat", "fat", "fat12", "fat16", "fat32", "msdos", "exfat"}
+
+# Volume details resolved during the current scan session, by mount point
+_volume_cache = {}
+
+# Stable device ids resolved during the current scan session, by st_dev
+_device_ids = {}
+
+# Whether folder modification times can be trusted, resolved during the current scan session, by st_dev
+_folder_mtimes_reliable = {}
+
+# Provider used by get_volume_info; chosen for the platform on first use unless one was set
+_provider = None
+
+class StatVolumeInfoProvider:
+    """
+    Fallback provider for any platform: finds the mount point by walking up the path until the device
+    changes, and reads the sizes with shutil.disk_usage. It knows no volume names or serial numbers.
+    """
+
+    def mount_point(self, path):
+        path = os.path.realpath(path)
+        device = os.stat(path).st_dev
+        while True:
+            parent = os.path.dirname(path)
+            if parent == path or os.path.ismount(path) or os.stat(parent).st_dev != device:
+                return path
+            path = parent
+
+    def clear(self):
+        pass
+
+    def volume_info(self, mount_point):
+        usage = shutil.disk_usage(mount_point)
+        return {
+            "mount_point": mount_point,
+            "partition_id": os.path.splitdrive(mount_point)[0] or mount_point,
+            "volume_name": os.path.basename(mount_point.rstrip(os.sep)) or mount_point,
+            "serial_number": None,
+            "filesystem": None,
+            "rotational": None,
+            "total_size": usage.total,
+            "free_space": usage.free,
+        }
+
+class LinuxVolumeInfoProvider(StatVolumeInfoProvider):
+    """
+    Linux provider: the mount point, source device and filesystem type come from /proc/self/mountinfo,
+    the filesystem UUID and label from the symlinks in /dev/disk/by-uuid and /dev/disk/by-label, and
+    the sizes from statvfs. The mount table and the symlinks are read once per scan session.
+    """
+
+    def __init__(self):
+        self._mounts = None
+        self._disk_names = None
+
+    def clear(self):
+        # Pick up drives mounted since the mount table was read
+        self._mounts = None
+        self._disk_names = None
+
+    def _load_mounts(self):
+        # Fields: mount id, parent id, major:minor, root, mount point, options, optional fields..., '-', fstype, source, ...
+        mounts = []
+        with open(MOUNTINFO_PATH, encoding="utf-8", errors="surrogateescape") as mountinfo:
+            for line in mountinfo:
+                fields = line.split()
+                try:
+                    separator = fields.index("-", 6)
+                    major, minor = fields[2].split(":")
+                    mounts.append({
+                        "device": (int(major), int(minor)),
+                        "mount_point": _unescape_mount_field(fields[4]),
+                        "filesystem": fields[separator + 1],
+                        "source": _unescape_mount_field(fields[separator + 2]),
+                    })
+                except (ValueError, IndexError):
+                    continue
+        return mounts
+
+    def _load_disk_names(self):
+        disk_names = {"uuid": {}, "label": {}}
+        for kind, directory in (("uuid", DISK_BY_UUID_DIR), ("label", DISK_BY_LABEL_DIR)):
+            try:
+                names = os.listdir(directory)
+            except OSError:
+                continue
+            for name in names:
+                device = os.path.realpath(os.path.join(directory, name))
+                # udev escapes spaces and other special characters in the link names as \xNN
+                disk_names[kind][device] = re.sub(r'\\x([0-9a-fA-F]{2})', lambda match: chr(int(match.group(1), 16)), name)
+        return disk_names
+
+    def _mount_entry(self, path):
+        if self._mounts is None:
+            try:
+                self._mounts = self._load_mounts()
+            except OSError:
+                self._mounts = []
+        path = os.path.realpath(path)
+        stats = os.stat(path)
+        device = (os.major(stats.st_dev), os.minor(stats.st_dev))
+        # Several entries share a device with bind mounts; the deepest one containing the path is its mount
+        best = None
+        for entry in self._mounts:
+            mount_point = entry["mount_point"]
+            if entry["device"] == device and (path == mount_point or path.startswith(mount_point.rstrip("/") + "/")):
+                if best is None or len(mount_point) > len(best["mount_point"]):
+                    best = entry
+        return best
+
+    def mount_point(self, path):
+        entry = self._mount_entry(path)
+        return entry["mount_point"] if entry else super().mount_point(path)
+
+    def volume_info(self, mount_point):
+        stats = os.statvfs(mount_point)
+        entry = self._mount_entry(mount_point) or {}
+        source = entry.get("source")
+        if self._disk_names is None:
+            self._disk_names = self._load_disk_names()
+        block_device = os.path.realpath(source) if source and source.startswith("/dev/") else None
+        return {
+            "mount_point": mount_point,
+            "partition_id": source or mount_point,
+            "volume_name": (self._disk_names["label"].get(block_device)
+                            or os.path.basename(mount_point.rstrip("/")) or mount_point),
+            "serial_number": self._disk_names["uuid"].get(block_device),
+            "filesystem": entry.get("filesystem"),
+            "rotational": _block_device_rotational(block_device) if block_device else None,
+            "total_size": stats.f_blocks * stats.f_frsize,
+            "free_space": stats.f_bavail * stats.f_frsize,
+        }
+
+class WindowsVolumeInfoProvider:
+    """
+    Windows provider: reads the volume name, serial number and sizes of a drive with win32api, which is
+    only imported when the first volume is resolved.
+    """
+
+    def __init__(self):
+        self._win32api = None
+
+    def clear(self):
+        pass
+
+    def mount_point(self, path):
+        drive = os.path.splitdrive(os.path.abspath(path))[0]
+        return drive.rstrip("\\") + "\\"
+
+    def volume_info(self, mount_point):
+        if self._win32api is None:
+            import win32api
+            self._win32api = win32api
+        volume_name, serial_number, _, _, filesystem = self._win32api.GetVolumeInformation(mount_point)
+        free_space, total_size, _ = self._win32api.GetDiskFreeSpaceEx(mount_point)
+        return {
+            "mount_point": mount_point,
+            "partition_id": mount_point.rstrip("\\"),
+            "volume_name": volume_name,
+            "serial_number": serial_number,
+            "filesystem": filesystem,
+            "rotational": None,
+            "total_size": total_size,
+            "free_space": free_space,
+        }
+
+def _unescape_mount_field(field):
+    """
+    Decodes the octal escapes (such as \\040 for a space) used in /proc/self/mountinfo.
+    """
+    return re.sub(r'\\([0-7]{3})', lambda match: chr(int(match.group(1), 8)), field)
+
+def _block_device_rotational(block_device):
+    """
+    Reads whether a block device, or the disk a partition is on, is a spinning disk from
+    /sys/class/block/<name>/queue/rotational. Returns None if the kernel does not say.
+    """
+    device_dir = os.path.realpath(os.path.join(SYS_BLOCK_DIR, os.path.basename(block_device)))
+    # Partitions have no queue of their own; it belongs to the disk they are in
+    for queue_dir in (device_dir, os.path.dirname(device_dir)):
+        try:
+            with open(os.path.join(queue_dir, "queue", "rotational"), encoding="ascii") as rotational:
+                return rotational.read().strip() == "1"
+        except OSError:
+            continue
+    return None
+
+def default_volume_info_provider():
+    """
+    Returns the volume-info provider for the current platform.
+    """
+    if os.name == "nt":
+        return WindowsVolumeInfoProvider()
+    if sys.platform.startswith("linux"):
+        return LinuxVolumeInfoProvider()
+    return StatVolumeInfoProvider()
+
+def set_volume_info_provider(provider):
+    """
+    Replaces the provider used to resolve volumes, and forgets the volumes resolved so far.
+
+    Args:
+        provider: An object with mount_point(path), volume_info(mount_point) and clear() methods, like
+                  the providers in this module, or None to go back to the platform default.
+    """
+    global _provider
+    _provider = provider
+    clear_volume_cache()
+
+def clear_volume_cache():
+    """
+    Starts a new scan session: volumes are resolved again the next time they are asked for,
+    so sizes and free space are read fresh.
+    """
+    _volume_cache.clear()
+    _device_ids.clear()
+    _folder_mtimes_reliable.clear()
+    if _provider is not None:
+        _provider.clear()
+
+def get_volume_info(path):
+    """
+    Returns the details of the volume a path is on. Each volume is resolved once per scan session and
+    then served from the cache, however many folders of it are scanned.
+
+    Args:
+        path (str): A file or folder on the volume.
+
+    Returns:
+        dict: mount_point, partition_id, volume_name, serial_number (filesystem UUID or volume serial,
+              None if unknown), filesystem, rotational (True for a spinning disk, None if unknown),
+              total_size and free_space in bytes.
+
+    Raises:
+        OSError: If the path or its volume cannot be read.
+        ImportError: If the provider needs a module that is not installed (win32api on Windows).
+    """
+    global _provider
+    if _provider is None:
+        _provider = default_volume_info_provider()
+    mount_point = _provider.mount_point(path)
+    info = _volume_cache.get(mount_point)
+    if info is None:
+        info = _volume_cache[mount_point] = _provider.volume_info(mount_point)
+    return info
+
+def device_id_from_serial(serial_number):
+    """
+    Turns a volume serial number or filesystem UUID into the integer device id the catalog is keyed on.
+    FAT, exFAT and NTFS UUIDs as shown on Linux ('1234-ABCD', '01D5A3B2C4E5F6A7') carry the serial
+    number Windows reports for the volume in their last 8 hex digits, so a drive gets the same id on
+    both systems. Windows serials are signed in some APIs and are read as unsigned 32-bit numbers.
+    Longer UUIDs (ext4, btrfs, ...) are folded into a positive 63-bit number.
+
+    Args:
+        serial_number (int or str): The serial number or UUID.
+
+    Returns:
+        int: The device id, or None if the serial number is missing or zero.
+    """
+    if serial_number is None or isinstance(serial_number, bool):
+        return None
+    # Windows serials are at most 10 decimal digits; UUIDs are longer or contain a dash
+    if isinstance(serial_number, int) or re.fullmatch(r'-?\d{1,10}', str(serial_number).strip()):
+        return int(serial_number) & 0xFFFFFFFF or None
+    hex_digits = re.sub(r'[^0-9a-fA-F]', '', str(serial_number))
+    if not hex_digits or len(hex_digits) != len(re.sub(r'[-{}]', '', str(serial_number).strip())):
+        return None
+    if len(hex_digits) <= 16:
+        return int(hex_digits[-8:], 16) or None
+    return int(hex_digits, 16) % (1 << 63) or None
+
+def stable_device_id(path, st_dev=None):
+    """
+    Returns the id of the device a path is on, derived from its filesystem UUID or volume serial number,
+    which stay the same when a drive is remounted or plugged into another port. Falls back to st_dev when
+    the volume has no serial number or cannot be read. Resolved once per st_dev and scan session.
+
+    Args:
+        path (str): A file or folder on the device.
+        st_dev (int, optional): The st_dev of the path, if already known.
+
+    Returns:
+        int: The device id.
+    """
+    if st_dev is None:
+        st_dev = os.stat(path).st_dev
+    device_id = _device_ids.get(st_dev)
+    if device_id is None:
+        try:
+            device_id = device_id_from_serial(get_volume_info(path)["serial_number"])
+        except (OSError, ImportError):
+            device_id = None
+        if device_id is None:
+            device_id = st_dev
+        _device_ids[st_dev] = device_id
+    return device_id
+
+def has_reliable_folder_mtimes(path, st_dev=None):
+    """
+    Returns False if a path is on a FAT-family volume (FAT12/16/32, exFAT), whose folder modification
+    times do not show whether the folder's entries changed. Volumes of unknown type, and paths that
+    cannot be resolved, count as reliable. Resolved once per st_dev and scan session.
+
+    Args:
+        path (str): A file or folder on the volume.
+        st_dev (int, optional): The st_dev of the path, if already known.
+
+    Returns:
+        bool: True if an unchanged folder modification time means the folder is unchanged.
+    """
+    try:
+        if st_dev is None:
+            st_dev = os.stat(path).st_dev
+        reliable = _folder_mtimes_reliable.get(st_dev)
+        if reliable is None:
+            filesystem = get_volume_info(path)["filesystem"]
+            reliable = _folder_mtimes_reliable[st_dev] = (filesystem or "").lower() not in FAT_FILESYSTEMS
+        return reliable
+    except (OSError, ImportError):
+        return True
+
+def is_rotational(path):
+    """
+    Returns True if a path is on a spinning disk, where the order of metadata and file reads decides how
+    much time goes to seeking. Unknown disks, and paths that cannot be resolved, count as not rotational.
+
+    Args:
+        path (str): A file or folder on the disk.
+
+    Returns:
+        bool: True for a rotational disk.
+    """
+    try:
+        return bool(get_volume_info(path)["rotational"])
+    except (OSError, ImportError):
+        return False
+
+def physical_offset(path):
+    """
+    Returns where the data of a file starts on its disk, in bytes, from the FIEMAP ioctl on Linux.
+    Reading files in this order lets the heads sweep the disk once instead of seeking back and forth.
+
+    Args:
+        path (str): The file.
+
+    Returns:
+        int: The physical offset of the first extent, or None where FIEMAP is not available, the file is
+             empty or not written to the disk yet, or it cannot be opened.
+    """
+    if not sys.platform.startswith("linux"):
+        return None
+    import fcntl
+    request = bytearray(FIEMAP_HEADER.size + FIEMAP_EXTENT.size)
+    # Map from offset 0 to the end of the file, and return at most one extent
+    FIEMAP_HEADER.pack_into(request, 0, 0, 0xFFFFFFFFFFFFFFFF, 0, 0, 1, 0)
+    try:
+        with open(path, "rb", buffering=0) as file:
+            fcntl.ioctl(file.fileno(), FS_IOC_FIEMAP, request)
+    except OSError:
+        return None
+    if FIEMAP_HEADER.unpack_from(request, 0)[3] == 0:
+        return None
+    extent = FIEMAP_EXTENT.unpack_from(request, FIEMAP_HEADER.size)
+    return None if extent[5] & FIEMAP_EXTENT_UNKNOWN else extent[1]
@@ -3,23 +3,27 @@ from ttkbootstrap.constants import *
 from ttkbootstrap.dialogs import Messagebox
 from tkinter import filedialog, simpledialog
 from tkinter.scrolledtext import ScrolledText
-import csv
 import tkinter as tk
 import sqlite3
 import os
 import sys
 
+# Maximum number of rows shown for a search
+SEARCH_RESULT_LIMIT = 1000
+
 # Add the parent directory to sys.path if necessary
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
 from FileOrganizer import (
     initialize_db,
-    get_video_files,
-    store_video_files_in_db,
-    update_device_metadata,
-    dump_all_video_files,
+    scan_folder_and_update_db,
+    query_video_files,
     dump_all_device_metadata,
+    search_video_files,
     delete_video_files_by_device_id,
+    export_video_files_to_csv,
+    export_video_files_to_xlsx,
+    DISPLAY_EXPORT_COLUMNS,
     DEVICE_METADATA_TABLE
 )
 
@@ -76,9 +80,16 @@ def graphical_user_interface():
     style.map("MildDanger.TButton",
               background=[('active', '#c44c4c')])  # Darker red on hover
 
-    # Store all video items for filtering
-    global all_video_items
-    all_video_items = []
+    # Full path of each row shown in the video list, by Treeview item id, and the cursor of the next
+    # page of the catalog (None once the last page is shown or while search results are shown)
+    global video_paths, next_page_after
+    video_paths = {}
+    next_page_after = None
+
+    # Device shown in the video list (None for all media) and the volume name of each device
+    global selected_device_id, device_volumes
+    selected_device_id = None
+    device_volumes = {}
 
     def format_size(size_bytes):
         """Format file size in human-readable format."""
@@ -92,79 +103,99 @@ def graphical_user_interface():
             print(f"Error formatting size: {e}")
             return "N/A"
 
+    def make_video_item(video):
+        """Build the stored item for a video file record."""
+        return {
+            'deviceid': video['device_DUID'],
+            'volume_name': device_volumes.get(video['device_DUID'], "Unknown"),
+            'filename': video['filename'],
+            'fullpath': video['full_pathname'],  # Store the full path
+            'filesize': format_size(video['filesize']),
+            'created_date': video['created_date'],
+            'modified_date': video['modified_date']
+        }
+
+    def clear_video_list():
+        """Remove every row from the video list."""
+        video_tree.delete(*video_tree.get_children())
+        video_paths.clear()
+
+    def show_video_items(videos):
+        """Append video file records to the video list."""
+        for video in videos:
+            item = make_video_item(video)
+            row_id = video_tree.insert("", END, values=(
+                item['volume_name'],
+                item['filename'],
+                item['filesize'],
+                item['created_date'],
+                item['modified_date']
+            ))
+            video_paths[row_id] = item['fullpath']
+
+    def load_next_page():
+        """Append the next page of the catalog to the video list, if there is one."""
+        global next_page_after
+        rows, next_page_after = query_video_files(db_connection, after=next_page_after, device_id=selected_device_id)
+        show_video_items(rows)
+        update_record_count()
+
+    def show_first_page():
+        """Show the first page of the catalog; later pages are loaded as the list is scrolled."""
+        global next_page_after
+        clear_video_list()
+        next_page_after = None
+        load_next_page()
+
+    def on_video_list_scrolled(first, last):
+        """Move the scrollbar, and load the next page once the end of the list comes into view."""
+        video_scrollbar.set(first, last)
+        if next_page_after is not None and float(last) >= 1.0:
+            try:
+                load_next_page()
+            except sqlite3.Error as e:
+                print(f"Error loading more video files: {e}")
+
     def filter_video_list():
         """Filter the video list based on search text."""
+        global next_page_after
         try:
-            search_text = search_var.get().lower()
-            
-            # Clear current items
-            for item in video_tree.get_children():
-                video_tree.delete(item)
+            search_text = search_var.get().strip()
             
-            # Filter and show matching items
-            for item in all_video_items:
-                if search_text in item['filename'].lower():
-                    video_tree.insert("", END, values=(
-                        item['volume_name'],
-                        item['filename'],
-                        item['filesize'],
-                        item['created_date'],
-                        item['modified_date']
-                     ))
-            update_record_count()  # Update record count after filtering
+            # Search the whole catalog through the full-text index instead of only the loaded rows
+            if search_text:
+                clear_video_list()
+                next_page_after = None
+                show_video_items(search_video_files(db_connection, search_text, SEARCH_RESULT_LIMIT, selected_device_id))
+                update_record_count()  # Update record count after filtering
+            else:
+                show_first_page()
         except Exception as e:
             print(f"Error filtering video list: {e}")
             Messagebox.show_error(f"Error filtering video list: {e}", "Filter Error")
 
     def refresh_video_list(device_id=None):
         """Refresh the video files list"""
+        global selected_device_id
         try:
-            # Clear the search
-            search_var.set("")
-            
-            # Clear current items
-            for item in video_tree.get_children():
-                video_tree.delete(item)
-            
-            # Clear stored items
-            all_video_items.clear()
-            
-            videos = dump_all_video_files(db_connection, device_id)
+            selected_device_id = device_id
             
             # Get device volume names
             cursor = db_connection.cursor()
             try:
-                device_volumes = {}
+                device_volumes.clear()
                 cursor.execute(f"SELECT deviceid, volumename FROM {DEVICE_METADATA_TABLE}")
                 for device in cursor.fetchall():
                     device_volumes[device[0]] = device[1]
-                
-                for video in videos:
-                    # Get volume name for the device
-                    volume_name = device_volumes.get(video['device_DUID'], "Unknown")
-                    
-                    # Store the item for filtering
-                    all_video_items.append({
-                        'deviceid': video['device_DUID'],
-                        'volume_name': volume_name,
-                        'filename': video['filename'],
-                        'fullpath': video['full_pathname'],  # Store the full path
-                        'filesize': format_size(video['filesize']),
-                        'created_date': video['created_date'],
-                        'modified_date': video['modified_date']
-                    })
-                    
-                    # Insert into treeview
-                    video_tree.insert("", END, values=(
-                        volume_name,
-                        video['filename'],
-                        format_size(video['filesize']),
-                        video['created_date'],
-                        video['modified_date']
-                    ))
             finally:
                 cursor.close()
-            update_record_count()  # Update record count after refreshing the list
+
+            # Only the first page is read now, the rest as the list is scrolled. Clearing the search
+            # shows the first page through filter_video_list.
+            if search_var.get():
+                search_var.set("")
+            else:
+                show_first_page()
         except sqlite3.Error as e:
             Messagebox.show_error(f"Database error: {e}", "Error")
         except Exception as e:
@@ -242,13 +273,17 @@ def graphical_user_interface():
         try:
             folder_path = filedialog.askdirectory(title="Select Folder to Scan")
             if folder_path:
-                video_files = get_video_files(folder_path)
-                if video_files:
-                    store_video_files_in_db(video_files, db_connection)
-                    update_device_metadata(folder_path, db_connection)
-                    refresh_device_list()
-                    refresh_video_list()
-                    Messagebox.show_info("Database updated successfully.", "Success")
+                # Same scan as the command line: incremental, with moved files relinked and vanished ones removed
+                summary = scan_folder_and_update_db(db_connection, folder_path)
+                if summary is None:
+                    Messagebox.show_error("The folder could not be scanned. See the console for details.", "Error")
+                    return
+                refresh_device_list()
+                refresh_video_list()
+                if summary["found"] or summary["skipped_dirs"] or summary["moved"] or summary["removed"]:
+                    Messagebox.show_info(
+                        f"Database updated successfully: {summary['inserted']} added, {summary['updated']} updated, "
+                        f"{summary['removed']} removed.", "Success")
                 else:
                     Messagebox.show_warning("No video files found in the specified folder.", "Warning")
         except sqlite3.Error as e:
@@ -287,44 +322,26 @@ def graphical_user_interface():
         root.destroy()
 
     def export_to_csv():
-        """Export video files to a CSV file"""
+        """Export video files to a CSV or Excel file"""
         try:
             file_path = filedialog.asksaveasfilename(
                 defaultextension=".csv",
-                filetypes=[("CSV files", "*.csv")],
+                filetypes=[("CSV files", "*.csv"), ("Compressed CSV files", "*.csv.gz *.csv.xz"), ("Excel files", "*.xlsx")],
                 title="Save Video Files as CSV"
             )
             if file_path:
-                with open(file_path, mode="w", newline="", encoding="utf-8") as csv_file:
-                    writer = csv.writer(csv_file)
-                    # Write header
-                    writer.writerow(["Device Volume", "Filename", "Full Path", "Normalized Filename", "Size", "Created Date", "Modified Date"])
-                    
-                    # Fetch all video files from the database
-                    videos = dump_all_video_files(db_connection)
-                    
-                    # Get device volume names
-                    cursor = db_connection.cursor()
-                    try:
-                        device_volumes = {}
-                        cursor.execute(f"SELECT deviceid, volumename FROM {DEVICE_METADATA_TABLE}")
-                        for device in cursor.fetchall():
-                            device_volumes[device[0]] = device[1]
-                        
-                        # Write video file data
-                        for video in videos:
-                            volume_name = device_volumes.get(video['device_DUID'], "Unknown")
-                            writer.writerow([
-                                volume_name,
-                                video['filename'],
-                                video['full_pathname'],
-                                video['normalized_filename'],  # Fetch normalized filename from the database
-                                video['filesize'],
-                                video['created_date'],
-                                video['modified_date']
-                            ])
-                    finally:
-                        cursor.close()
+                def show_progress(rows_written, total_rows):
+                    file_path_label.configure(text=f"Exporting: {rows_written} of {total_rows} records")
+                    root.update_idletasks()
+
+                # Stream the records straight from the database into the file
+                if file_path.lower().endswith(".xlsx"):
+                    sheet_per_device = Messagebox.show_question("Write one sheet per device?", "Excel Export") == "Yes"
+                    export_video_files_to_xlsx(db_connection, file_path, DISPLAY_EXPORT_COLUMNS, sheet_per_device,
+                                               progress_callback=show_progress)
+                else:
+                    export_video_files_to_csv(db_connection, file_path, DISPLAY_EXPORT_COLUMNS, progress_callback=show_progress)
+                file_path_label.configure(text="File Path: ")
                 
                 Messagebox.show_info("Video files exported successfully.", "Export Successful")
         except Exception as e:
@@ -466,9 +483,13 @@ def graphical_user_interface():
     )
     media_label.pack(anchor=CENTER)  # Center align the Media Files title
 
+    # Create frame holding the video list and its scrollbar
+    video_frame = ttk.Frame(right_frame)
+    video_frame.pack(fill=BOTH, expand=YES)
+
     # Create Treeview for video files
     video_tree = ttk.Treeview(
-        right_frame,
+        video_frame,
         columns=("devicevolume", "filename", "filesize", "created_date", "modified_date"),
         show="headings",
         height=20,
@@ -486,7 +507,12 @@ def graphical_user_interface():
     video_tree.column("filesize", width=100)
     video_tree.column("created_date", width=150)
     video_tree.column("modified_date", width=150)
-    video_tree.pack(fill=BOTH, expand=YES)
+
+    # Scrollbar of the video list; reaching the end of the list loads the next page
+    video_scrollbar = ttk.Scrollbar(video_frame, orient=VERTICAL, command=video_tree.yview)
+    video_scrollbar.pack(side=RIGHT, fill=Y)
+    video_tree.configure(yscrollcommand=on_video_list_scrolled)
+    video_tree.pack(side=LEFT, fill=BOTH, expand=YES)
 
     # Create status frame below video tree
     status_frame = ttk.Frame(right_frame, style="Light.TFrame")
@@ -508,7 +534,9 @@ def graphical_user_interface():
         """Update the record count label"""
         try:
             record_count = len(video_tree.get_children())
-            record_count_label.configure(text=f"Records: {record_count}")
+            # A "+" marks a list with catalog pages still to load
+            more = "+" if next_page_after is not None else ""
+            record_count_label.configure(text=f"Records: {record_count}{more}")
         except Exception as e:
             print(f"Error updating record count: {e}")
             record_count_label.configure(text="Records: Error")
@@ -518,16 +546,7 @@ def graphical_user_interface():
         try:
             selection = video_tree.selection()
             if selection:
-                # Get the selected item's values
-                item = video_tree.item(selection[0])
-                values = item['values']
-                
-                # Get the full path from the stored items
-                selected_filename = values[1]  # filename is at index 1
-                for stored_item in all_video_items:
-                    if stored_item['filename'] == selected_filename:
-                        file_path_label.configure(text=f"File Path: {stored_item['fullpath']}")
-                        break
+                file_path_label.configure(text=f"File Path: {video_paths.get(selection[0], '')}")
             else:
                 # Clear status if no file is selected
                 file_path_label.configure(text="File Path: ")